@@ -1,7 +1,13 @@
+import logging
+
+from fastapi.concurrency import run_in_threadpool
+
 from agent.memory import MemoryManager
 from agent.planner import call_llama_intent_parser
 from agent.tools import CalculatorTool, OutletTool
 
+logger = logging.getLogger(__name__)
+
 # Controller ties together intent parsing, tool dispatch, and memory management
 class ChatbotController:
     def __init__(self):
@@ -68,9 +74,11 @@ class ChatbotController:
             return "I didn't receive any message from you."
 
         # 2. Parse intent and slots using the planner (LLM)
-        parsed = call_llama_intent_parser(user_message)
+        # Off the event loop, so concurrent chats can overlap (and coalesce)
+        parsed = await run_in_threadpool(call_llama_intent_parser, user_message)
         intent = parsed.intent
         slots = parsed.slots
+        logger.debug("Routing intent %s", intent)
 
         # 3. Route based on intent
         if intent == "greeting":
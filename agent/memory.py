@@ -1,7 +1,11 @@
+from collections import OrderedDict
 from langchain.memory import ConversationBufferMemory
 from langchain.schema import messages_to_dict, messages_from_dict
+import os
 import json
 
+CHAT_MAX_SESSIONS = int(os.getenv("CHAT_MAX_SESSIONS", "10000"))
+
 class MemoryManager:
     """
     Wrapper around LangChain ConversationBufferMemory to manage conversational state.
@@ -26,6 +30,13 @@ class MemoryManager:
         # returns list of message objects
         return self.memory.chat_memory.messages
 
+    def get_latest_message(self, user: str | None = None) -> str | None:
+        """Return the text of the most recent user message, if any."""
+        for msg in reversed(self.memory.chat_memory.messages):
+            if msg.type == "human":
+                return msg.content
+        return None
+
     def load_memory(self, filepath: str):
         """Load memory from a JSON file containing serialized messages."""
         with open(filepath, 'r') as f:
@@ -43,6 +54,39 @@ class MemoryManager:
         """Clear the memory buffer."""
         self.memory.clear()
 
+class MemoryStore:
+    """
+    One MemoryManager per user, for this worker process. The least recently
+    active users are dropped beyond `max_users` (CHAT_MAX_SESSIONS).
+    """
+    def __init__(self, max_users: int = CHAT_MAX_SESSIONS):
+        self.max_users = max_users
+        self._memories: "OrderedDict[str, MemoryManager]" = OrderedDict()
+
+    def get(self, user: str) -> MemoryManager:
+        """The user's memory, created on first use."""
+        memory = self._memories.get(user)
+        if memory is None:
+            memory = self._memories[user] = MemoryManager()
+            while len(self._memories) > self.max_users:
+                self._memories.popitem(last=False)
+        else:
+            self._memories.move_to_end(user)
+        return memory
+
+    def __len__(self) -> int:
+        return len(self._memories)
+
+    def stats(self) -> dict:
+        """Users held, their messages and the characters those messages take."""
+        messages = [m for memory in list(self._memories.values()) for m in memory.get_history()]
+        return {
+            "entries": len(self._memories),
+            "limit": self.max_users,
+            "messages": len(messages),
+            "text_bytes": sum(len(str(m.content)) for m in messages),
+        }
+
 # Example usage:
 # mm = MemoryManager()
 # mm.add_user_message("Hello, is there an outlet in PJ?")
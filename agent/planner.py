@@ -1,10 +1,21 @@
 import os
+import re
 import json
+import logging
 from typing import Dict, Any
 import openai
 from pydantic import BaseModel, ValidationError, validator
 from openai import OpenAI
 
+from api.prompts import PromptTemplate, usage
+from api.tracing import traced
+from api.upstream import (
+    OPENROUTER_MAX_RETRIES, OPENROUTER_TIMEOUT, UpstreamUnavailableError,
+    call_openrouter, prompt_key,
+)
+
+logger = logging.getLogger(__name__)
+
 # Configure OpenRouter (Meta LLaMA 3.3 70B Instruct)
 # Set your OpenRouter API key in environment: OPENROUTER_API_KEY
 openai.api_key = os.getenv("OPENROUTER_API_KEY")
@@ -12,61 +23,28 @@ openai.api_key = os.getenv("OPENROUTER_API_KEY")
 client = OpenAI(
     api_key=os.getenv("OPENROUTER_API_KEY"),
     base_url=os.getenv("OPENROUTER_API_BASE", "https://openrouter.ai/api/v1"),
+    timeout=OPENROUTER_TIMEOUT,
+    max_retries=OPENROUTER_MAX_RETRIES,
 )
 
 # OpenRouter uses /chat/completions path
 openai.api_type = "open_ai"
 openai.api_version = None
 
-# Prompt template for LLaMA 3.3-70B Instruct JSON parsing
-LLAMA_INTENT_PROMPT = '''
-You are an AI assistant that extracts structured intent and slot data from natural language queries.
-Respond ONLY in valid JSON format:
-{
-  "intent": "<intent_name>",
-  "slots": {
-    "<slot1>": "...",
-    "<slot2>": "..."
-  }
-}
-
-Supported intents:
-- find_outlet
-- get_opening_hours
-- calculate
-- greeting
-- unknown
-
-Examples:
-
-User: "Where's the ZUS outlet in Petaling Jaya?"
-{
-  "intent": "find_outlet",
-  "slots": {
-    "location": "Petaling Jaya"
-  }
-}
-
-User: "SS2 outlet opening hours?"
-{
-  "intent": "get_opening_hours",
-  "slots": {
-    "outlet": "SS2"
-  }
-}
-
-User: "What is 12 * (5 + 2)?"
-{
-  "intent": "calculate",
-  "slots": {
-    "expression": "12 * (5 + 2)"
-  }
-}
-
-Now parse the following user input.
-
-User: "{user_input}"
-'''
+# Intent and slot extraction for LLaMA 3.3-70B Instruct. The instructions and
+# examples are a fixed prefix (api/prompts.py); only the user's message varies.
+INTENT_PROMPT = PromptTemplate(
+    "intent",
+    system=(
+        "You are an AI assistant that extracts structured intent and slot data from natural language queries. "
+        'Reply with one JSON object only: {"intent": "<intent>", "slots": {"<slot>": "<value>"}}.\n'
+        "Intents: find_outlet, get_opening_hours, calculate, greeting, unknown.\n"
+        "Examples:\n"
+        'Where\'s the ZUS outlet in Petaling Jaya? -> {"intent": "find_outlet", "slots": {"location": "Petaling Jaya"}}\n'
+        'SS2 outlet opening hours? -> {"intent": "get_opening_hours", "slots": {"outlet": "SS2"}}\n'
+        'What is 12 * (5 + 2)? -> {"intent": "calculate", "slots": {"expression": "12 * (5 + 2)"}}'
+    ),
+)
 
 class ParsedIntent(BaseModel):
     intent: str
@@ -80,19 +58,74 @@ class ParsedIntent(BaseModel):
         return v
 
 
+# Local heuristics used when the LLM is unavailable
+_EXPRESSION_RE = re.compile(r"[\d(][\d\s.()]*(?:[-+*/]|\*\*)[\d\s.()+\-*/]*[\d)]")
+_GREETING_RE = re.compile(r"^\s*(hi|hello|hey|good (morning|afternoon|evening))\b", re.IGNORECASE)
+_HOURS_RE = re.compile(r"\b(hours?|open(ing)?|clos(e|ing)|operat(e|ing))\b", re.IGNORECASE)
+_OUTLET_RE = re.compile(r"\b(outlets?|stores?|branch(es)?|shops?|where)\b", re.IGNORECASE)
+_LOCATION_RE = re.compile(r"\b(?:in|near|around)\s+(?!\d)([A-Za-z][\w\s/'&.-]*?)\s*[?.!]*$", re.IGNORECASE)
+_NAMED_OUTLET_RE = re.compile(r"\b(?:for|at)\s+(?:the\s+)?(?!\d)([A-Za-z0-9][\w\s'&.-]*?)(?:\s+outlet)?\s*(?:\bin\b.*)?[?.!]*$", re.IGNORECASE)
+_OUTLET_PREFIX_RE = re.compile(r"\b([A-Za-z0-9][\w'-]*)\s+outlet\b", re.IGNORECASE)
+_NOT_OUTLET_NAMES = {"the", "zus", "which", "any", "an", "a", "nearest", "your", "this", "that"}
+
+
+def heuristic_intent(user_input: str) -> ParsedIntent:
+    """
+    Rule-based intent and slot extraction covering the same intents as the
+    LLM prompt. Less accurate, but instant and always available.
+    """
+    text = user_input.strip()
+
+    expression = _EXPRESSION_RE.search(text)
+    if expression:
+        return ParsedIntent(intent="calculate", slots={"expression": expression.group(0).strip()})
+
+    if _GREETING_RE.match(text):
+        return ParsedIntent(intent="greeting", slots={})
+
+    slots: Dict[str, Any] = {}
+    location = _LOCATION_RE.search(text)
+    if location:
+        slots["location"] = location.group(1).strip()
+
+    if _HOURS_RE.search(text):
+        named = _NAMED_OUTLET_RE.search(text)
+        prefix = _OUTLET_PREFIX_RE.search(text)
+        if named:
+            slots["outlet"] = named.group(1).strip()
+        elif prefix and prefix.group(1).lower() not in _NOT_OUTLET_NAMES:
+            slots["outlet"] = prefix.group(1)
+        return ParsedIntent(intent="get_opening_hours", slots=slots)
+
+    if _OUTLET_RE.search(text):
+        return ParsedIntent(intent="find_outlet", slots=slots)
+
+    return ParsedIntent(intent="unknown", slots={})
+
+
+@traced("intent_parse")
 def call_llama_intent_parser(user_input: str) -> ParsedIntent:
     """
     Sends a prompt to Meta-LLaMA 3.3-70B Instruct via OpenRouter to parse intent and slots.
     Returns a validated ParsedIntent object.
-    Falls back to intent='unknown' on any errors.
+    Falls back to local heuristics when OpenRouter is unavailable, and to
+    intent='unknown' when the reply cannot be parsed.
     """
-    prompt = LLAMA_INTENT_PROMPT.format(user_input=user_input)
-    try:
+    messages = INTENT_PROMPT.messages(user_input)
+
+    def create():
         resp = client.chat.completions.create(
             model="meta-llama/llama-3.3-70b-instruct",  # OpenRouter model identifier
-            messages=[{"role": "user", "content": prompt}],
+            messages=messages,
             temperature=0.2,
         )
+        usage.record(INTENT_PROMPT.name, resp.usage, INTENT_PROMPT.estimate_tokens(user_input),
+                     resp.choices[0].message.content or "")
+        return resp
+
+    try:
+        # Identical concurrent messages share one upstream call
+        resp = call_openrouter(prompt_key("intent", user_input), create)
         content = resp.choices[0].message.content
         if content is None:
             raise ValueError("No content returned from LLM")
@@ -101,10 +134,16 @@ def call_llama_intent_parser(user_input: str) -> ParsedIntent:
         data = json.loads(content)
         # Validate
         parsed = ParsedIntent(**data)
+        logger.debug("Parsed intent %s with slots %s", parsed.intent, parsed.slots)
         return parsed
     except (json.JSONDecodeError, ValidationError, KeyError) as e:
         # On any parsing/validation error, return unknown intent
+        logger.warning("Intent parse failed, falling back to 'unknown': %s", e)
         return ParsedIntent(intent="unknown", slots={})
+    except (UpstreamUnavailableError, openai.OpenAIError) as e:
+        # Circuit open, queue saturated, or the call itself failed/timed out
+        logger.warning("Intent LLM unavailable, using local heuristics: %s", e)
+        return heuristic_intent(user_input)
 
 # Example usage:
 # parsed = call_llama_intent_parser("Is the SS2 outlet in PJ open now?")
@@ -1,45 +1,22 @@
 import os
-import ast
-import operator as op
+import re
+import logging
 import requests
 from typing import Dict, Any
 
-# Supported operators for safe evaluation
-_SAFE_OPERATORS = {
-    ast.Add: op.add,
-    ast.Sub: op.sub,
-    ast.Mult: op.mul,
-    ast.Div: op.truediv,
-    ast.Pow: op.pow,
-    ast.USub: op.neg,
-}
-
-def _safe_eval(node):
-    """
-    Recursively evaluate an AST node containing a numeric expression.
-    Only allows safe operators defined in _SAFE_OPERATORS.
-    """
-    if isinstance(node, ast.Num):  # <number>
-        return node.n
-    if isinstance(node, ast.BinOp):  # <left> <operator> <right>
-        left = _safe_eval(node.left)
-        right = _safe_eval(node.right)
-        op_func = _SAFE_OPERATORS.get(type(node.op))
-        if op_func is None:
-            raise ValueError(f"Operator {node.op} not supported")
-        return op_func(left, right)
-    if isinstance(node, ast.UnaryOp):  # - <operand>
-        operand = _safe_eval(node.operand)
-        op_func = _SAFE_OPERATORS.get(type(node.op))
-        if op_func is None:
-            raise ValueError(f"Unary operator {node.op} not supported")
-        return op_func(operand)
-    raise ValueError(f"Unsupported expression: {node}")
+from api.calc_engine import evaluate
+from api.prompts import PromptTemplate, usage
+from api.tracing import span, traced
+from api.upstream import (
+    OPENROUTER_TIMEOUT, UpstreamUnavailableError, call_openrouter, prompt_key,
+)
+
+logger = logging.getLogger(__name__)
 
 class CalculatorTool:
     """
     Simple calculator tool for arithmetic expressions.
-    Uses a safe AST-based evaluator to prevent code injection.
+    Uses the shared, bounded evaluator in api/calc_engine.
     """
     def __init__(self):
         pass
@@ -50,10 +27,8 @@ class CalculatorTool:
         Returns the numeric result or raises ValueError on invalid input.
         """
         try:
-            # Parse expression into AST
-            tree = ast.parse(expression, mode='eval')
-            return _safe_eval(tree.body)
-        except Exception as e:
+            return evaluate(expression)
+        except ValueError as e:
             raise ValueError(f"Error evaluating expression '{expression}': {e}")
 
 class OutletTool:
@@ -91,9 +66,10 @@ class OutletTool:
 
         # Call the FastAPI endpoint
         try:
-            resp = requests.get(
-                f"{self.base_url}/outlets", params={"query": nl_query}, timeout=5
-            )
+            with span("outlet_query", intent=intent):
+                resp = requests.get(
+                    f"{self.base_url}/outlets", params={"query": nl_query}, timeout=5
+                )
             resp.raise_for_status()
             data = resp.json()
             # Assume the API returns {'results': [...], 'summary': '...'}
@@ -107,11 +83,79 @@ class OutletTool:
                 return "Here are the outlets I found:\n" + "\n".join(lines)
             return "No outlets found matching your query."
         except requests.RequestException as e:
+            logger.warning("Outlet service request failed: %s", e)
             return f"Sorry, I couldn't reach the outlets service: {e}"
         
+_TIME_RE = re.compile(r"\b(\d{1,2})(?:[:.](\d{2}))?\s*(am|pm)?\b")
+_PLACE_RE = re.compile(
+    r"\b(?:in|near|at|for)\s+(?:the\s+)?(?!\d)([a-z][\w\s/'&.-]*?)"
+    r"(?=\s+(?:in|are|is|that|which|with|outlets?|stores?|branch(?:es)?|open|opening|close|closing)\b|\s*[?.!,]|$)"
+)
+_SERVICE_COLUMNS = {"dine in": "dine_in", "dine-in": "dine_in", "delivery": "delivery", "pickup": "pickup", "pick up": "pickup"}
+
+
+def _hhmm(match: re.Match) -> str:
+    hour, minute, meridiem = int(match.group(1)), match.group(2) or "00", match.group(3)
+    if meridiem == "pm" and hour < 12:
+        hour += 12
+    if meridiem == "am" and hour == 12:
+        hour = 0
+    return f"{hour:02d}:{minute}"
+
+
+def templated_sql(query: str) -> str:
+    """
+    Build a conservative SELECT over the outlets table from keywords in the
+    question. Used instead of the LLM when OpenRouter is unavailable.
+    """
+    text = query.lower()
+    conditions = []
+
+    place = _PLACE_RE.search(text)
+    if place and place.group(1).strip() not in ("all", "the opening hours"):
+        term = place.group(1).strip().replace("'", "''")
+        conditions.append(f"(name LIKE '%{term}%' OR location LIKE '%{term}%' OR address LIKE '%{term}%')")
+
+    when = _TIME_RE.search(text)
+    if when:
+        hhmm = _hhmm(when)
+        if re.search(r"\b(after|until|till|late|close|closing)\b", text):
+            conditions.append(f"closing_time >= '{hhmm}'")
+        elif "before" in text:
+            conditions.append(f"opening_time < '{hhmm}'")
+        else:
+            conditions.append(f"opening_time <= '{hhmm}'")
+
+    for phrase, column in _SERVICE_COLUMNS.items():
+        if phrase in text:
+            conditions.append(f"{column} = 1")
+
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    if re.search(r"\bhow many\b|\bcount\b|\bnumber of\b", text):
+        return f"SELECT COUNT(*) AS count FROM outlets{where}"
+    columns = "id, name, location, address, opening_time, closing_time"
+    if re.search(r"\b(hours?|open|opening|close|closing)\b", text):
+        columns = "id, name, location, opening_time, closing_time"
+    return f"SELECT {columns} FROM outlets{where} LIMIT 50"
+
+
+# The schema is part of the fixed prefix (api/prompts.py), so it is identical on every call
+SQL_PROMPT = PromptTemplate(
+    "sql",
+    system=(
+        "You are a helpful SQL generator that only returns valid SQLite SELECT queries. Do not explain.\n"
+        "Schema: outlets(id INTEGER, name TEXT, location TEXT, address TEXT, opening_time TEXT 'HH:MM', "
+        "closing_time TEXT 'HH:MM', dine_in BOOLEAN, delivery BOOLEAN, pickup BOOLEAN)\n"
+        "Convert the user's question into one SQLite SELECT statement."
+    ),
+)
+
+
+@traced("sql_generation")
 def generate_sql(query: str) -> str:
     """
     Calls LLaMA 3 via OpenRouter to convert a user query into SQL.
+    Falls back to `templated_sql` while OpenRouter is unavailable.
     """
     OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
     if not OPENROUTER_API_KEY:
@@ -122,43 +166,27 @@ def generate_sql(query: str) -> str:
         "Content-Type": "application/json"
     }
 
-    schema = """
-    Table: outlets
-    Columns:
-    - id: INTEGER
-    - name: TEXT
-    - location: TEXT
-    - address: TEXT
-    - opening_time: TEXT (HH:MM)
-    - closing_time: TEXT (HH:MM)
-    - dine_in: BOOLEAN
-    - delivery: BOOLEAN
-    - pickup: BOOLEAN
-    """
-
-    system_prompt = "You are a helpful SQL generator that only returns valid SQLite SELECT queries. Do not explain."
-
-    user_prompt = f"""
-    Given this table schema:
-
-    {schema}
-
-    Convert this user query into a valid SQLite SELECT statement:
-    "{query}"
-    """
-
     body = {
         "model": "meta-llama/llama-3.3-70b-instruct",
-        "messages": [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ]
+        "messages": SQL_PROMPT.messages(query),
     }
 
     try:
-        response = requests.post("https://openrouter.ai/api/v1/chat/completions", headers=headers, json=body)
-        response.raise_for_status()
-        sql = response.json()["choices"][0]["message"]["content"]
+        base_url = os.getenv("OPENROUTER_API_BASE", "https://openrouter.ai/api/v1")
+        def post():
+            response = requests.post(
+                f"{base_url}/chat/completions", headers=headers, json=body, timeout=OPENROUTER_TIMEOUT
+            )
+            response.raise_for_status()
+            reply = response.json()
+            content = reply["choices"][0]["message"]["content"]
+            usage.record(SQL_PROMPT.name, reply.get("usage"), SQL_PROMPT.estimate_tokens(query), content or "")
+            return content
+        sql = call_openrouter(prompt_key("sql", query), post)
         return sql.strip().split("```")[0]  # if model wraps output in code block
+    except UpstreamUnavailableError as e:
+        logger.warning("SQL LLM unavailable, using templated SQL: %s", e)
+        return templated_sql(query)
     except Exception as e:
+        logger.warning("SQL generation failed: %s", e)
         raise RuntimeError(f"Failed to generate SQL: {e}")
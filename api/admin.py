@@ -0,0 +1,336 @@
+"""
+Admin-only diagnostics for a live worker, mounted under /admin by app.py and
+api/main.py. Disabled unless ADMIN_TOKEN is set; every request must then send
+`Authorization: Bearer <ADMIN_TOKEN>`. While disabled the routes answer 404
+and are left out of the OpenAPI schema.
+
+    GET  /admin/memory           RSS, GC counts and tracemalloc totals
+    POST /admin/memory/start     start tracemalloc (?frames=) and take a baseline snapshot
+    POST /admin/memory/snapshot  replace the baseline with a fresh snapshot
+    GET  /admin/memory/top       largest allocators now (?limit=, ?group_by=lineno|filename|traceback)
+    GET  /admin/memory/diff      growth since the baseline, largest first
+    POST /admin/memory/stop      stop tracemalloc and drop the baseline
+    GET  /admin/profile/cpu      sample every thread's stack for ?seconds= at ?hz= and return
+                                 collapsed stacks ("thread;file:func;file:func count" per line),
+                                 the input of flamegraph.pl, speedscope and inferno
+    GET  /admin/caches           entries and approximate bytes of every cache, index and
+                                 model this worker holds
+
+tracemalloc slows every allocation while it runs, so it is only on between
+start and stop. The CPU profiler is a plain sampler over
+`sys._current_frames()`: it sees Python frames only (time in C shows on its
+caller), costs nothing when not running, and one profile runs at a time.
+Idle threads (waiting pool workers, the event loop's select) are dropped
+unless ?idle=true. /admin/caches only inspects modules this worker has
+already imported, so it never loads a model or index itself.
+
+Environment (defaults in brackets):
+    ADMIN_TOKEN                  bearer token for /admin; unset disables it   [unset]
+    ADMIN_PROFILE_MAX_SECONDS    longest CPU profile                          [60]
+    ADMIN_PROFILE_HZ             default sampling rate                        [100]
+"""
+import gc
+import os
+import sys
+import time
+import secrets
+import threading
+import tracemalloc
+from collections import Counter
+from typing import Dict, List, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+ADMIN_PROFILE_MAX_SECONDS = float(os.getenv("ADMIN_PROFILE_MAX_SECONDS", "60"))
+ADMIN_PROFILE_HZ = float(os.getenv("ADMIN_PROFILE_HZ", "100"))
+
+# Leaf frames of threads that are waiting, not working: (file name, function)
+_IDLE_LEAVES = {
+    ("threading.py", "wait"), ("thread.py", "_worker"), ("selectors.py", "select"),
+    ("queue.py", "get"), ("base_events.py", "_run_once"),
+}
+_TRACEMALLOC_NOISE = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+)
+
+_baseline: Optional[tracemalloc.Snapshot] = None
+_memory_lock = threading.Lock()
+_profile_lock = threading.Lock()
+
+
+def require_admin(authorization: str = Header(default="")):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not secrets.compare_digest(token.strip(), ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Admin token required.",
+                            headers={"WWW-Authenticate": "Bearer"})
+
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)], include_in_schema=False)
+
+
+def rss_bytes() -> Optional[int]:
+    """Resident set size of this process (Linux), or None."""
+    try:
+        with open("/proc/self/status", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def _short_path(filename: str) -> str:
+    """`filename` relative to the working directory, or to its site-packages/stdlib root."""
+    cwd = os.getcwd() + os.sep
+    if filename.startswith(cwd):
+        return filename[len(cwd):]
+    for marker in ("site-packages" + os.sep, "dist-packages" + os.sep):
+        if marker in filename:
+            return filename.split(marker, 1)[1]
+    return os.path.basename(filename)
+
+
+def _statistic(stat, group_by: str) -> dict:
+    frame = stat.traceback[0]
+    entry = {
+        "where": f"{_short_path(frame.filename)}:{frame.lineno}" if group_by != "filename" else _short_path(frame.filename),
+        "size_bytes": stat.size,
+        "count": stat.count,
+    }
+    if hasattr(stat, "size_diff"):
+        entry["size_diff_bytes"] = stat.size_diff
+        entry["count_diff"] = stat.count_diff
+    if group_by == "traceback":
+        entry["traceback"] = [f"{_short_path(f.filename)}:{f.lineno}" for f in stat.traceback]
+    return entry
+
+
+def _take_snapshot() -> tracemalloc.Snapshot:
+    if not tracemalloc.is_tracing():
+        raise HTTPException(status_code=409, detail="tracemalloc is not running; POST /admin/memory/start first.")
+    return tracemalloc.take_snapshot().filter_traces(_TRACEMALLOC_NOISE)
+
+
+def memory_status() -> dict:
+    status = {"rss_bytes": rss_bytes(), "gc_counts": gc.get_count(), "gc_objects": len(gc.get_objects()),
+              "tracemalloc": tracemalloc.is_tracing(), "baseline": _baseline is not None}
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        status.update(traced_bytes=current, traced_peak_bytes=peak,
+                      traceback_frames=tracemalloc.get_traceback_limit())
+    return status
+
+
+@router.get("/memory")
+def memory():
+    return memory_status()
+
+
+@router.post("/memory/start")
+def memory_start(frames: int = Query(25, ge=1, le=100)):
+    global _baseline
+    with _memory_lock:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        _baseline = _take_snapshot()
+    return memory_status()
+
+
+@router.post("/memory/snapshot")
+def memory_snapshot():
+    global _baseline
+    with _memory_lock:
+        _baseline = _take_snapshot()
+    return memory_status()
+
+
+@router.get("/memory/top")
+def memory_top(limit: int = Query(25, ge=1, le=500),
+               group_by: str = Query("lineno", pattern="^(lineno|filename|traceback)$")):
+    stats = _take_snapshot().statistics(group_by)
+    return {**memory_status(), "group_by": group_by, "top": [_statistic(s, group_by) for s in stats[:limit]]}
+
+
+@router.get("/memory/diff")
+def memory_diff(limit: int = Query(25, ge=1, le=500),
+                group_by: str = Query("lineno", pattern="^(lineno|filename|traceback)$")):
+    snapshot = _take_snapshot()
+    with _memory_lock:
+        baseline = _baseline
+    if baseline is None:
+        raise HTTPException(status_code=409, detail="No baseline; POST /admin/memory/snapshot first.")
+    stats = snapshot.compare_to(baseline, group_by)
+    return {**memory_status(), "group_by": group_by, "growth": [_statistic(s, group_by) for s in stats[:limit]]}
+
+
+@router.post("/memory/stop")
+def memory_stop():
+    global _baseline
+    with _memory_lock:
+        _baseline = None
+        tracemalloc.stop()
+    return memory_status()
+
+
+def sample_stacks(seconds: float, hz: float, idle: bool = False) -> Counter:
+    """Collapsed stack -> samples for every other thread of this process, over `seconds`."""
+    me = threading.get_ident()
+    interval = 1.0 / hz
+    counts: Counter = Counter()
+    deadline = time.monotonic() + seconds
+    while True:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            code = frame.f_code
+            if not idle and (os.path.basename(code.co_filename), code.co_name) in _IDLE_LEAVES:
+                continue
+            frames: List[str] = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f"{_short_path(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            frames.append(names.get(ident, f"thread-{ident}"))
+            # ';' separates frames and the last space the count, so neither may appear in a name
+            counts[";".join(f.replace(";", ":").replace(" ", "_") for f in reversed(frames))] += 1
+        if time.monotonic() >= deadline:
+            return counts
+        time.sleep(interval)
+
+
+def collapse(counts: Counter) -> str:
+    return "".join(f"{stack} {n}\n" for stack, n in sorted(counts.items()))
+
+
+@router.get("/profile/cpu")
+def profile_cpu(seconds: float = Query(10.0, gt=0), hz: Optional[float] = Query(None, gt=0, le=1000),
+                idle: bool = False):
+    """Runs in the thread pool, so the event loop (and its stacks) keep going meanwhile."""
+    if seconds > ADMIN_PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=422, detail=f"`seconds` must be at most {ADMIN_PROFILE_MAX_SECONDS:g}.")
+    if not _profile_lock.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="A CPU profile is already running.")
+    try:
+        counts = sample_stacks(seconds, hz or ADMIN_PROFILE_HZ, idle)
+    finally:
+        _profile_lock.release()
+    filename = time.strftime("cpu-%Y%m%dT%H%M%S.collapsed")
+    return PlainTextResponse(collapse(counts), headers={
+        "cache-control": "no-store", "content-disposition": f'attachment; filename="{filename}"',
+    })
+
+
+def _faiss_bytes(index) -> int:
+    from api.vector_index import index_memory_bytes
+
+    return index_memory_bytes(index)
+
+
+def _model_bytes(model) -> Optional[int]:
+    """Approximate weight bytes of an embedding or cross-encoder model, or None for remote ones."""
+    model = getattr(model, "embeddings", model)  # BatchedEmbeddings
+    if getattr(model, "model_path", None):
+        return os.path.getsize(model.model_path)
+    for attr in ("client", "model"):
+        parameters = getattr(getattr(model, attr, None), "parameters", None)
+        if callable(parameters):
+            return sum(p.numel() * p.element_size() for p in parameters())
+    return None
+
+
+def cache_sizes() -> Dict[str, dict]:
+    """Entries (and bytes, where cheap to get) per cache, index and model of the loaded modules."""
+    report: Dict[str, dict] = {}
+    loaded = sys.modules.get
+
+    main = loaded("api.main")
+    if main is not None:
+        report["rag.documents"] = {"entries": len(main._documents),
+                                   "text_bytes": sum(len(d.page_content) for d in main._documents)}
+        if main._vectorstore is not None:
+            index = main._vectorstore
+            report["rag.vector_index"] = {
+                "entries": index.ntotal, "partitions": len(index.partitions),
+                "bytes": sum(_faiss_bytes(i) for i, _ in index.partitions.values())
+                + sum(p.nbytes for values in index.postings.values() for p in values.values()),
+            }
+        if main._keyword_index is not None:
+            report["rag.keyword_index"] = {"entries": len(main._keyword_index),
+                                           "terms": len(main._keyword_index.postings)}
+        if main._embeddings is not None:
+            report["rag.embeddings_model"] = {"type": type(getattr(main._embeddings, "embeddings", main._embeddings)).__name__,
+                                              "bytes": _model_bytes(main._embeddings)}
+
+    products = loaded("api.products")
+    if products is not None:
+        report["products.index"] = {"entries": products.faiss_index.ntotal if products.faiss_index is not None else 0,
+                                    "bytes": _faiss_bytes(products.faiss_index) if products.faiss_index is not None else 0}
+        report["products.meta"] = {"entries": len(products.products_meta)}
+
+    rerank = loaded("api.rerank")
+    if rerank is not None:
+        report["rerank.scores"] = {"entries": len(rerank._scores), "limit": rerank.RERANK_CACHE_SIZE}
+        if rerank._model:
+            report["rerank.model"] = {"type": type(rerank._model).__name__, "bytes": _model_bytes(rerank._model)}
+
+    calc = loaded("api.calc_engine")
+    if calc is not None:
+        info = calc.compile_expression.cache_info()
+        report["calc.compiled"] = {"entries": info.currsize, "limit": info.maxsize, "hits": info.hits, "misses": info.misses}
+
+    sql_guard = loaded("api.sql_guard")
+    if sql_guard is not None:
+        report["sql.results"] = {"entries": len(sql_guard._cache), "limit": sql_guard.SQL_CACHE_SIZE}
+        report["sql.table_rows"] = {"entries": len(sql_guard._table_rows)}
+
+    snapshot = loaded("api.snapshot")
+    if snapshot is not None:
+        # Memory-mapped: counted in RSS only as far as pages have been touched
+        report["snapshot.tables"] = {"entries": len(snapshot._tables),
+                                     "mapped_bytes": sum(t.nbytes for _, t in list(snapshot._tables.values()))}
+
+    documents = loaded("api.documents")
+    if documents is not None:
+        report["documents.csv"] = {"entries": len(documents._cache),
+                                   "documents": sum(len(docs) for _, docs in list(documents._cache.values()))}
+
+    faq = loaded("api.faq")
+    if faq is not None:
+        report["faq.table"] = {"entries": len(faq._loaded[2].get("entries", [])) if faq._loaded else 0,
+                               "signatures": len(faq._loaded[3]) if faq._loaded else 0}
+
+    http_cache = loaded("api.http_cache")
+    if http_cache is not None:
+        report["http.static_digests"] = {"entries": len(http_cache._digests)}
+
+    upstream = loaded("api.upstream")
+    if upstream is not None:
+        report["upstream.inflight"] = {"entries": len(upstream.single_flight._inflight)}
+
+    tracing = loaded("api.tracing")
+    if tracing is not None:
+        report["tracing.stages"] = {"entries": len(tracing.collector._stages),
+                                    "limit_per_stage": tracing.collector.sample_size}
+
+    ws_chat = loaded("api.ws_chat")
+    if ws_chat is not None:
+        report["ws.connections"] = {"entries": len(ws_chat.hub.connections), "limit": ws_chat.WS_MAX_CONNECTIONS,
+                                    "pending_turns": sum(len(c.pending) for c in list(ws_chat.hub.connections))}
+
+    app = loaded("app")
+    if app is not None and hasattr(app, "memories"):
+        report["chat.memories"] = app.memories.stats()
+    return report
+
+
+@router.get("/caches")
+def caches():
+    return {"rss_bytes": rss_bytes(), "caches": cache_sizes()}
@@ -0,0 +1,87 @@
+"""
+Shared plumbing for the NDJSON batch endpoints (POST /rag/query/batch and
+POST /products/qa/batch), used by offline jobs such as FAQ generation and QA
+regression runs.
+
+A batch endpoint de-duplicates its queries and retrieves for all the
+distinct ones together: one batched embeddings call per chunk and one
+multi-query FAISS search. It then hands per-query answer generation to
+`stream_results`. That runs the generations on a bounded thread pool and
+yields one JSON line per original query as soon as its answer is ready, so
+completion order, not request order, decides the output order. Each line
+carries the query's `index` in the request; a query that fails gets an
+`error` line instead of failing the batch. If the client disconnects, the
+closed generator cancels every generation that hasn't started yet.
+
+Environment (defaults in brackets):
+    BATCH_MAX_QUERIES       queries accepted per request              [5000]
+    BATCH_MAX_CONCURRENCY   answers generated at once per request     [16]
+    BATCH_EMBED_CHUNK       query texts per embeddings call           [256]
+"""
+import os
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", "5000"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "16"))
+BATCH_EMBED_CHUNK = int(os.getenv("BATCH_EMBED_CHUNK", "256"))
+
+logger = logging.getLogger(__name__)
+
+
+def check_batch_size(count: int):
+    if count == 0:
+        raise HTTPException(status_code=400, detail="`queries` must not be empty.")
+    if count > BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_QUERIES} queries per request.")
+
+
+def dedupe(keys: Iterable[Hashable]) -> Tuple[List[Hashable], Dict[Hashable, List[int]]]:
+    """Distinct keys in first-seen order, and every request index of each."""
+    positions: Dict[Hashable, List[int]] = {}
+    for index, key in enumerate(keys):
+        positions.setdefault(key, []).append(index)
+    return list(positions), positions
+
+
+def _line(index: int, payload: Dict[str, Any]) -> str:
+    return json.dumps({"index": index, **payload}, ensure_ascii=False) + "\n"
+
+
+def error_lines(positions: Dict[Hashable, List[int]], error: Exception) -> Iterator[str]:
+    """An error line for every query, for failures before generation starts."""
+    detail = f"{type(error).__name__}: {error}"
+    for indexes in positions.values():
+        for index in indexes:
+            yield _line(index, {"error": detail})
+
+
+def stream_results(unique: List[Hashable], positions: Dict[Hashable, List[int]],
+                   work: Callable[[Hashable], Dict[str, Any]],
+                   max_concurrency: Optional[int] = None) -> Iterator[str]:
+    """Run `work(key)` for each distinct key, at most `max_concurrency` at once, yielding NDJSON as they finish."""
+    workers = max(1, min(max_concurrency or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY, len(unique) or 1))
+    pool = ThreadPoolExecutor(workers, thread_name_prefix="batch")
+    try:
+        futures = {pool.submit(work, key): key for key in unique}
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                payload = future.result()
+            except Exception as e:
+                logger.warning("Batch query failed: %s: %s", type(e).__name__, e)
+                payload = {"error": f"{type(e).__name__}: {e}"}
+            for index in positions[key]:
+                yield _line(index, payload)
+    finally:
+        # Runs on client disconnect too (GeneratorExit): drop the queued work instead of waiting for it
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def ndjson_response(lines: Iterator[str]) -> StreamingResponse:
+    return StreamingResponse(lines, media_type="application/x-ndjson")
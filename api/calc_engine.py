@@ -0,0 +1,240 @@
+"""
+Shared arithmetic engine for GET /calculate, POST /calculate/batch and the
+chat agent's CalculatorTool.
+
+Expressions are parsed with `ast` and compiled, without recursion, into a
+postfix program. The program's shape is its opcodes with every number
+replaced by a slot, and its constants fill the slots. Programs are
+LRU-cached per expression text and evaluated with a value stack. Both
+steps enforce limits, so hostile input (`9**9**9`, thousands of nested
+brackets) fails fast instead of pinning a worker:
+
+    length     characters in the expression
+    nodes      AST nodes
+    depth      AST nesting
+    magnitude  |value| of every constant and intermediate result; `**` is
+               checked before it runs, from the operands' sizes
+    time       wall-clock budget per expression
+
+`evaluate_many` groups a batch by program shape. A large group with one
+shape (e.g. "a*(1+b)/c" for many a, b, c) runs once as NumPy float64 column
+operations. Rows whose vector result is not finite, goes past a limit, or
+leaves float64's exact range are recomputed on the scalar path, so every
+row gets the same result or error it would get on its own.
+
+Environment (defaults in brackets):
+    CALC_MAX_LENGTH        expression characters                   [500]
+    CALC_MAX_NODES         AST nodes                               [200]
+    CALC_MAX_DEPTH         AST nesting depth                       [100]
+    CALC_MAX_MAGNITUDE     largest |value| allowed                 [1e300]
+    CALC_TIME_LIMIT_MS     evaluation budget per expression        [50]
+    CALC_CACHE_SIZE        compiled expressions kept               [4096]
+    CALC_VECTOR_MIN_GROUP  same-shape rows needed to vectorise     [8]
+"""
+import os
+import ast
+import math
+import time
+import operator as op
+from functools import lru_cache
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+CALC_MAX_LENGTH = int(os.getenv("CALC_MAX_LENGTH", "500"))
+CALC_MAX_NODES = int(os.getenv("CALC_MAX_NODES", "200"))
+CALC_MAX_DEPTH = int(os.getenv("CALC_MAX_DEPTH", "100"))
+CALC_MAX_MAGNITUDE = float(os.getenv("CALC_MAX_MAGNITUDE", "1e300"))
+CALC_TIME_LIMIT_MS = float(os.getenv("CALC_TIME_LIMIT_MS", "50"))
+CALC_CACHE_SIZE = int(os.getenv("CALC_CACHE_SIZE", "4096"))
+CALC_VECTOR_MIN_GROUP = int(os.getenv("CALC_VECTOR_MIN_GROUP", "8"))
+
+Number = Union[int, float]
+
+CONST = "#"
+_BINARY = {ast.Add: "add", ast.Sub: "sub", ast.Mult: "mul", ast.Div: "div", ast.Pow: "pow"}
+_UNARY = {ast.USub: "neg"}
+_SCALAR_OPS = {"add": op.add, "sub": op.sub, "mul": op.mul, "div": op.truediv}
+_VECTOR_OPS = {"add": np.add, "sub": np.subtract, "mul": np.multiply, "div": np.divide, "pow": np.power}
+_MAX_DIGITS = math.log10(CALC_MAX_MAGNITUDE)
+# float64 represents every integer up to here exactly
+_EXACT_LIMIT = float(2 ** 53)
+
+
+class CalculationError(ValueError):
+    """The expression is invalid or can't be evaluated (e.g. division by zero)."""
+
+
+class CalculationLimitError(CalculationError):
+    """The expression exceeds a size, magnitude or time limit."""
+
+
+class Program:
+    """A compiled expression: postfix `shape` with CONST slots filled from `constants`."""
+    __slots__ = ("shape", "constants")
+
+    def __init__(self, shape: Tuple[str, ...], constants: Tuple[Number, ...]):
+        self.shape = shape
+        self.constants = constants
+
+
+@lru_cache(maxsize=CALC_CACHE_SIZE)
+def compile_expression(expression: str) -> Program:
+    """Parse and compile `expression` (cached); raises CalculationError."""
+    expression = expression.strip()
+    if not expression:
+        raise CalculationError("Empty expression")
+    if len(expression) > CALC_MAX_LENGTH:
+        raise CalculationLimitError(f"Expression longer than {CALC_MAX_LENGTH} characters")
+    try:
+        tree = ast.parse(expression, mode="eval")
+    except (SyntaxError, ValueError, RecursionError, MemoryError) as e:
+        raise CalculationError(f"Could not parse expression: {e}")
+
+    shape: List[str] = []
+    constants: List[Number] = []
+    nodes = 0
+    # (node, depth, children_done): post-order walk with an explicit stack
+    stack = [(tree.body, 1, False)]
+    while stack:
+        node, depth, children_done = stack.pop()
+        if children_done:
+            shape.append(_BINARY.get(type(node.op)) or _UNARY[type(node.op)])
+            continue
+        nodes += 1
+        if nodes > CALC_MAX_NODES:
+            raise CalculationLimitError(f"Expression has more than {CALC_MAX_NODES} terms")
+        if depth > CALC_MAX_DEPTH:
+            raise CalculationLimitError(f"Expression nested deeper than {CALC_MAX_DEPTH}")
+        if isinstance(node, ast.Constant):
+            value = node.value
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise CalculationError(f"Constants of type {type(value).__name__} are not supported")
+            _check_magnitude(value)
+            shape.append(CONST)
+            constants.append(value)
+        elif isinstance(node, ast.BinOp):
+            if type(node.op) not in _BINARY:
+                raise CalculationError(f"Operator {type(node.op).__name__} is not supported")
+            stack.append((node, depth, True))
+            stack.append((node.right, depth + 1, False))
+            stack.append((node.left, depth + 1, False))
+        elif isinstance(node, ast.UnaryOp):
+            if type(node.op) not in _UNARY:
+                raise CalculationError(f"Unary operator {type(node.op).__name__} is not supported")
+            stack.append((node, depth, True))
+            stack.append((node.operand, depth + 1, False))
+        else:
+            raise CalculationError(f"Unsupported expression node: {type(node).__name__}")
+    return Program(tuple(shape), tuple(constants))
+
+
+def _check_magnitude(value: Number) -> Number:
+    if isinstance(value, complex):
+        raise CalculationError("Complex numbers are not supported")
+    if isinstance(value, float) and math.isnan(value):
+        raise CalculationError("Result is not a number")
+    if abs(value) > CALC_MAX_MAGNITUDE:
+        raise CalculationLimitError(f"Value exceeds {CALC_MAX_MAGNITUDE:g}")
+    return value
+
+
+def _power(base: Number, exponent: Number) -> Number:
+    # Size the result from the operands before computing it: 9**9**9 never runs
+    if abs(base) > 1 and exponent > 0 and exponent * math.log10(abs(base)) > _MAX_DIGITS:
+        raise CalculationLimitError(f"Result of ** exceeds {CALC_MAX_MAGNITUDE:g}")
+    if 0 < abs(base) < 1 and exponent < 0 and -exponent * -math.log10(abs(base)) > _MAX_DIGITS:
+        raise CalculationLimitError(f"Result of ** exceeds {CALC_MAX_MAGNITUDE:g}")
+    return base ** exponent
+
+
+def run(program: Program, time_limit_ms: float = CALC_TIME_LIMIT_MS) -> Number:
+    """Evaluate a compiled program; ints stay exact, raises CalculationError."""
+    deadline = time.perf_counter() + time_limit_ms / 1000
+    values: List[Number] = []
+    constants = iter(program.constants)
+    try:
+        for code in program.shape:
+            if code == CONST:
+                values.append(next(constants))
+                continue
+            if code == "neg":
+                result = -values.pop()
+            else:
+                right = values.pop()
+                left = values.pop()
+                result = _power(left, right) if code == "pow" else _SCALAR_OPS[code](left, right)
+            values.append(_check_magnitude(result))
+            if time.perf_counter() > deadline:
+                raise CalculationLimitError(f"Evaluation took longer than {time_limit_ms:g} ms")
+    except ZeroDivisionError:
+        raise CalculationError("Division by zero")
+    except OverflowError:
+        raise CalculationLimitError(f"Value exceeds {CALC_MAX_MAGNITUDE:g}")
+    return values[0]
+
+
+def evaluate(expression: str) -> Number:
+    """Evaluate one expression with the shared limits and cache."""
+    return run(compile_expression(expression))
+
+
+def _run_vector(shape: Tuple[str, ...], columns: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Run one program shape over many rows: `columns[i]` holds constant slot i
+    for every row. Returns float64 results and a mask of rows whose every
+    step stayed finite, within the magnitude limit and exactly representable.
+    """
+    ok = np.ones(columns.shape[1], dtype=bool)
+    values: List[np.ndarray] = []
+    slot = 0
+    with np.errstate(all="ignore"):
+        for code in shape:
+            if code == CONST:
+                result = columns[slot]
+                slot += 1
+            elif code == "neg":
+                result = -values.pop()
+            else:
+                right = values.pop()
+                left = values.pop()
+                result = _VECTOR_OPS[code](left, right)
+            magnitude = np.abs(result)
+            ok &= np.isfinite(result) & (magnitude <= CALC_MAX_MAGNITUDE) & (magnitude < _EXACT_LIMIT)
+            values.append(result)
+    return values[0], ok
+
+
+def evaluate_many(expressions: Sequence[str]) -> List[Tuple[Optional[Number], Optional[str]]]:
+    """
+    (result, error) per expression, in order. Groups of at least
+    CALC_VECTOR_MIN_GROUP same-shape expressions are vectorised; vector
+    results are floats.
+    """
+    results: List[Tuple[Optional[Number], Optional[str]]] = [(None, None)] * len(expressions)
+    programs: Dict[int, Program] = {}
+    groups: Dict[Tuple[str, ...], List[int]] = defaultdict(list)
+    for i, expression in enumerate(expressions):
+        try:
+            programs[i] = compile_expression(expression)
+        except CalculationError as e:
+            results[i] = (None, str(e))
+            continue
+        groups[programs[i].shape].append(i)
+
+    for shape, rows in groups.items():
+        scalar_rows = rows
+        if len(rows) >= CALC_VECTOR_MIN_GROUP and CONST in shape:
+            columns = np.array([programs[i].constants for i in rows], dtype=np.float64).T
+            values, ok = _run_vector(shape, columns)
+            for row, value, row_ok in zip(rows, values.tolist(), ok.tolist()):
+                if row_ok:
+                    results[row] = (value, None)
+            scalar_rows = [row for row, row_ok in zip(rows, ok.tolist()) if not row_ok]
+        for row in scalar_rows:
+            try:
+                results[row] = (run(programs[row]), None)
+            except CalculationError as e:
+                results[row] = (None, str(e))
+    return results
@@ -1,61 +1,30 @@
 from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel, Field
-import ast
-import operator as op
+from typing import List, Optional
+import os
 
-router = APIRouter();
+from api.calc_engine import CalculationError, evaluate, evaluate_many
+from api.tracing import span
 
-_SAFE_OPERATORS = {
-    ast.Add: op.add,
-    ast.Sub: op.sub,
-    ast.Mult: op.mul,
-    ast.Div: op.truediv,
-    ast.Pow: op.pow,
-    ast.USub: op.neg
-}
+CALC_MAX_BATCH = int(os.getenv("CALC_MAX_BATCH", "1000"))
 
-def _safe_eval(node):
-    """
-    Recursively evaluate an AST node for numeric expressions,
-    allowing only the operators in _SAFE_OPERATORS.
-    """
-    # 1. Literal numbers (Python ≥3.8 uses ast.Constant for numbers)
-    if isinstance(node, ast.Constant):
-        if isinstance(node.value, (int, float)):
-            return node.value
-        else:
-            raise ValueError(f"Constants of type {type(node.value)} are not supported")
-
-    # 2. Numeric literals in older Python versions
-    if isinstance(node, ast.Num):  # <number>
-        return node.n
-
-    # 3. Binary operations (e.g. 1 + 2, 3*4)
-    if isinstance(node, ast.BinOp):
-        left_val = _safe_eval(node.left)
-        right_val = _safe_eval(node.right)
-        op_type = type(node.op)
-        if op_type in _SAFE_OPERATORS:
-            return _SAFE_OPERATORS[op_type](left_val, right_val)
-        else:
-            raise ValueError(f"Operator {op_type.__name__} is not supported")
-
-    # 4. Unary operations (e.g. -5)
-    if isinstance(node, ast.UnaryOp):
-        operand_val = _safe_eval(node.operand)
-        op_type = type(node.op)
-        if op_type in _SAFE_OPERATORS:
-            return _SAFE_OPERATORS[op_type](operand_val)
-        else:
-            raise ValueError(f"Unary operator {op_type.__name__} is not supported")
-
-    # 5. Anything else is disallowed
-    raise ValueError(f"Unsupported expression node: {node!r}")
+router = APIRouter()
 
 class CalcResponse(BaseModel):
     expression: str = Field(..., description="The original expression")
     result: float = Field(..., description="Evaluated numeric result")
 
+class CalcBatchRequest(BaseModel):
+    expressions: List[str] = Field(..., description="Expressions to evaluate, e.g. [\"2+2\", \"3*(4-1)\"]")
+
+class CalcBatchItem(BaseModel):
+    expression: str
+    result: Optional[float] = Field(None, description="Evaluated result, or null if `error` is set")
+    error: Optional[str] = None
+
+class CalcBatchResponse(BaseModel):
+    results: List[CalcBatchItem]
+
 @router.get(
     "/calculate",
     response_model=CalcResponse,
@@ -65,20 +34,28 @@ class CalcResponse(BaseModel):
 async def calculate(
     expression: str = Query(..., description="Math expression to evaluate")
 ) -> CalcResponse:
+    # Evaluation is bounded by api/calc_engine's limits, so it is safe on the event loop
     try:
-        # 5.1 Parse into AST
-        tree = ast.parse(expression, mode="eval")
-        # 5.2 Evaluate safely
-        result = _safe_eval(tree.body)
-        # 5.3 Return structured response
-        if isinstance(result, complex):
-            raise ValueError("Complex numbers are not supported")
-        return CalcResponse(expression=expression, result=float(result))
-    except Exception as e:
-        # On any parse or eval error, return HTTP 400
+        result = evaluate(expression)
+    except CalculationError as e:
         raise HTTPException(status_code=400, detail=f"Invalid expression: {e}")
-
-# (Later) In api/main.py you'll include this:
-# app.include_router(calculator_router, prefix="/api", tags=["calculator"])
-
-
+    return CalcResponse(expression=expression, result=float(result))
+
+@router.post(
+    "/calculate/batch",
+    response_model=CalcBatchResponse,
+    summary="Evaluate many arithmetic expressions",
+    description=(
+        "Evaluates up to CALC_MAX_BATCH expressions in one request. Results keep the "
+        "request order; an invalid expression gets an `error` instead of failing the batch."
+    )
+)
+def calculate_batch(request: CalcBatchRequest) -> CalcBatchResponse:
+    if len(request.expressions) > CALC_MAX_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {CALC_MAX_BATCH} expressions per request")
+    with span("calculate_batch", expressions=len(request.expressions)):
+        evaluated = evaluate_many(request.expressions)
+    return CalcBatchResponse(results=[
+        CalcBatchItem(expression=expression, result=None if result is None else float(result), error=error)
+        for expression, (result, error) in zip(request.expressions, evaluated)
+    ])
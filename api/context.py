@@ -0,0 +1,124 @@
+"""
+Token-budgeted prompt context.
+
+Prompts used to include every retrieved passage in full, so prompt size
+(and LLM latency) grew with k and with the length of product descriptions.
+`select_context` reranks the candidates (api/rerank.py) and hands them to
+`build_context`. That cuts long fields down to CONTEXT_FIELD_TOKENS and
+adds passages best first until CONTEXT_TOKEN_BUDGET is spent.
+
+Tokens are counted with tiktoken's cl100k_base when its encoding is
+available locally, otherwise estimated at four characters per token.
+
+Environment (defaults in brackets):
+    CONTEXT_TOKEN_BUDGET   prompt tokens for retrieved context        [400]
+    CONTEXT_FIELD_TOKENS   tokens kept per description/content field  [80]
+"""
+import os
+import re
+import math
+import logging
+from typing import List, Optional, Sequence, Tuple
+
+from api.rerank import rerank
+from api.tracing import span
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "400"))
+CONTEXT_FIELD_TOKENS = int(os.getenv("CONTEXT_FIELD_TOKENS", "80"))
+
+# Free-text fields that get truncated; short fields (titles, hours, flags) are kept whole
+LONG_FIELDS = {"content", "description"}
+# "field: value" headers as written by api/documents.py ("content: ...") and
+# api/products.py ("Description: ..."). A long field's value runs until the
+# next column-style header, so "Features: ..." lines inside a description
+# don't end it early.
+_FIELD_RE = re.compile(r"^([A-Za-z_][A-Za-z_ ]*): ", re.MULTILINE)
+_COLUMN_RE = re.compile(r"^[a-z_]+: ", re.MULTILINE)
+_ELLIPSIS = "…"
+
+logger = logging.getLogger(__name__)
+
+# Loaded on first use; False if tiktoken or its encoding file is unavailable
+_encoding = None
+
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            logger.info("tiktoken encoding unavailable, estimating token counts: %s", e)
+            _encoding = False
+    return _encoding or None
+
+
+def count_tokens(text: str) -> int:
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return math.ceil(len(text) / 4)
+
+
+def truncate_tokens(text: str, limit: int) -> str:
+    """`text` cut to at most `limit` tokens (on a word boundary when estimating)."""
+    if count_tokens(text) <= limit:
+        return text
+    encoding = _get_encoding()
+    if encoding is not None:
+        cut = encoding.decode(encoding.encode(text)[:max(limit - 1, 0)])
+    else:
+        cut = text[:max(limit - 1, 0) * 4]
+        cut = cut.rsplit(" ", 1)[0] if " " in cut else cut
+    return cut.rstrip() + _ELLIPSIS
+
+
+def truncate_fields(text: str, limit: int = CONTEXT_FIELD_TOKENS) -> str:
+    """Truncate the value of every LONG_FIELDS "field: value" section of `text`."""
+    parts = []
+    position = 0
+    while True:
+        header = _FIELD_RE.search(text, position)
+        while header is not None and header.group(1).lower() not in LONG_FIELDS:
+            header = _FIELD_RE.search(text, header.end())
+        if header is None:
+            parts.append(text[position:])
+            return "".join(parts)
+        following = _COLUMN_RE.search(text, header.end())
+        end = following.start() if following else len(text)
+        value = text[header.end():end]
+        trailing = "\n" if value.endswith("\n") else ""
+        parts.append(text[position:header.end()] + truncate_tokens(value.rstrip("\n"), limit) + trailing)
+        position = end
+
+
+def build_context(passages: Sequence[str], budget: int = CONTEXT_TOKEN_BUDGET,
+                  field_tokens: int = CONTEXT_FIELD_TOKENS) -> List[Tuple[int, str]]:
+    """
+    (position, truncated text) for the passages that fit in `budget` tokens,
+    taken in the given (best-first) order. A passage that doesn't fit is
+    skipped so a shorter one further down can still use the space; the
+    first passage is always kept, cut to the budget if it has to be.
+    """
+    selected: List[Tuple[int, str]] = []
+    remaining = budget
+    for position, passage in enumerate(passages):
+        text = truncate_fields(passage, field_tokens)
+        tokens = count_tokens(text)
+        if not selected and tokens > remaining:
+            text = truncate_tokens(text, remaining)
+            tokens = remaining
+        if tokens > remaining:
+            continue
+        selected.append((position, text))
+        remaining -= tokens
+    return selected
+
+
+def select_context(query: str, passages: Sequence[str], budget: Optional[int] = None) -> List[Tuple[int, str]]:
+    """Rerank `passages` for `query` and pack the best into the token budget; positions index `passages`."""
+    order = [position for position, _ in rerank(query, passages)]
+    with span("context_build", candidates=len(passages)):
+        packed = build_context([passages[i] for i in order], CONTEXT_TOKEN_BUDGET if budget is None else budget)
+    return [(order[i], text) for i, text in packed]
@@ -0,0 +1,21 @@
+"""
+Local fallbacks used while OpenRouter is unavailable (circuit open or queue
+saturated): extractive answers built from the retrieved rows instead of LLM
+generation. Retrieval falls back to BM25 (api/keyword_index.py) on its own.
+"""
+from typing import List
+
+DEGRADED_PREFIX = "I can't reach the language model right now, but here is what I found:"
+
+
+def extractive_answer(passages: List[str], limit: int = 3, max_chars: int = 300) -> str:
+    """Answer with the top retrieved passages verbatim (truncated)."""
+    passages = [p.strip() for p in passages if p and p.strip()][:limit]
+    if not passages:
+        return "I can't reach the language model right now and found nothing matching your question."
+    lines = []
+    for passage in passages:
+        if len(passage) > max_chars:
+            passage = passage[:max_chars].rsplit(" ", 1)[0] + "..."
+        lines.append(f"- {passage}")
+    return DEGRADED_PREFIX + "\n" + "\n".join(lines)
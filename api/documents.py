@@ -0,0 +1,132 @@
+"""
+Structured RAG documents: one Document per CSV row.
+
+The text keeps one "field: value" line per column, and metadata keeps the
+typed fields (`source`, product/outlet fields) so retrieval can filter on
+them. Every document gets a stable row ID, `<source>:<csv id>`, which is what
+/rag/query returns as `sources`.
+
+`load_source_documents` reads a source from the Arrow snapshot
+(api/snapshot.py) when one exists and falls back to streaming the CSV with
+the csv module. Either way the parsed documents are memoized per file and
+rebuilt only when the file's mtime or size changes.
+"""
+import os
+import csv
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+from langchain.schema import Document
+
+from api.snapshot import SOURCE_CSVS, open_table, table_path
+
+logger = logging.getLogger(__name__)
+
+# Typed metadata per source; text-only columns (e.g. product descriptions) are left out
+SOURCE_FIELDS: Dict[str, Dict[str, Callable[[str], Any]]] = {
+    "drinkware": {"id": int, "title": str},
+    "outlets": {
+        "id": int, "name": str, "location": str, "address": str,
+        "opening_time": str, "closing_time": str,
+        "dine_in": lambda v: bool(int(v)), "delivery": lambda v: bool(int(v)), "pickup": lambda v: bool(int(v)),
+    },
+}
+# Columns of unknown sources longer than this stay out of metadata
+_MAX_METADATA_CHARS = 200
+
+
+def source_name(path: str) -> str:
+    """`data/zus_drinkware.csv` -> `drinkware`."""
+    stem = Path(path).stem
+    return stem[4:] if stem.startswith("zus_") else stem
+
+
+def _coerce(value: Any, kind: Callable[[str], Any]) -> Any:
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    try:
+        return kind(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def build_document(row: Dict[str, Any], source: str, file: str, position: int) -> Document:
+    """Document for one CSV row; `position` is the row's index, used when there is no `id` column."""
+    # Typed snapshot booleans are written as in the CSV, so both readers give the same text
+    text = "\n".join(f"{column}: {int(value) if isinstance(value, bool) else value}" for column, value in row.items()
+                     if column != "id" and value not in (None, ""))
+    fields = SOURCE_FIELDS.get(source)
+    if fields is None:
+        fields = {column: str for column, value in row.items()
+                  if value not in (None, "") and len(str(value)) <= _MAX_METADATA_CHARS}
+    metadata: Dict[str, Any] = {"source": source, "file": file}
+    for column, kind in fields.items():
+        value = _coerce(row.get(column), kind)
+        if value is not None:
+            metadata["row_id" if column == "id" else column] = value
+    row_id = metadata.get("row_id", position)
+    metadata["id"] = f"{source}:{row_id}"
+    return Document(page_content=text, metadata=metadata)
+
+
+
+# path -> ((mtime_ns, size), documents)
+_cache: Dict[str, Tuple[Tuple[int, int], List[Document]]] = {}
+_cache_lock = threading.Lock()
+
+
+def iter_csv_documents(path: str) -> Iterator[Document]:
+    """Stream one Document per CSV row; memory stays flat however large the file is."""
+    source = source_name(path)
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        # zip(header, values) is cheaper than csv.DictReader's per-row bookkeeping
+        for position, values in enumerate(reader):
+            if not values:
+                continue
+            yield build_document(dict(zip(header, values)), source, path, position)
+
+
+def iter_table_documents(source: str, table, path: str) -> Iterator[Document]:
+    """One Document per row of an Arrow table, converted a record batch at a time."""
+    position = 0
+    for batch in table.to_batches():
+        columns = batch.to_pydict()
+        names = list(columns)
+        for values in zip(*columns.values()):
+            yield build_document(dict(zip(names, values)), source, path, position)
+            position += 1
+
+
+def _memoized(path: str, load: Callable[[], List[Document]]) -> List[Document]:
+    """
+    `load()` once per version of `path`. The returned list is shared between
+    callers and must not be mutated.
+    """
+    stat = os.stat(path)
+    version = (stat.st_mtime_ns, stat.st_size)
+    with _cache_lock:
+        cached = _cache.get(path)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    documents = load()
+    with _cache_lock:
+        _cache[path] = (version, documents)
+    return documents
+
+
+def load_csv_documents(path: str) -> List[Document]:
+    """Documents for a CSV file, parsed once per file version."""
+    return _memoized(path, lambda: list(iter_csv_documents(path)))
+
+
+def load_source_documents(source: str) -> List[Document]:
+    """Documents for a catalogue source (`drinkware`, `outlets`), from the snapshot if there is one."""
+    path = table_path(source)
+    if path is not None:
+        return _memoized(path, lambda: list(iter_table_documents(source, open_table(source), path)))
+    logger.warning("No snapshot for %r, parsing %s (run `python -m ingest.build_snapshot`)", source, SOURCE_CSVS[source])
+    return load_csv_documents(SOURCE_CSVS[source])
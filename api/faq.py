@@ -0,0 +1,145 @@
+"""
+Precomputed answers for the questions asked most often.
+
+`python -m scripts.build_faq` mines frequent queries from the API's JSON
+logs (plus data/faq_seed.jsonl) and groups paraphrases by embedding
+similarity (`cluster_queries`). It answers each cluster's most frequent
+phrasing once through the normal RAG pipeline and writes the answers that
+pass vetting to FAQ_TABLE_PATH, stamped with the snapshot version and the
+outlets DB version (`outlets_version`) they were generated from.
+
+`lookup` runs before any routing, retrieval or generation in /rag/query and
+/chat. Every phrasing seen in a cluster is indexed by its `signature`:
+lowercased words, filler words dropped, sorted. So "What's the OG cup?"
+and "the og cup, what is it" hit the same entry with one dict lookup.
+Unseen paraphrases miss and take the normal path. When the CSV snapshot
+changes (`ingest.build_snapshot`) or db/outlets.db is edited (e.g.
+`apply_outlet_changes` in ingest/outlets_ingest.py) the table stops
+matching until it is rebuilt, so stale catalogue or outlet answers are
+never served.
+
+Environment (defaults in brackets):
+    FAQ_TABLE_PATH   answer table written by scripts/build_faq.py   [data/faq.json]
+    FAQ_ENABLED      serve answers from the table (0 to bypass)     [1]
+"""
+import os
+import re
+import json
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from api import outlets
+from api.snapshot import current_version
+from api.sql_guard import db_version
+
+FAQ_TABLE_PATH = os.getenv("FAQ_TABLE_PATH", "data/faq.json")
+FAQ_ENABLED = os.getenv("FAQ_ENABLED", "1") != "0"
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+# Filler only: question words and negations change the meaning, so they stay
+_FILLER = {
+    "a", "an", "the", "is", "are", "s", "do", "does", "please", "can", "could", "you", "i", "me",
+    "tell", "about", "of", "for", "in", "at", "to", "my", "it", "zus",
+}
+
+# (path, (mtime_ns, size), table, signature -> entry)
+_loaded: Optional[Tuple[str, tuple, dict, Dict[str, dict]]] = None
+_lock = threading.Lock()
+
+
+def normalize_query(text: str) -> str:
+    return " ".join(_WORD_RE.findall(text.lower()))
+
+
+def signature(text: str) -> str:
+    """Order-insensitive key of a question's content words."""
+    words = {w for w in _WORD_RE.findall(text.lower()) if w not in _FILLER}
+    return " ".join(sorted(words))
+
+
+def cluster_queries(vectors: np.ndarray, threshold: float) -> List[List[int]]:
+    """
+    Greedy leader clustering of query embeddings, in input order (pass the
+    most frequent first): a query joins the first cluster whose leader has
+    cosine similarity >= `threshold`, else it leads a new one.
+    """
+    vectors = np.asarray(vectors, dtype="float32")
+    if not len(vectors):
+        return []
+    unit = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    clusters: List[List[int]] = []
+    leaders: List[int] = []
+    for i in range(len(unit)):
+        if leaders:
+            scores = unit[leaders] @ unit[i]
+            best = int(np.argmax(scores))
+            if scores[best] >= threshold:
+                clusters[best].append(i)
+                continue
+        leaders.append(i)
+        clusters.append([i])
+    return clusters
+
+
+def outlets_version() -> Optional[List[int]]:
+    """[mtime_ns, size] of the outlets DB (the key sql_guard caches on), or None without one."""
+    try:
+        return list(db_version(outlets.OUTLETS_DB_PATH))
+    except FileNotFoundError:
+        return None
+
+
+def write_table(entries: List[dict], snapshot_version: Optional[str], path: str = FAQ_TABLE_PATH,
+                outlets_db_version: Optional[List[int]] = None):
+    from datetime import datetime, timezone
+
+    table = {
+        "snapshot_version": snapshot_version,
+        "outlets_version": outlets_db_version,
+        "built": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "entries": entries,
+    }
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(table, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def _load(path: str) -> Optional[Tuple[dict, Dict[str, dict]]]:
+    """The table at `path` and its signature index, re-read only when the file changes."""
+    global _loaded
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    version = (stat.st_mtime_ns, stat.st_size)
+    with _lock:
+        if _loaded is None or _loaded[:2] != (path, version):
+            with open(path, encoding="utf-8") as f:
+                table = json.load(f)
+            index: Dict[str, dict] = {}
+            # Entries are most frequent first, so a shared signature goes to the bigger cluster
+            for entry in table.get("entries", []):
+                for variant in [entry["question"], *entry.get("variants", [])]:
+                    index.setdefault(signature(variant), entry)
+            index.pop("", None)
+            _loaded = (path, version, table, index)
+        return _loaded[2], _loaded[3]
+
+
+def lookup(query: str, path: Optional[str] = None) -> Optional[dict]:
+    """The precomputed entry for `query`, or None (no table, stale snapshot or outlets DB, or no match)."""
+    if not FAQ_ENABLED:
+        return None
+    loaded = _load(path or FAQ_TABLE_PATH)
+    if loaded is None:
+        return None
+    table, index = loaded
+    if table.get("snapshot_version") != current_version():
+        return None
+    if table.get("outlets_version") != outlets_version():
+        return None
+    return index.get(signature(query))
@@ -0,0 +1,300 @@
+"""
+Compression, validators and cache headers for api/main.py.
+
+    CompressionMiddleware   brotli (when the `brotli` package is installed) or
+                            gzip, chosen by Accept-Encoding, for text, JSON,
+                            JS and NDJSON bodies of at least
+                            COMPRESS_MIN_BYTES. Streamed bodies (no
+                            Content-Length, e.g. NDJSON batches) are
+                            compressed and flushed chunk by chunk, so lines
+                            still arrive as they are produced.
+    ConditionalMiddleware   a strong ETag (hash of the body) on GET 200
+                            responses up to ETAG_MAX_BYTES, 304 Not Modified
+                            for a matching If-None-Match, and Cache-Control
+                            per path from a rules table.
+    CachedStaticFiles       /static with content-hash ETags. A URL carrying
+                            the current hash (`asset_url`, e.g.
+                            /static/js/chat.js?v=3f2a...) is cached for a
+                            year as immutable; any other URL must revalidate.
+    render_index            index.html with its /static references rewritten
+                            to `asset_url`, so a deploy changes the URLs and
+                            browsers never use a stale script.
+
+A compressed body is a different representation, so its ETag gets a `-br` or
+`-gzip` suffix. The suffix is ignored when If-None-Match is compared.
+
+Environment (defaults in brackets):
+    COMPRESS_MIN_BYTES          smallest body worth compressing            [1024]
+    GZIP_LEVEL                  gzip level, 1-9                            [6]
+    BROTLI_QUALITY              brotli quality, 0-11                       [5]
+    ETAG_MAX_BYTES              largest body buffered to compute an ETag   [1048576]
+    STATIC_IMMUTABLE_MAX_AGE    max-age of versioned static URLs (s)       [31536000]
+"""
+import os
+import re
+import zlib
+import hashlib
+import threading
+from typing import Dict, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders, QueryParams
+from starlette.responses import Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+ETAG_MAX_BYTES = int(os.getenv("ETAG_MAX_BYTES", str(1 << 20)))
+STATIC_IMMUTABLE_MAX_AGE = int(os.getenv("STATIC_IMMUTABLE_MAX_AGE", str(365 * 24 * 3600)))
+
+COMPRESSIBLE_TYPES = (
+    "text/", "application/json", "application/javascript", "application/x-ndjson",
+    "application/xml", "image/svg+xml",
+)
+_ENCODING_SUFFIX_RE = re.compile(r"-(?:br|gzip)\"$")
+_STATIC_REF_RE = re.compile(r'(href|src)="/static/([^"?#]+)"')
+
+# path -> ((mtime_ns, size), sha256 hex)
+_digests: Dict[str, Tuple[Tuple[int, int], str]] = {}
+_digests_lock = threading.Lock()
+
+
+def _strip_etag(tag: str) -> str:
+    tag = tag.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    return _ENCODING_SUFFIX_RE.sub('"', tag)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of If-None-Match against `etag`, ignoring content-coding suffixes."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return _strip_etag(etag) in {_strip_etag(tag) for tag in if_none_match.split(",")}
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """"br" or "gzip" by the client's q-values (br wins ties), or None."""
+    weights = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        match = re.search(r"q=([0-9.]+)", params)
+        if match:
+            try:
+                q = float(match.group(1))
+            except ValueError:
+                q = 0.0
+        weights[name.strip()] = q
+    candidates = (["br"] if brotli is not None else []) + ["gzip"]
+    best = max(candidates, key=lambda e: (weights.get(e, weights.get("*", 0.0)), e == "br"))
+    return best if weights.get(best, weights.get("*", 0.0)) > 0 else None
+
+
+class _Encoder:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._zlib = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def chunk(self, data: bytes, flush: bool) -> bytes:
+        if self.encoding == "br":
+            out = self._brotli.process(data)
+            return out + self._brotli.flush() if flush else out
+        out = self._zlib.compress(data)
+        return out + self._zlib.flush(zlib.Z_SYNC_FLUSH) if flush else out
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self.encoding == "br":
+            return self._brotli.process(data) + self._brotli.finish()
+        return self._zlib.compress(data) + self._zlib.flush()
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: Optional[int] = None):
+        self.app = app
+        self.minimum_size = COMPRESS_MIN_BYTES if minimum_size is None else minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            return await self.app(scope, receive, send)
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start = None
+        encoder: Optional[_Encoder] = None
+        buffered = []
+        mode = None  # "pass", "whole" or "stream"
+
+        async def send_compressed(message):
+            nonlocal start, encoder, mode
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "")
+                compressible = content_type.startswith(COMPRESSIBLE_TYPES)
+                if compressible:
+                    MutableHeaders(raw=message["headers"]).add_vary_header("Accept-Encoding")
+                length = headers.get("content-length")
+                if (not compressible or "content-encoding" in headers or message["status"] < 200
+                        or message["status"] in (204, 304)
+                        or (length is not None and int(length) < self.minimum_size)):
+                    mode = "pass"
+                    await send(message)
+                    return
+                start, encoder = message, _Encoder(encoding)
+                mode = "whole" if length is not None else "stream"
+                return
+            if message["type"] != "http.response.body" or mode == "pass":
+                await send(message)
+                return
+
+            body, more = message.get("body", b""), message.get("more_body", False)
+            if mode == "whole":
+                buffered.append(body)
+                if more:
+                    return
+                payload = encoder.finish(b"".join(buffered))
+                _set_encoded_headers(start, encoding, len(payload))
+                await send(start)
+                await send({"type": "http.response.body", "body": payload})
+                return
+
+            if start is not None:
+                _set_encoded_headers(start, encoding, None)
+                await send(start)
+                start = None
+            payload = encoder.chunk(body, flush=True) if more else encoder.finish(body)
+            await send({"type": "http.response.body", "body": payload, "more_body": more})
+
+        await self.app(scope, receive, send_compressed)
+
+
+def _set_encoded_headers(start: dict, encoding: str, length: Optional[int]):
+    headers = MutableHeaders(raw=start["headers"])
+    headers["content-encoding"] = encoding
+    if length is None:
+        del headers["content-length"]
+    else:
+        headers["content-length"] = str(length)
+    etag = headers.get("etag")
+    if etag and etag.endswith('"'):
+        headers["etag"] = f'{etag[:-1]}-{encoding}"'
+
+
+class ConditionalMiddleware:
+    """Strong ETags and 304s for GET responses, plus Cache-Control by exact path."""
+
+    def __init__(self, app, cache_control: Optional[Dict[str, str]] = None):
+        self.app = app
+        self.cache_control = dict(cache_control or {})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            return await self.app(scope, receive, send)
+        rule = self.cache_control.get(scope["path"])
+        if_none_match = Headers(scope=scope).get("if-none-match")
+        start = None
+        buffered = []
+        passthrough = False
+
+        async def send_conditional(message):
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(raw=message["headers"])
+                if rule and message["status"] < 400 and "cache-control" not in headers:
+                    headers["cache-control"] = rule
+                length = headers.get("content-length")
+                if (scope["method"] != "GET" or message["status"] != 200 or "etag" in headers
+                        or length is None or int(length) > ETAG_MAX_BYTES):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start = message
+                return
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+            buffered.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            body = b"".join(buffered)
+            etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+            headers = MutableHeaders(raw=start["headers"])
+            headers["etag"] = etag
+            if etag_matches(if_none_match, etag):
+                not_modified = NotModifiedResponse(headers)
+                await send({"type": "http.response.start", "status": 304, "headers": not_modified.raw_headers})
+                await send({"type": "http.response.body", "body": b""})
+                return
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_conditional)
+
+
+def file_digest(path: str) -> str:
+    """sha256 of a file's bytes, recomputed only when its mtime or size changes."""
+    stat = os.stat(path)
+    version = (stat.st_mtime_ns, stat.st_size)
+    with _digests_lock:
+        cached = _digests.get(path)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    with _digests_lock:
+        _digests[path] = (version, digest.hexdigest())
+    return _digests[path][1]
+
+
+class CachedStaticFiles(StaticFiles):
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        digest = file_digest(str(full_path))
+        version = QueryParams(scope.get("query_string", b"")).get("v")
+        headers = response.headers
+        headers["etag"] = f'"{digest[:32]}"'
+        if version and digest.startswith(version):
+            headers["cache-control"] = f"public, max-age={STATIC_IMMUTABLE_MAX_AGE}, immutable"
+        else:
+            headers["cache-control"] = "no-cache"
+        if etag_matches(Headers(scope=scope).get("if-none-match"), headers["etag"]):
+            return NotModifiedResponse(headers)
+        return response
+
+
+def asset_url(relative_path: str, directory: str = "static") -> str:
+    """/static URL of `relative_path` carrying its content hash, so it can be cached forever."""
+    return f"/static/{relative_path}?v={file_digest(os.path.join(directory, relative_path))[:12]}"
+
+
+def render_index(path: str = "static/index.html", directory: str = "static") -> str:
+    """The HTML page at `path`, with existing /static/... references versioned."""
+    with open(path, encoding="utf-8") as f:
+        html = f.read()
+
+    def versioned(match) -> str:
+        relative = match.group(2)
+        if not os.path.isfile(os.path.join(directory, relative)):
+            return match.group(0)
+        return f'{match.group(1)}="{asset_url(relative, directory)}"'
+
+    return _STATIC_REF_RE.sub(versioned, html)
+
+
+def install(app, cache_control: Optional[Dict[str, str]] = None):
+    """Add both middlewares to `app`; compression goes outermost so ETags are computed on identity bodies."""
+    app.add_middleware(ConditionalMiddleware, cache_control=cache_control)
+    app.add_middleware(CompressionMiddleware)
@@ -0,0 +1,110 @@
+"""
+In-memory BM25 keyword index used next to FAISS for hybrid retrieval.
+
+Dense MiniLM/OpenRouter embeddings rank exact-term lookups (product names
+like "OG CUP 2.0 500ml", outlet names like "Spectrum Shopping Mall") poorly.
+`BM25Index` scores the same documents lexically; `reciprocal_rank_fusion`
+merges its ranking with the vector ranking, and `decisive_matches` lets the
+caller skip the embedding call when the lexical hit is unambiguous.
+
+Environment (defaults in brackets):
+    HYBRID_CANDIDATES     results taken from each retriever before fusion  [20]
+    RRF_K                 reciprocal-rank-fusion damping constant          [60]
+    HYBRID_EXACT_MARGIN   BM25 score ratio over the best non-match needed
+                          to short-circuit the vector search               [1.25]
+"""
+import os
+import re
+import math
+from collections import Counter, defaultdict
+from typing import Container, Dict, Iterable, List, Optional, Sequence, Tuple
+
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+HYBRID_EXACT_MARGIN = float(os.getenv("HYBRID_EXACT_MARGIN", "1.25"))
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = {
+    "a", "an", "the", "is", "are", "do", "does", "you", "your", "of", "for", "in",
+    "on", "at", "to", "and", "or", "what", "which", "where", "how", "me", "tell",
+    "about", "have", "any", "there", "i", "can", "with", "it", "its", "this", "that",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in _STOPWORDS]
+
+
+class BM25Index:
+    """Okapi BM25 over an inverted index of term -> {doc position: term frequency}."""
+
+    def __init__(self, texts: Iterable[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self.doc_lengths: List[int] = []
+        for position, text in enumerate(texts):
+            tokens = tokenize(text)
+            self.doc_lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                self.postings[term][position] = tf
+        self.postings = dict(self.postings)
+        self.avg_length = (sum(self.doc_lengths) / len(self.doc_lengths)) if self.doc_lengths else 0.0
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def _idf(self, term: str) -> float:
+        df = len(self.postings.get(term, ()))
+        return math.log(1 + (len(self) - df + 0.5) / (df + 0.5))
+
+    def scores(self, query: str, allowed: Optional[Container[int]] = None) -> Dict[int, float]:
+        """BM25 score of every document (in `allowed`, if given) sharing at least one query term."""
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = self._idf(term)
+            for position, tf in docs.items():
+                if allowed is not None and position not in allowed:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[position] / (self.avg_length or 1))
+                scores[position] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+    def search(self, query: str, k: int = 4, allowed: Optional[Container[int]] = None) -> List[Tuple[int, float]]:
+        """Top-`k` (position, score) pairs, best first; ties keep document order."""
+        ranked = sorted(self.scores(query, allowed).items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:k]
+
+    def decisive_matches(self, query: str, k: int = 4, margin: float = HYBRID_EXACT_MARGIN,
+                         allowed: Optional[Container[int]] = None) -> List[int]:
+        """
+        Documents that contain every query term, when there are at most `k`
+        of them and each outscores the best partial match by `margin`.
+        Empty when the lexical evidence is not clear-cut, including for
+        single-term queries, which are too ambiguous to trust on their own.
+        """
+        terms = set(tokenize(query))
+        if len(terms) < 2 or any(term not in self.postings for term in terms):
+            return []
+        matching = set.intersection(*(set(self.postings[term]) for term in terms))
+        if allowed is not None:
+            matching = {position for position in matching if position in allowed}
+        if not matching or len(matching) > k:
+            return []
+        scores = self.scores(query, allowed)
+        runner_up = max((s for position, s in scores.items() if position not in matching), default=0.0)
+        if min(scores[position] for position in matching) < runner_up * margin:
+            return []
+        return sorted(matching, key=lambda position: (-scores[position], position))
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = 4, rrf_k: int = RRF_K) -> List[int]:
+    """Merge several best-first rankings of document positions by RRF score."""
+    fused: Dict[int, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, position in enumerate(ranking):
+            fused[position] += 1.0 / (rrf_k + rank + 1)
+    return [position for position, _ in sorted(fused.items(), key=lambda item: (-item[1], item[0]))[:k]]
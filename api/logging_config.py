@@ -0,0 +1,153 @@
+"""
+Non-blocking structured logging shared by api/ and agent/.
+
+`configure_logging()` puts a QueueHandler on the root logger and starts a
+QueueListener thread that does the JSON formatting and the stdout write, so
+a log call on the request path only costs a queue put. Each record carries
+the current request ID (set by `request_id_middleware`) and trace ID.
+
+Environment:
+    LOG_LEVEL               root level (default INFO)
+    LOG_LEVELS              per-module overrides, e.g. "api.main=DEBUG,agent=WARNING"
+    LOG_DEBUG_SAMPLE_RATE   fraction of requests whose DEBUG lines are kept (default 0.1)
+    LOG_QUERIES             "1" to log raw user queries (/chat, /rag/query), for FAQ mining (default off)
+"""
+import os
+import sys
+import copy
+import json
+import uuid
+import zlib
+import queue
+import atexit
+import random
+import logging
+import logging.handlers
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional
+
+from fastapi import Request
+
+from api.tracing import current_span
+
+LOG_QUERIES = os.getenv("LOG_QUERIES", "0") == "1"
+
+
+def query_fields(query: str) -> dict:
+    """`extra=` fields for a raw user query: empty unless LOG_QUERIES is on."""
+    return {"query": query} if LOG_QUERIES else {}
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has; anything else was passed via `extra=`
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {
+    "message", "asctime", "request_id", "trace_id",
+}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, message, IDs, extras."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        if getattr(record, "trace_id", None):
+            entry["trace_id"] = record.trace_id
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class DebugSampler(logging.Filter):
+    """
+    Keep DEBUG records for only a fraction of requests. The decision is made
+    per request ID so a sampled request keeps all of its debug lines.
+    """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.rate >= 1:
+            return True
+        if self.rate <= 0:
+            return False
+        request_id = request_id_var.get()
+        if request_id:
+            return zlib.crc32(request_id.encode()) % 10_000 < self.rate * 10_000
+        return random.random() < self.rate
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that leaves formatting (including tracebacks) to the listener
+    thread. The stock `prepare()` formats in the caller so records can be
+    pickled; our queue never leaves the process, so that work is skipped.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        record.request_id = request_id_var.get()
+        span = current_span()
+        record.trace_id = span.trace_id if span else None
+        return record
+
+
+def _parse_levels(spec: str) -> dict:
+    levels = {}
+    for item in spec.split(","):
+        if "=" in item:
+            name, level = item.split("=", 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging():
+    """Install the queue-based JSON logging pipeline once per process."""
+    global _listener
+    if _listener is not None:
+        return
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter())
+
+    queue_handler = _DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(DebugSampler(float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0.1"))))
+
+    root = logging.getLogger()
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    root.addHandler(queue_handler)
+    for name, level in _parse_levels(os.getenv("LOG_LEVELS", "")).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+async def request_id_middleware(request: Request, call_next):
+    """Tag the request (and every log line it produces) with an ID."""
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    token = request_id_var.set(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id_var.reset(token)
+    response.headers["X-Request-ID"] = request_id
+    return response
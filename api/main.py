@@ -1,167 +1,348 @@
 import os
-from fastapi import FastAPI, HTTPException
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, HTTPException, WebSocket
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse
 from pydantic import BaseModel, SecretStr
-from typing import List
+from typing import Dict, List, Optional, Tuple
 from dotenv import load_dotenv
 from langchain_openai import OpenAIEmbeddings
 # HuggingFace embeddings imported dynamically to handle fallback properly
-from langchain_community.vectorstores import FAISS
 from langchain_openai import ChatOpenAI
 from langchain.chains import RetrievalQA
 from langchain.schema import Document
-import pandas as pd
+from langchain_core.retrievers import BaseRetriever
+import logging
+import numpy as np
 import requests
 
+from api.batch import BATCH_EMBED_CHUNK, check_batch_size, dedupe, error_lines, ndjson_response, stream_results
+from api.admin import router as admin_router
+from api.http_cache import CachedStaticFiles, install as install_http_cache, render_index
+from api.logging_config import configure_logging, query_fields, request_id_middleware
+from api.tracing import metrics_router, serialized, span, trace_requests
+from api.degraded import extractive_answer
+from api.faq import lookup as faq_lookup
+from api.prompts import PromptTemplate, UsageCallback
+from api.context import select_context
+from api.keyword_index import BM25Index
+from api.retrieval import DATA_SOURCES, hybrid_search, hybrid_search_many
+from api.documents import SOURCE_FIELDS, load_source_documents
+from api.snapshot import SOURCE_CSVS, current_version, table_path
+from api.vector_index import PartitionedIndex
+from api.microbatch import EMBED_MAX_INFLIGHT, BatchedEmbeddings
+from api.onnx_embeddings import ONNX_EMBEDDINGS_DIR, OnnxEmbeddings, onnx_model_available
+from api.outlets import (
+    OUTLET_FILTER_FIELDS, filter_conditions, format_outlet, outlet_sources, query_outlets, row_source,
+    summarize_outlets,
+)
+from api.outlets import router as outlets_router
+from api.calculator import router as calculator_router
+from api.ws_chat import serve_chat
+from api.query_router import BOTH, OUTLET, PRODUCT, route_query
+from api.rerank import RERANK_CANDIDATES, warm_up as warm_up_reranker
+from api.upstream import (
+    OPENROUTER_MAX_RETRIES, OPENROUTER_TIMEOUT, UpstreamUnavailableError,
+    breaker, call_openrouter, prompt_key,
+)
+
 # Load environment variables
 load_dotenv()
+configure_logging()
+logger = logging.getLogger(__name__)
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 if not OPENROUTER_API_KEY:
     raise RuntimeError("OPENROUTER_API_KEY not found in .env")
+OPENROUTER_API_BASE = os.getenv("OPENROUTER_API_BASE", "https://openrouter.ai/api/v1")
 
 # Debug: Print first few characters of API key to verify it's loaded
-print(f"API Key loaded: {OPENROUTER_API_KEY[:8]}...")
+logger.info("API Key loaded: %s...", OPENROUTER_API_KEY[:8])
 
 # Test OpenRouter API directly
 try:
     response = requests.get(
-        "https://openrouter.ai/api/v1/models",
+        f"{OPENROUTER_API_BASE}/models",
+        timeout=OPENROUTER_TIMEOUT,
         headers={
             "Authorization": f"Bearer {OPENROUTER_API_KEY}",
             "HTTP-Referer": "https://github.com/Istionia/mindhive-bot-assessment",
             "X-Title": "Mindhive Bot Assessment"
         }
     )
-    print(f"OpenRouter API test: {response.status_code}")
+    logger.info("OpenRouter API test: %s", response.status_code)
     if response.status_code == 200:
-        print("✓ OpenRouter API key is working")
+        logger.info("OpenRouter API key is working")
     else:
-        print(f"✗ OpenRouter API error: {response.text}")
+        logger.warning("OpenRouter API error: %s", response.text)
 except Exception as e:
-    print(f"✗ OpenRouter API test failed: {e}")
+    logger.warning("OpenRouter API test failed: %s", e)
 
 # Set environment variables for OpenRouter compatibility
 os.environ["OPENAI_API_KEY"] = OPENROUTER_API_KEY
-os.environ["OPENAI_BASE_URL"] = "https://openrouter.ai/api/v1"
+os.environ["OPENAI_BASE_URL"] = OPENROUTER_API_BASE
 
 # FastAPI app
 app = FastAPI()
 
-# Mount static files
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Per-stage tracing, request IDs and the /metrics endpoint
+app.middleware("http")(trace_requests)
+app.middleware("http")(request_id_middleware)
+app.include_router(metrics_router)
+# /admin memory, CPU profile and cache diagnostics, only when ADMIN_TOKEN is set (api/admin.py)
+app.include_router(admin_router)
+
+# Mount static files: content-hash ETags, immutable when requested by hashed URL
+app.mount("/static", CachedStaticFiles(directory="static"), name="static")
+
+# gzip/brotli, strong ETags with 304s, and Cache-Control for read-only endpoints (api/http_cache.py)
+install_http_cache(app, cache_control={
+    "/": "no-cache",
+    "/api": "public, max-age=300",
+    "/outlets": "public, max-age=60",
+    "/calculate": "public, max-age=86400",
+    "/health": "no-store",
+    "/metrics": "no-store",
+})
+
+# Data ingestion and embedding: DATA_SOURCES (api/retrieval.py) are embedded,
+# outlets are answered from db/outlets.db via SQL (api/outlets.py)
+OUTLET_CONTEXT_ROWS = 10
+# /rag/query `filters` fields: metadata of the indexed rows; outlet fields go to the SQL instead
+PRODUCT_FILTER_FIELDS = {"source", "id"} | {
+    "row_id" if column == "id" else column for source in DATA_SOURCES for column in SOURCE_FIELDS.get(source, {})
+}
+# "auto" (ONNX if exported, else HuggingFace, else OpenRouter), "onnx", "huggingface" or "openrouter"
+EMBEDDINGS_BACKEND = os.getenv("EMBEDDINGS_BACKEND", "auto")
+
+# GET /outlets (Text2SQL over db/outlets.db)
+app.include_router(outlets_router)
+# GET /calculate and POST /calculate/batch (api/calc_engine.py)
+app.include_router(calculator_router)
 
-# Data ingestion and embedding
-DATA_FILES = ["data/zus_drinkware.csv", "data/zus_outlets.csv"]
+RAG_PROMPT = PromptTemplate(
+    "rag",
+    system=(
+        "You answer questions about ZUS Coffee products and outlets. Use only the context in the user's "
+        "message. If the answer is not in the context, say that you don't know; don't make one up."
+    ),
+)
 
-def load_csvs(files: List[str]) -> List[Document]:
+def load_documents(sources: List[str]) -> List[Document]:
+    """One structured Document per row (see api/documents.py), read from the Arrow snapshot."""
     docs = []
-    for file in files:
-        df = pd.read_csv(file)
-        for _, row in df.iterrows():
-            # Concatenate all columns for context
-            content = " | ".join(str(x) for x in row.values)
-            docs.append(Document(page_content=content, metadata={"source": file}))
+    for source in sources:
+        docs.extend(load_source_documents(source))
     return docs
 
 # Global variables for lazy initialization
 _rag_chain = None
 _retriever = None
+_vectorstore = None
+_embeddings = None
+_documents: List[Document] = []
+_keyword_index = None
 
 def get_rag_chain():
     """Lazy initialization of RAG chain to avoid blocking startup"""
-    global _rag_chain, _retriever
+    global _rag_chain, _retriever, _vectorstore, _embeddings, _documents, _keyword_index
     
     if _rag_chain is None:
-        print("🔄 Initializing RAG components...")
+        logger.info("Initializing RAG components...")
         
         # Load documents
-        documents = load_csvs(DATA_FILES)
+        documents = load_documents(DATA_SOURCES)
         
-        # Initialize embeddings with fallback
-        # Skip HuggingFace on Render due to memory/timeout issues
+        # Initialize embeddings with fallback: the int8 ONNX MiniLM is small
+        # enough to run anywhere, PyTorch HuggingFace is skipped on Render
+        # due to memory/timeout issues, OpenRouter is the last resort
         import os
-        if os.getenv('RENDER'):
-            print("🚀 On Render - using OpenRouter embeddings directly")
-            embeddings = None  # Force fallback
-        else:
+        embeddings = None
+        if EMBEDDINGS_BACKEND in ("auto", "onnx") and onnx_model_available():
+            try:
+                embeddings = OnnxEmbeddings()
+                logger.info("Local int8 ONNX embeddings initialized from %s", ONNX_EMBEDDINGS_DIR)
+            except Exception as e:
+                logger.warning("Failed to initialize ONNX embeddings: %s", e)
+        if embeddings is None and (os.getenv('RENDER') or EMBEDDINGS_BACKEND in ("onnx", "openrouter")):
+            logger.info("Using OpenRouter embeddings directly (backend=%s)", EMBEDDINGS_BACKEND)
+        elif embeddings is None:
             try:
-                print("🔄 Initializing local HuggingFace embeddings...")
+                logger.info("Initializing local HuggingFace embeddings...")
                 from langchain_huggingface import HuggingFaceEmbeddings  # type: ignore
                 embeddings = HuggingFaceEmbeddings(
                     model_name="sentence-transformers/all-MiniLM-L6-v2",
                     model_kwargs={'device': 'cpu'},
                     encode_kwargs={'normalize_embeddings': True}
                 )
-                print("✅ Local HuggingFace embeddings initialized successfully")
+                logger.info("Local HuggingFace embeddings initialized successfully")
             except Exception as e:
-                print(f"✗ Failed to initialize HuggingFace embeddings: {e}")
+                logger.warning("Failed to initialize HuggingFace embeddings: %s", e)
                 embeddings = None
         
         if embeddings is None:
-            print("🔄 Using OpenRouter embeddings...")
+            logger.info("Using OpenRouter embeddings...")
             if not OPENROUTER_API_KEY:
                 raise RuntimeError("❌ OPENROUTER_API_KEY environment variable is not set! Please add it in Render dashboard.")
             
-            print(f"🔑 Using API key: {OPENROUTER_API_KEY[:12]}...")
-            
             embeddings = OpenAIEmbeddings(
                 api_key=SecretStr(OPENROUTER_API_KEY),
-                base_url="https://openrouter.ai/api/v1",
+                base_url=OPENROUTER_API_BASE,
+                # Send raw text: client-side tiktoken chunking only applies to OpenAI-hosted models
+                check_embedding_ctx_length=False,
+                timeout=OPENROUTER_TIMEOUT,
+                max_retries=OPENROUTER_MAX_RETRIES,
                 default_headers={
                     "HTTP-Referer": "https://github.com/Istionia/mindhive-bot-assessment",
                     "X-Title": "Mindhive Bot Assessment"
                 }
             )
-            print("✅ OpenRouter embeddings initialized successfully")
+            logger.info("OpenRouter embeddings initialized successfully")
         
         # Create vector store and chain
-        vectorstore = FAISS.from_documents(documents, embeddings)
-        _retriever = vectorstore.as_retriever()
+        # Concurrent query embeddings share one batched call (api/microbatch.py);
+        # remote batches go through the OpenRouter breaker and limiter
+        if isinstance(embeddings, OpenAIEmbeddings):
+            _embeddings = BatchedEmbeddings(
+                embeddings, guard=lambda texts, call: call_openrouter(prompt_key("embed", *texts), call),
+                max_inflight=EMBED_MAX_INFLIGHT,
+            )
+        else:
+            # A local model is busy while the next batch queues up, so don't wait for stragglers
+            _embeddings = BatchedEmbeddings(embeddings, max_wait_ms=0)
+        _documents = documents
+        _keyword_index = BM25Index(d.page_content for d in documents)
+        # One ANN index per source so filtered searches only scan their partition
+        vectors = np.array(embeddings.embed_documents([d.page_content for d in documents]), dtype="float32")
+        _vectorstore = PartitionedIndex(vectors, [d.metadata for d in documents], partition_key="source")
+        _retriever = HybridRetriever()
         
         llm = ChatOpenAI(
             model="meta-llama/llama-3-70b-instruct", 
             temperature=0,
             api_key=SecretStr(OPENROUTER_API_KEY),
-            base_url="https://openrouter.ai/api/v1",
+            base_url=OPENROUTER_API_BASE,
+            timeout=OPENROUTER_TIMEOUT,
+            max_retries=OPENROUTER_MAX_RETRIES,
             default_headers={
                 "HTTP-Referer": "https://github.com/Istionia/mindhive-bot-assessment",
                 "X-Title": "Mindhive Bot Assessment"
             }
         )
-        _rag_chain = RetrievalQA.from_chain_type(llm=llm, retriever=_retriever)
-        print("✅ RAG chain initialized successfully")
+        # Fixed instructions as the system message, retrieved rows in the user message (api/prompts.py)
+        _rag_chain = RetrievalQA.from_chain_type(
+            llm=llm, retriever=_retriever,
+            chain_type_kwargs={"prompt": RAG_PROMPT.chat_prompt("Context:\n{context}\n\nQuestion: {question}")},
+        )
+        logger.info("RAG chain initialized successfully")
     
     return _rag_chain, _retriever
 
+def retrieve(query: str, k: int = 4, filters: Optional[Dict[str, str]] = None) -> List[Document]:
+    """
+    Hybrid retrieval (api/retrieval.py): BM25 and FAISS rankings merged with
+    reciprocal-rank fusion. A decisive exact-term hit (e.g. a product name)
+    skips the embedding call; if embeddings are unavailable BM25 is used
+    alone. `filters` (metadata field -> value, e.g. {"source": "drinkware"})
+    are applied before ranking on both sides.
+    """
+    positions = hybrid_search(_keyword_index, _vectorstore, _embeddings.embed_query, query, k, filters)
+    return [_documents[i] for i in positions]
+
+def retrieve_many(queries: List[Tuple[str, Optional[Dict[str, str]]]], k: int = 4) -> List[List[Document]]:
+    """
+    `retrieve` for a batch of (query, filters): queries without a decisive
+    keyword hit are embedded together (BATCH_EMBED_CHUNK per call) and
+    searched with one FAISS call per distinct filter set.
+    """
+    rankings = hybrid_search_many(_keyword_index, _vectorstore,
+                                  lambda texts: _embeddings.embed_many(texts, BATCH_EMBED_CHUNK), queries, k)
+    return [[_documents[i] for i in positions] for positions in rankings]
+
+def split_filters(filters: Optional[Dict[str, str]]) -> Tuple[Optional[Dict[str, str]], Optional[Dict[str, str]]]:
+    """
+    (product filters, outlet filters) of a request. `source` goes to the
+    side it names. HTTP 400 for a field or source neither side has, so a
+    filter that can't match is refused instead of answered from nothing.
+    """
+    product: Dict[str, str] = {}
+    outlet: Dict[str, str] = {}
+    for field, value in (filters or {}).items():
+        if field == "source":
+            side = outlet if str(value).strip().lower() == "outlets" else product
+            if side is product and str(value).strip().lower() not in DATA_SOURCES:
+                raise HTTPException(status_code=400, detail=f"Unknown source {value!r}; "
+                                    f"expected one of {sorted(DATA_SOURCES + ['outlets'])}.")
+            side[field] = value
+        elif field in PRODUCT_FILTER_FIELDS:
+            product[field] = value
+        elif field in OUTLET_FILTER_FIELDS:
+            outlet[field] = value
+        else:
+            raise HTTPException(status_code=400, detail=f"Unknown filter field {field!r}; expected one of "
+                                f"{sorted(PRODUCT_FILTER_FIELDS | set(OUTLET_FILTER_FIELDS))}.")
+    try:
+        filter_conditions(outlet)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return product or None, outlet or None
+
+def filtered_route(route: str, product: Optional[Dict[str, str]], outlet: Optional[Dict[str, str]]) -> str:
+    """The route once filters are known: filters on one side's fields can only match that side's rows."""
+    if product and outlet:
+        return BOTH
+    if outlet:
+        return OUTLET
+    if product:
+        return PRODUCT
+    return route
+
+class HybridRetriever(BaseRetriever):
+    """LangChain retriever over `retrieve()`, used by RetrievalQA and /debug/rag."""
+    k: int = 4
+
+    def _get_relevant_documents(self, query: str, *, run_manager) -> List[Document]:
+        return retrieve(query, self.k)
+
 # Request/response models
 class RAGQuery(BaseModel):
     query: str
+    # Optional filters: product metadata, e.g. {"source": "drinkware"}, or outlet
+    # columns applied to the SQL, e.g. {"location": "Kuala Lumpur/Selangor", "dine_in": "true"}
+    filters: Optional[Dict[str, str]] = None
 
 class RAGResponse(BaseModel):
     answer: str
     sources: List[str]
 
+class RAGBatchRequest(BaseModel):
+    queries: List[RAGQuery]
+    # Answers generated at once, capped at BATCH_MAX_CONCURRENCY
+    max_concurrency: Optional[int] = None
+
+# An opted-in cross-encoder (RERANK_MODEL) loads in the background, not in the first request
+app.router.add_event_handler("startup", warm_up_reranker)
+
 @app.get("/health")
 def health_check():
     """Health check endpoint for deployment"""
-    return {"status": "healthy", "message": "ZUS Coffee Bot is running"}
+    return {"status": "healthy", "message": "ZUS Coffee Bot is running", "upstream": breaker.state}
 
 @app.get("/debug/data")
 def debug_data():
     """Debug endpoint to check if data files exist"""
     import os
     try:
-        data_status = {}
-        for file in DATA_FILES:
-            data_status[file] = {
+        data_status = {"snapshot_version": current_version()}
+        for source in DATA_SOURCES:
+            file = table_path(source) or SOURCE_CSVS[source]
+            data_status[source] = {
+                "file": file,
                 "exists": os.path.exists(file),
                 "size": os.path.getsize(file) if os.path.exists(file) else 0
             }
         
         # Try loading a few rows
         try:
-            docs = load_csvs(DATA_FILES)
+            docs = load_documents(DATA_SOURCES)
             data_status["documents_loaded"] = len(docs)
             data_status["sample_doc"] = docs[0].page_content[:200] + "..." if docs else None
         except Exception as e:
@@ -206,7 +387,8 @@ def debug_env():
 def read_root():
     """Serve the chat interface"""
     try:
-        return FileResponse('static/index.html')
+        # Asset URLs carry their content hash, so only this page needs revalidating
+        return HTMLResponse(render_index("static/index.html"))
     except Exception as e:
         # Fallback if static files aren't available
         return {
@@ -224,6 +406,8 @@ def api_info():
         "endpoints": {
             "/": "GET - Chat interface",
             "/rag/query": "POST - Ask questions about ZUS products and outlets",
+            "/rag/query/batch": "POST - Many questions at once, streamed as NDJSON",
+            "/ws/chat": "WebSocket - Chat over one connection (api/ws_chat.py)",
             "/docs": "GET - API documentation"
         },
         "example": {
@@ -233,30 +417,129 @@ def api_info():
         }
     }
 
+def _rag_answer(query: str, docs: List[Document], outlet_rows: List[dict], rag_chain) -> RAGResponse:
+    """Rerank and pack the retrieved rows (plus any outlet rows) and generate the answer."""
+    # Mixed questions get the top outlet rows as extra context
+    docs = docs + [
+        Document(page_content=format_outlet(row), metadata={"source": "outlets", "id": row_source(row)})
+        for row in outlet_rows[:OUTLET_CONTEXT_ROWS]
+    ]
+    # Rerank the candidates and keep the best that fit the context token budget
+    docs = [
+        Document(page_content=text, metadata=docs[i].metadata)
+        for i, text in select_context(query, [doc.page_content for doc in docs])
+    ]
+    if not docs:
+        # Nothing matched the filters: no context to answer from, so skip the LLM call
+        return RAGResponse(answer="No products or outlets match those filters.", sources=[])
+
+    # Feed the retrieved docs straight to the stuff chain instead of
+    # letting RetrievalQA embed and search the same query a second time.
+    # Identical concurrent questions share a single upstream call.
+    with span("llm_generation"):
+        key = prompt_key("rag", query, *(doc.page_content for doc in docs))
+        try:
+            result = call_openrouter(key, lambda: rag_chain.combine_documents_chain.invoke(
+                {"input_documents": docs, "question": query}, config={"callbacks": [UsageCallback(RAG_PROMPT.name)]},
+            ))
+            answer = result["output_text"]
+        except UpstreamUnavailableError:
+            # Degraded mode: return the top retrieved rows directly
+            logger.warning("LLM unavailable, returning extractive answer")
+            answer = extractive_answer([doc.page_content for doc in docs])
+
+    # Stable row IDs (e.g. "drinkware:3", "outlets:42"), in retrieval order
+    sources = list(dict.fromkeys(doc.metadata.get("id") or doc.metadata.get("source", "") for doc in docs))
+    return RAGResponse(answer=answer, sources=sources)
+
 @app.post("/rag/query", response_model=RAGResponse)
 def rag_query(request: RAGQuery):
-    print(f"🔍 Received query: {request.query}")
+    logger.debug("Received query: %s", request.query)
+    product_filters, outlet_filters = split_filters(request.filters)
     try:
+        # Frequent questions have a precomputed answer (api/faq.py)
+        if not request.filters:
+            with span("faq_lookup"):
+                hit = faq_lookup(request.query)
+            if hit is not None:
+                logger.info("FAQ answer served", extra={**query_fields(request.query), "faq_id": hit["id"]})
+                return RAGResponse(answer=hit["answer"], sources=hit["sources"])
+
+        route = filtered_route(route_query(request.query), product_filters, outlet_filters)
+        docs: List[Document] = []
+        outlet_rows = []
+        if route in (OUTLET, BOTH):
+            _, outlet_rows = query_outlets(request.query, outlet_filters)
+        if route == OUTLET:
+            # Answer straight from the SQL result: exact counts, no LLM call
+            answer = summarize_outlets(outlet_rows)
+            sources = outlet_sources(outlet_rows)
+            logger.info("Outlet query answered", extra={**query_fields(request.query), "route": route, "rows": len(outlet_rows)})
+            return serialized(RAGResponse(answer=answer, sources=sources))
+
         # Initialize components on first request
-        print("🔄 Getting RAG chain...")
         rag_chain, retriever = get_rag_chain()
-        print("✅ RAG chain obtained")
-        
-        print("🔍 Running retrieval...")
-        docs = retriever.get_relevant_documents(request.query)
-        print(f"📄 Retrieved {len(docs)} documents")
-        
-        print("🤖 Generating answer...")
-        result = rag_chain({"query": request.query}, return_only_outputs=True)
-        answer = result["result"]
-        print(f"✅ Generated answer: {answer[:100]}...")
         
-        sources = list({doc.metadata.get("source", "") for doc in docs})
-        print(f"📚 Sources: {sources}")
+        docs = retrieve(request.query, k=RERANK_CANDIDATES, filters=product_filters)
+        logger.debug("Retrieved %d documents", len(docs))
+        response = _rag_answer(request.query, docs, outlet_rows, rag_chain)
+        logger.info("RAG query answered", extra={
+            **query_fields(request.query), "route": route, "docs": len(docs), "sources": response.sources,
+        })
         
-        return RAGResponse(answer=answer, sources=sources)
+        return serialized(response)
     except Exception as e:
-        print(f"❌ RAG Error: {type(e).__name__}: {str(e)}")
-        import traceback
-        print(traceback.format_exc())
+        logger.exception("RAG error: %s: %s", type(e).__name__, e)
         raise HTTPException(status_code=500, detail=f"{type(e).__name__}: {str(e)}")
+
+@app.post("/rag/query/batch")
+def rag_query_batch(request: RAGBatchRequest):
+    """
+    Answer many queries in one request (api/batch.py), streamed as NDJSON
+    lines `{"index", "answer", "sources"}` or `{"index", "error"}` in
+    completion order. Identical queries are answered once; the rest are
+    retrieved together before answers are generated concurrently.
+    """
+    check_batch_size(len(request.queries))
+    unique, positions = dedupe(
+        (q.query, tuple(sorted((q.filters or {}).items()))) for q in request.queries
+    )
+    # Refuse unknown filters up front, before the 200 streaming response starts
+    split = {key: split_filters(dict(key[1])) for key in unique}
+
+    def lines():
+        try:
+            routes = {key: filtered_route(route_query(key[0]), *split[key]) for key in unique}
+            retrieved: Dict[tuple, List[Document]] = {}
+            rag_chain = None
+            wanted = [key for key in unique if routes[key] != OUTLET]
+            if wanted:
+                rag_chain, _ = get_rag_chain()
+                found = retrieve_many([(key[0], split[key][0]) for key in wanted], k=RERANK_CANDIDATES)
+                retrieved = dict(zip(wanted, found))
+        except Exception as e:
+            logger.exception("Batch retrieval failed: %s: %s", type(e).__name__, e)
+            yield from error_lines(positions, e)
+            return
+
+        def answer(key) -> dict:
+            query, route = key[0], routes[key]
+            outlet_rows = query_outlets(query, split[key][1])[1] if route in (OUTLET, BOTH) else []
+            if route == OUTLET:
+                return {"answer": summarize_outlets(outlet_rows), "sources": outlet_sources(outlet_rows)}
+            return _rag_answer(query, retrieved[key], outlet_rows, rag_chain).model_dump()
+
+        yield from stream_results(unique, positions, answer, request.max_concurrency)
+        logger.info("RAG batch answered", extra={"queries": len(request.queries), "unique": len(unique)})
+
+    return ndjson_response(lines())
+
+@app.websocket("/ws/chat")
+async def ws_chat(websocket: WebSocket):
+    """/rag/query over one WebSocket per conversation (api/ws_chat.py), used by static/js/chat.js."""
+    async def respond(content: str):
+        response = await run_in_threadpool(rag_query, RAGQuery(query=content))
+        yield response.answer
+        yield {"sources": response.sources}
+
+    await serve_chat(websocket, respond)
@@ -0,0 +1,151 @@
+"""
+Dynamic micro-batching for calls that are cheaper in batches (embeddings).
+
+Request handlers run on FastAPI's threadpool and each embeds a single
+query. `MicroBatcher.submit` queues the item and blocks. A worker thread
+takes the first waiting item and keeps collecting until `max_batch` items
+or `max_wait_ms` have passed. It then makes one batched call and hands
+every caller its own result (or the batch's exception). A lone item with
+nothing in flight goes out at once, so an idle server pays no batching
+delay. Up to `max_inflight` batches run at once. While all of them are
+busy, new items keep queueing, so the next batch is bigger: under load,
+batch size grows instead of latency.
+
+`BatchedEmbeddings` puts this in front of any LangChain `Embeddings` (the
+ONNX and HuggingFace models, `OpenAIEmbeddings`). Concurrent `embed_query`
+calls become one `embed_documents` call, with duplicate texts embedded once.
+
+Environment (defaults in brackets):
+    EMBED_MAX_BATCH     largest batch per call                          [32]
+    EMBED_MAX_WAIT_MS   how long the first item waits for company       [5]
+    EMBED_MAX_INFLIGHT  concurrent batched calls for remote embedders   [4]
+"""
+import os
+import time
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Generic, List, Optional, Sequence, Tuple, TypeVar
+
+from langchain_core.embeddings import Embeddings
+
+from api.tracing import span
+
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "32"))
+EMBED_MAX_WAIT_MS = float(os.getenv("EMBED_MAX_WAIT_MS", "5"))
+EMBED_MAX_INFLIGHT = int(os.getenv("EMBED_MAX_INFLIGHT", "4"))
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class MicroBatcher(Generic[T, R]):
+    """Coalesces concurrent `submit` calls into batched `fn(items)` calls."""
+
+    def __init__(self, fn: Callable[[List[T]], Sequence[R]], max_batch: int = EMBED_MAX_BATCH,
+                 max_wait_ms: float = EMBED_MAX_WAIT_MS, max_inflight: int = 1, name: str = "microbatch"):
+        self.fn = fn
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.name = name
+        self._queue: "queue.Queue[Tuple[T, Future]]" = queue.Queue()
+        self._slots = threading.BoundedSemaphore(max(1, max_inflight))
+        # A single in-flight batch runs on the worker itself
+        self._pool = ThreadPoolExecutor(max_inflight, thread_name_prefix=name) if max_inflight > 1 else None
+        self._inflight = 0
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def submit(self, item: T) -> R:
+        """Queue `item`, wait for its batch to run and return its result."""
+        future: Future = Future()
+        self._queue.put((item, future))
+        self._ensure_worker()
+        return future.result()
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            with self._lock:
+                if self._worker is None or not self._worker.is_alive():
+                    self._worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+                    self._worker.start()
+
+    def _collect(self) -> List[Tuple[T, Future]]:
+        batch = [self._queue.get()]
+        if self._inflight == 0 and self._queue.empty():
+            return batch
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            # Wait for a free slot before collecting, so items pile up while every slot is busy
+            self._slots.acquire()
+            batch = self._collect()
+            with self._lock:
+                self._inflight += 1
+            if self._pool is None:
+                self._execute(batch)
+            else:
+                self._pool.submit(self._execute, batch)
+
+    def _execute(self, batch: List[Tuple[T, Future]]):
+        items = [item for item, _ in batch]
+        try:
+            with span(self.name, batch=len(items)):
+                results = list(self.fn(items))
+            if len(results) != len(items):
+                raise RuntimeError(f"{self.name}: {len(results)} results for {len(items)} items")
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        finally:
+            with self._lock:
+                self._inflight -= 1
+            self._slots.release()
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+
+class BatchedEmbeddings(Embeddings):
+    """
+    Wraps `embeddings` so concurrent `embed_query` calls share one
+    `embed_documents` call. `guard(texts, call)` runs each batched call, e.g.
+    behind api/upstream.call_openrouter; exceptions reach every caller in
+    the batch. `embed_documents` passes straight through.
+    """
+
+    def __init__(self, embeddings: Embeddings,
+                 guard: Optional[Callable[[List[str], Callable[[], List[List[float]]]], List[List[float]]]] = None,
+                 max_batch: int = EMBED_MAX_BATCH, max_wait_ms: float = EMBED_MAX_WAIT_MS,
+                 max_inflight: int = 1, name: str = "embedding_batch"):
+        self.embeddings = embeddings
+        self.guard = guard
+        self.batcher = MicroBatcher(self._embed_batch, max_batch, max_wait_ms, max_inflight, name)
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        unique = list(dict.fromkeys(texts))
+        call = lambda: self.embeddings.embed_documents(unique)
+        vectors = dict(zip(unique, self.guard(unique, call) if self.guard else call()))
+        return [vectors[text] for text in texts]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_many(self, texts: List[str], chunk: int = 256) -> List[List[float]]:
+        """Embed a known batch of queries directly (de-duplicated, guarded), `chunk` texts per call."""
+        vectors: List[List[float]] = []
+        for start in range(0, len(texts), chunk):
+            with span(self.batcher.name, batch=len(texts[start:start + chunk])):
+                vectors.extend(self._embed_batch(texts[start:start + chunk]))
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.batcher.submit(text)
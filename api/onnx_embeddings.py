@@ -0,0 +1,92 @@
+"""
+Local query embeddings from an int8-quantised ONNX export of all-MiniLM-L6-v2.
+
+The HuggingFace path in api/main.get_rag_chain loads PyTorch plus the fp32
+model, roughly 0.5 GB of RSS and a slow import. That is why it is skipped
+on Render, so every query pays a network round trip to OpenRouter. This
+backend needs only onnxruntime and tokenizers. The dynamically quantised
+model is ~23 MB, about a quarter of the fp32 weights. It returns the same
+384-d mean-pooled, L2-normalised vectors as the sentence-transformers model,
+up to quantisation error.
+
+Build the model once (torch and optimum are needed for the export only):
+
+    python -m scripts.export_onnx_embeddings            # -> models/minilm-onnx-int8/
+
+get_rag_chain wraps it in api/microbatch.BatchedEmbeddings, which coalesces
+concurrent `embed_query` calls into one forward pass.
+
+Environment (defaults in brackets):
+    ONNX_EMBEDDINGS_DIR   model.onnx + tokenizer.json      [models/minilm-onnx-int8]
+    ONNX_THREADS          onnxruntime intra-op threads      [1]
+    ONNX_MAX_LENGTH       tokens per text before truncation [256]
+"""
+import os
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from api.microbatch import EMBED_MAX_BATCH
+
+ONNX_EMBEDDINGS_DIR = os.getenv("ONNX_EMBEDDINGS_DIR", "models/minilm-onnx-int8")
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", "1"))
+ONNX_MAX_LENGTH = int(os.getenv("ONNX_MAX_LENGTH", "256"))
+MODEL_FILE = "model.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+
+
+def onnx_model_available(model_dir: str = ONNX_EMBEDDINGS_DIR) -> bool:
+    return all(os.path.exists(os.path.join(model_dir, name)) for name in (MODEL_FILE, TOKENIZER_FILE))
+
+
+def mean_pool(hidden: np.ndarray, attention_mask: np.ndarray, normalize: bool = True) -> np.ndarray:
+    """Sentence-transformers pooling: mask-weighted mean of token states, then L2 norm."""
+    mask = attention_mask[..., None].astype(np.float32)
+    pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+    if normalize:
+        pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+    return pooled.astype(np.float32)
+
+
+class OnnxEmbeddings(Embeddings):
+    """LangChain `Embeddings` over an onnxruntime CPU session."""
+
+    def __init__(self, model_dir: str = ONNX_EMBEDDINGS_DIR, max_length: int = ONNX_MAX_LENGTH,
+                 threads: int = ONNX_THREADS, batch_size: int = EMBED_MAX_BATCH):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.model_path = os.path.join(model_dir, MODEL_FILE)
+        self.session = ort.InferenceSession(
+            self.model_path, options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.batch_size = batch_size
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+        hidden = self.session.run(None, feeds)[0]
+        return mean_pool(hidden, attention_mask)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            vectors.extend(self._encode(list(texts[start:start + self.batch_size])).tolist())
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0].tolist()
@@ -0,0 +1,178 @@
+"""
+Outlet questions answered from the SQLite outlets DB (db/outlets.db).
+
+The question is turned into a SELECT by `agent.tools.generate_sql` (LLM,
+or keyword templates while OpenRouter is unavailable) and run through
+api/sql_guard.py, which validates it as a read-only SELECT, refuses
+expensive plans, enforces a time budget and caches results per DB
+version. Served as GET /outlets for OutletTool and used by /rag/query for
+outlet-routed questions.
+
+/rag/query `filters` on outlet fields (OUTLET_FILTER_FIELDS) become WHERE
+clauses: `with_filters` runs the SELECT against a CTE that shadows the
+outlets table with only the matching rows, so counts and listings both
+respect them. SQL naming `main.outlets` would read past the CTE, so it is
+refused and the templated SQL is used instead.
+
+Environment:
+    OUTLETS_DB_PATH    SQLite database (default db/outlets.db)
+    OUTLETS_MAX_ROWS   rows returned per query (default 50)
+"""
+import os
+import re
+import sqlite3
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import APIRouter, HTTPException, Query
+from pydantic import BaseModel
+
+from agent.tools import generate_sql, templated_sql
+from api.sql_guard import UnsafeSQLError, execute_select
+from api.tracing import span
+
+OUTLETS_DB_PATH = os.getenv("OUTLETS_DB_PATH", "db/outlets.db")
+OUTLETS_MAX_ROWS = int(os.getenv("OUTLETS_MAX_ROWS", "50"))
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+_SELECT_RE = re.compile(r"^\s*(select|with)\b", re.IGNORECASE)
+_WITH_RE = re.compile(r"^\s*with(\s+recursive)?\b", re.IGNORECASE)
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+# The real table, however its schema and name are quoted: it bypasses the filter CTE
+_MAIN_OUTLETS_RE = re.compile(r"[\[`\"]?\bmain[\]`\"]?\s*\.\s*[\[`\"]?outlets\b", re.IGNORECASE)
+
+# Outlet columns /rag/query `filters` may name, and whether each is a 0/1 flag
+OUTLET_FILTER_FIELDS = {"location": False, "dine_in": True, "delivery": True, "pickup": True}
+_TRUE = {"1", "true", "yes"}
+_FALSE = {"0", "false", "no"}
+
+
+class OutletQueryResponse(BaseModel):
+    query: str
+    sql: str
+    results: List[Dict[str, Any]]
+    summary: str
+
+
+def _clean_sql(sql: str) -> str:
+    """Strip code fences and a trailing semicolon; reject anything but one SELECT."""
+    sql = sql.strip().strip("`").strip()
+    if sql.lower().startswith("sql\n"):
+        sql = sql[4:]
+    sql = sql.strip().rstrip(";").strip()
+    if not _SELECT_RE.match(sql) or ";" in sql:
+        raise ValueError(f"Not a single SELECT statement: {sql[:80]!r}")
+    return sql
+
+
+def run_sql(sql: str) -> List[Dict[str, Any]]:
+    """
+    Run a SELECT through api/sql_guard (read-only validation, plan and time
+    budget, result cache) and return up to OUTLETS_MAX_ROWS rows.
+    """
+    with span("outlet_query"):
+        return execute_select(OUTLETS_DB_PATH, sql, OUTLETS_MAX_ROWS)
+
+
+def filter_conditions(filters: Optional[Dict[str, str]]) -> List[str]:
+    """
+    SQL conditions for outlet `filters`: an exact, case-insensitive match on
+    location, and true/false (1/0, yes/no) on the service flags. Fields not
+    in OUTLET_FILTER_FIELDS are ignored; a flag that isn't a boolean raises
+    ValueError.
+    """
+    conditions = []
+    for field, value in (filters or {}).items():
+        if field not in OUTLET_FILTER_FIELDS:
+            continue
+        text = str(value).strip().lower()
+        if OUTLET_FILTER_FIELDS[field]:
+            if text not in _TRUE | _FALSE:
+                raise ValueError(f"Filter `{field}` must be true or false, not {value!r}.")
+            conditions.append(f"{field} = {1 if text in _TRUE else 0}")
+        else:
+            escaped = text.replace("'", "''")
+            conditions.append(f"lower({field}) = '{escaped}'")
+    return conditions
+
+
+def with_filters(sql: str, filters: Optional[Dict[str, str]]) -> str:
+    """
+    `sql` reading only the outlets rows that match `filters`. Raises
+    UnsafeSQLError if `sql` names `main.outlets`, which the CTE can't shadow.
+    """
+    conditions = filter_conditions(filters)
+    if not conditions:
+        return sql
+    if _MAIN_OUTLETS_RE.search(_STRING_RE.sub("''", sql)):
+        raise UnsafeSQLError(f"Filtered SQL may not read main.outlets directly: {sql[:80]!r}")
+    cte = f"outlets AS (SELECT * FROM main.outlets WHERE {' AND '.join(conditions)})"
+    match = _WITH_RE.match(sql)
+    if match:
+        keyword = "WITH RECURSIVE" if match.group(1) else "WITH"
+        return f"{keyword} {cte}, {sql[match.end():].lstrip()}"
+    return f"WITH {cte} {sql}"
+
+
+def query_outlets(query: str, filters: Optional[Dict[str, str]] = None) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    SQL for `query` (restricted by outlet `filters`) and its rows; falls
+    back to templated SQL if the generated one fails.
+    """
+    try:
+        sql = with_filters(_clean_sql(generate_sql(query)), filters)
+        return sql, run_sql(sql)
+    except (ValueError, RuntimeError, sqlite3.Error) as e:
+        logger.warning("Generated outlet SQL failed, using templated SQL: %s", e)
+        sql = with_filters(templated_sql(query), filters)
+        return sql, run_sql(sql)
+
+
+def format_outlet(row: Dict[str, Any]) -> str:
+    if "name" not in row:
+        return ", ".join(f"{key}: {value}" for key, value in row.items())
+    line = row["name"]
+    if row.get("location"):
+        line += f" ({row['location']})"
+    if row.get("opening_time") and row.get("closing_time"):
+        line += f", {row['opening_time']}–{row['closing_time']}"
+    if row.get("address"):
+        line += f", {row['address']}"
+    return line
+
+
+def summarize_outlets(rows: List[Dict[str, Any]], limit: int = 10) -> str:
+    """Deterministic answer text for outlet rows, so counts are exact."""
+    if not rows:
+        return "No outlets found matching your question."
+    if len(rows) == 1 and len(rows[0]) == 1:
+        (key, value), = rows[0].items()
+        if "count" in key.lower():
+            return f"There {'is' if value == 1 else 'are'} {value} matching outlet{'' if value == 1 else 's'}."
+        return f"{key}: {value}"
+    lines = [f"- {format_outlet(row)}" for row in rows[:limit]]
+    if len(rows) > limit:
+        more = f"{len(rows) - limit}+" if len(rows) == OUTLETS_MAX_ROWS else str(len(rows) - limit)
+        lines.append(f"...and {more} more.")
+    return "Here are the outlets I found:\n" + "\n".join(lines)
+
+
+def row_source(row: Dict[str, Any]) -> str:
+    """`outlets:<id>` when the SELECT included the id, else the DB path."""
+    return f"outlets:{row['id']}" if row.get("id") is not None else OUTLETS_DB_PATH
+
+
+def outlet_sources(rows: List[Dict[str, Any]]) -> List[str]:
+    return list(dict.fromkeys(row_source(row) for row in rows)) or [OUTLETS_DB_PATH]
+
+
+@router.get("/outlets", response_model=OutletQueryResponse)
+def outlets(query: str = Query(..., description="Natural-language question about outlets")):
+    try:
+        sql, rows = query_outlets(query)
+    except Exception as e:
+        logger.exception("Outlet query failed: %s", e)
+        raise HTTPException(status_code=500, detail=f"{type(e).__name__}: {str(e)}")
+    return OutletQueryResponse(query=query, sql=sql, results=rows, summary=summarize_outlets(rows))
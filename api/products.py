@@ -2,11 +2,28 @@ from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel, Field
 import os
 import json
+import logging
 import sqlite3
 import openai
 import faiss
 from openai import OpenAI
 import numpy as np
+from typing import Optional
+
+from api.tracing import serialized, span, traced
+from api.batch import BATCH_EMBED_CHUNK, check_batch_size, dedupe, error_lines, ndjson_response, stream_results
+from api.context import select_context
+from api.degraded import extractive_answer
+from api.keyword_index import BM25Index
+from api.microbatch import EMBED_MAX_INFLIGHT, MicroBatcher
+from api.prompts import PromptTemplate, usage
+from api.rerank import RERANK_CANDIDATES
+from api.snapshot import TableRows, open_table, table_path
+from api.vector_index import configure_search, index_kind
+from api.upstream import (
+    OPENROUTER_MAX_RETRIES, OPENROUTER_TIMEOUT, UpstreamUnavailableError,
+    call_openrouter, prompt_key,
+)
 
 # --- existing outlet code omitted for brevity ---
 
@@ -17,14 +34,41 @@ PRODUCTS_META_PATH = os.getenv('PRODUCTS_META_PATH', 'db/products.json')
 TOP_K = 5
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# FAISS index and metadata are loaded on first use (see get_products_index)
+faiss_index = None
+products_meta: list[dict] = []
+_keyword_index = None
+_client = None
 
-# Load FAISS index and metadata once at startup
-try:
-    faiss_index = faiss.read_index(FAISS_INDEX_PATH)
+def _load_products_meta(ntotal: int):
+    """
+    Product rows aligned with the index: a memory-mapped view of the snapshot's
+    drinkware table (what scripts/build_index.py embeds), or products.json if
+    there is no snapshot or it no longer matches the index.
+    """
+    if table_path("drinkware") is not None:
+        rows = TableRows(open_table("drinkware"), rename={"content": "description"})
+        if len(rows) == ntotal:
+            return rows
+        logger.warning("Snapshot has %d products but the index has %d; using %s", len(rows), ntotal, PRODUCTS_META_PATH)
     with open(PRODUCTS_META_PATH, 'r', encoding='utf-8') as f:
-        products_meta = json.load(f)  # expect list of { "id": ..., "title": ..., "description": ... }
-except Exception as e:
-    raise RuntimeError(f"Failed to load FAISS index or metadata: {e}")
+        return json.load(f)  # expect list of { "id": ..., "title": ..., "description": ... }
+
+def get_products_index():
+    """Load the products index (built by scripts/build_index.py) and its metadata once."""
+    global faiss_index, products_meta
+    if faiss_index is None:
+        try:
+            index = faiss.read_index(FAISS_INDEX_PATH)
+            products_meta = _load_products_meta(index.ntotal)
+        except Exception as e:
+            raise RuntimeError(f"Failed to load FAISS index or metadata: {e}")
+        # Query-time knobs (nprobe / efSearch) come from the environment, not the file
+        faiss_index = configure_search(index)
+        logger.info("Loaded %s products index with %d vectors", index_kind(index), index.ntotal)
+    return faiss_index, products_meta
 
 class ProductQAResponse(BaseModel):
     answer: str
@@ -32,56 +76,170 @@ class ProductQAResponse(BaseModel):
         ..., description="List of product IDs or titles used as grounding sources."
     )
 
+def get_client() -> OpenAI:
+    """One OpenRouter client for every call: building one costs ~40 ms of CPU."""
+    global _client
+    if _client is None:
+        _client = OpenAI(
+            api_key=os.getenv("OPENROUTER_API_KEY"),
+            base_url=os.getenv("OPENROUTER_API_BASE", "https://openrouter.ai/api/v1"),
+            timeout=OPENROUTER_TIMEOUT,
+            max_retries=OPENROUTER_MAX_RETRIES,
+        )
+    return _client
+
+def _embed_batch(texts: list[str]) -> list[list[float]]:
+    """One embeddings call for a batch of distinct query texts."""
+    unique = list(dict.fromkeys(texts))
+    client = get_client()
+    resp = call_openrouter(
+        prompt_key("embed", EMBEDDING_MODEL, *unique),
+        lambda: client.embeddings.create(model=EMBEDDING_MODEL, input=unique),
+    )
+    vectors = {text: d.embedding for text, d in zip(unique, sorted(resp.data, key=lambda d: d.index))}
+    return [vectors[text] for text in texts]
+
+# Concurrent /products/qa queries are embedded together (api/microbatch.py)
+_embed_batcher = MicroBatcher(_embed_batch, max_inflight=EMBED_MAX_INFLIGHT, name="products_embedding")
+
+@traced("embedding")
 def embed_text(text: str) -> list[float]:
-    client = OpenAI(api_key=os.getenv("OPENROUTER_API_KEY"), base_url=os.getenv("OPENROUTER_API_BASE", "https://openrouter.ai/api/v1"))
-    resp = client.embeddings.create(model=EMBEDDING_MODEL, input=text)
-    return resp.data[0].embedding
+    return _embed_batcher.submit(text)
+
+def _product_text(d: dict) -> str:
+    return f"{d.get('title', '')}: {d.get('description', '')}"
+
+def get_keyword_index() -> BM25Index:
+    """BM25 over the product rows, for retrieval while embeddings are unavailable; built on first use."""
+    global _keyword_index
+    _, products_meta = get_products_index()
+    if _keyword_index is None:
+        _keyword_index = BM25Index(_product_text(d) for d in products_meta)
+    return _keyword_index
+
+def _keyword_docs(query: str, k: int) -> list[dict]:
+    _, products_meta = get_products_index()
+    with span("keyword_search", k=k):
+        return [products_meta[i] for i, _ in get_keyword_index().search(query, k)]
 
 def retrieve_docs(query: str, k: int = TOP_K) -> list[dict]:
-    vec = embed_text(query)
-    D, I = faiss_index.search(np.array([vec]).astype('float32'), k)
+    faiss_index, products_meta = get_products_index()
+    try:
+        vec = embed_text(query)
+    except UpstreamUnavailableError:
+        # Degraded mode: BM25 over the product metadata
+        return _keyword_docs(query, k)
+    with span("vector_search", k=k):
+        D, I = faiss_index.search(np.array([vec]).astype('float32'), k)
     docs = []
     for idx in I[0]:
-        if idx < len(products_meta):
+        # IVF/HNSW pad with -1 when fewer than k neighbours are found
+        if 0 <= idx < len(products_meta):
             docs.append(products_meta[idx])
     return docs
 
-def generate_answer(query: str, docs: list[dict]) -> str:
-    # Build context from retrieved docs
-    context = "\n\n".join(
-        f"Product ID: {d['id']}\nTitle: {d['title']}\nDescription: {d['description']}"
-        for d in docs
-    )
-    prompt = (
-        f"You are a product assistant. Use ONLY the following product information to answer the user.\n\n"
-        f"{context}\n\nUser Question: {query}\nAnswer:"
-    )
-    client = OpenAI(
-        api_key=os.getenv("OPENROUTER_API_KEY"),
-        base_url=os.getenv("OPENROUTER_API_BASE", "https://openrouter.ai/api/v1"),
-    )
-    resp = client.chat.completions.create(
-        model="meta-llama/llama-3-70b-instruct",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.2,
-    )
+def retrieve_docs_many(queries: list[str], k: int = TOP_K) -> list[list[dict]]:
+    """`retrieve_docs` for distinct queries: chunked embeddings calls and one FAISS search."""
+    faiss_index, products_meta = get_products_index()
+    try:
+        vectors = []
+        for start in range(0, len(queries), BATCH_EMBED_CHUNK):
+            chunk = queries[start:start + BATCH_EMBED_CHUNK]
+            with span("embedding", batch=len(chunk)):
+                vectors.extend(_embed_batch(chunk))
+    except UpstreamUnavailableError:
+        return [_keyword_docs(query, k) for query in queries]
+    with span("vector_search", k=k, batch=len(queries)):
+        D, I = faiss_index.search(np.array(vectors).astype('float32'), k)
+    return [[products_meta[idx] for idx in row if 0 <= idx < len(products_meta)] for row in I]
+
+def _product_passage(d: dict) -> str:
+    return f"Product ID: {d['id']}\nTitle: {d['title']}\nDescription: {d['description']}"
+
+PRODUCTS_PROMPT = PromptTemplate(
+    "products",
+    system="You are a product assistant. Use ONLY the product information in the user's message to answer their question.",
+)
+
+@traced("llm_generation")
+def generate_answer(query: str, passages: list[str]) -> str:
+    """Answer from product passages already reranked and trimmed by select_context."""
+    # Instructions first and fixed; the products and question vary per call
+    user = "\n\n".join(passages) + f"\n\nUser Question: {query}"
+    client = get_client()
+
+    def create():
+        resp = client.chat.completions.create(
+            model="meta-llama/llama-3-70b-instruct",
+            messages=PRODUCTS_PROMPT.messages(user),
+            temperature=0.2,
+        )
+        usage.record(PRODUCTS_PROMPT.name, resp.usage, PRODUCTS_PROMPT.estimate_tokens(user),
+                     resp.choices[0].message.content or "")
+        return resp
+
+    resp = call_openrouter(prompt_key("products", user), create)
     content = resp.choices[0].message.content
     if content is None:
         raise ValueError("No content returned from LLM")
     return content.strip()
 
+def _answer_from_docs(query: str, docs: list[dict]) -> tuple[str, list[str]]:
+    # Best products first, descriptions trimmed, within the context token budget
+    context = select_context(query, [_product_passage(d) for d in docs])
+    docs = [docs[i] for i, _ in context]
+    try:
+        answer = generate_answer(query, [text for _, text in context])
+    except UpstreamUnavailableError:
+        logger.warning("LLM unavailable, returning extractive product answer")
+        answer = extractive_answer([_product_text(d) for d in docs])
+    return answer, [d.get('title') or str(d.get('id')) for d in docs]
+
 @router.get("/products/qa", response_model=ProductQAResponse)
-async def products_qa(query: str = Query(..., description="Natural-language question about products")):
+def products_qa(query: str = Query(..., description="Natural-language question about products")):
     if not query:
         raise HTTPException(status_code=400, detail="`query` parameter is required.")
     try:
-        docs = retrieve_docs(query)
+        docs = retrieve_docs(query, RERANK_CANDIDATES)
         if not docs:
             raise HTTPException(status_code=404, detail="No relevant products found.")
-        answer = generate_answer(query, docs)
-        sources = [d.get('title') or str(d.get('id')) for d in docs]
-        return ProductQAResponse(answer=answer, sources=sources)
+        answer, sources = _answer_from_docs(query, docs)
+        return serialized(ProductQAResponse(answer=answer, sources=sources))
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"RAG processing error: {e}")
\ No newline at end of file
+        logger.exception("Product QA failed")
+        raise HTTPException(status_code=500, detail=f"RAG processing error: {e}")
+
+class ProductQABatchRequest(BaseModel):
+    queries: list[str]
+    max_concurrency: Optional[int] = Field(None, description="Answers generated at once, capped at BATCH_MAX_CONCURRENCY.")
+
+@router.post("/products/qa/batch")
+def products_qa_batch(request: ProductQABatchRequest):
+    """
+    `/products/qa` for many questions, streamed as NDJSON lines
+    `{"index", "answer", "sources"}` or `{"index", "error"}` in completion order.
+    """
+    check_batch_size(len(request.queries))
+    if not all(q.strip() for q in request.queries):
+        raise HTTPException(status_code=400, detail="Every query must be non-empty.")
+    unique, positions = dedupe(request.queries)
+
+    def lines():
+        try:
+            retrieved = dict(zip(unique, retrieve_docs_many(unique, RERANK_CANDIDATES)))
+        except Exception as e:
+            logger.exception("Product QA batch retrieval failed")
+            yield from error_lines(positions, e)
+            return
+
+        def answer(query: str) -> dict:
+            if not retrieved[query]:
+                raise LookupError("No relevant products found.")
+            answer, sources = _answer_from_docs(query, retrieved[query])
+            return ProductQAResponse(answer=answer, sources=sources).model_dump()
+
+        yield from stream_results(unique, positions, answer, request.max_concurrency)
+
+    return ndjson_response(lines())
@@ -0,0 +1,142 @@
+"""
+Prompt assembly and token accounting for LLM calls.
+
+Each call site declares one `PromptTemplate`: a system message with the
+instructions, then the per-call user message. Examples go inline in the
+system message, because a few-shot message pair costs framing tokens that a
+line doesn't. The system message is built once, at import. So every call
+starts with the same bytes, and providers that cache prompt prefixes
+(automatic on OpenAI-compatible models behind OpenRouter) can reuse them.
+Only the user message varies. Keep per-call values such as the question,
+retrieved rows or the time of day out of the system message, or the cache
+never hits.
+
+`usage` totals each template's calls and the prompt, completion and cached
+prompt tokens the provider reports. Beside those sits the local estimate
+(api/context.count_tokens plus the per-message framing), which is used when
+a reply carries no usage. GET /metrics shows the totals under "llm_usage".
+Each call's numbers are also set on the current span, so exported traces
+carry them per request.
+"""
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from api.context import count_tokens
+from api.tracing import current_span
+
+# Role and separator tokens per chat message, and the reply priming, as in OpenAI's accounting
+MESSAGE_OVERHEAD_TOKENS = 4
+REPLY_PRIMING_TOKENS = 3
+
+
+def count_message_tokens(messages: Sequence[Dict[str, str]]) -> int:
+    return sum(MESSAGE_OVERHEAD_TOKENS + count_tokens(m["content"]) for m in messages)
+
+
+class PromptTemplate:
+    """A static system message and the user message that follows it."""
+
+    def __init__(self, name: str, system: str):
+        self.name = name
+        self.prefix: List[Dict[str, str]] = [{"role": "system", "content": system.strip()}]
+        self.prefix_tokens = count_message_tokens(self.prefix)
+
+    def messages(self, user: str) -> List[Dict[str, str]]:
+        return [dict(m) for m in self.prefix] + [{"role": "user", "content": user}]
+
+    def estimate_tokens(self, user: str) -> int:
+        """Prompt tokens of `messages(user)` by the local count."""
+        return self.prefix_tokens + count_message_tokens([{"role": "user", "content": user}]) + REPLY_PRIMING_TOKENS
+
+    def chat_prompt(self, user_template: str):
+        """The same messages as a LangChain ChatPromptTemplate, with `user_template` last."""
+        from langchain_core.prompts import ChatPromptTemplate
+
+        # The prefix is literal text, so its braces must not become template variables
+        prefix = [(m["role"], m["content"].replace("{", "{{").replace("}", "}}")) for m in self.prefix]
+        return ChatPromptTemplate.from_messages(prefix + [("human", user_template)])
+
+
+def _field(obj: Any, name: str) -> Any:
+    if obj is None:
+        return None
+    return obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+
+
+class UsageLedger:
+    """Token totals per prompt template, for this worker."""
+
+    def __init__(self):
+        self._totals: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, reported: Any = None, estimated_prompt_tokens: Optional[int] = None,
+               completion_text: str = "") -> Dict[str, int]:
+        """
+        Count one call. `reported` is the reply's usage (an OpenAI usage
+        object or its dict form) or None; missing counts fall back to the
+        local estimate and to `completion_text`.
+        """
+        prompt_tokens = _field(reported, "prompt_tokens")
+        completion_tokens = _field(reported, "completion_tokens")
+        call = {
+            "prompt_tokens": int(prompt_tokens if prompt_tokens is not None else estimated_prompt_tokens or 0),
+            "completion_tokens": int(completion_tokens if completion_tokens is not None
+                                     else count_tokens(completion_text) if completion_text else 0),
+            "cached_prompt_tokens": int(_field(_field(reported, "prompt_tokens_details"), "cached_tokens") or 0),
+            "estimated_prompt_tokens": int(estimated_prompt_tokens or 0),
+        }
+        with self._lock:
+            totals = self._totals.setdefault(name, dict.fromkeys(
+                ("calls", "unreported_calls", *call), 0))
+            totals["calls"] += 1
+            totals["unreported_calls"] += prompt_tokens is None
+            for key, value in call.items():
+                totals[key] += value
+        current = current_span()
+        if current is not None:
+            for key, value in call.items():
+                current.set_attribute(f"llm.{key}", value)
+        return call
+
+    def snapshot(self) -> Dict[str, dict]:
+        """Per template: totals, per-call means and the share of prompt tokens served from cache."""
+        with self._lock:
+            items = [(name, dict(totals)) for name, totals in self._totals.items()]
+        result = {}
+        for name, totals in items:
+            calls = totals["calls"] or 1
+            result[name] = {
+                **totals,
+                "prompt_tokens_mean": round(totals["prompt_tokens"] / calls, 1),
+                "completion_tokens_mean": round(totals["completion_tokens"] / calls, 1),
+                "cached_ratio": round(totals["cached_prompt_tokens"] / totals["prompt_tokens"], 3)
+                if totals["prompt_tokens"] else 0.0,
+            }
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._totals.clear()
+
+
+usage = UsageLedger()
+
+
+class UsageCallback(BaseCallbackHandler):
+    """Records a LangChain chat model call under `name`, e.g. the RAG stuff chain's."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._estimated: Optional[int] = None
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self._estimated = sum(MESSAGE_OVERHEAD_TOKENS + count_tokens(str(m.content)) for m in messages[0]) \
+            + REPLY_PRIMING_TOKENS
+
+    def on_llm_end(self, response, **kwargs):
+        reported = (response.llm_output or {}).get("token_usage")
+        text = response.generations[0][0].text if response.generations and response.generations[0] else ""
+        usage.record(self.name, reported, self._estimated, text)
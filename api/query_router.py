@@ -0,0 +1,33 @@
+"""
+Keyword router in front of /rag/query.
+
+Outlet questions (locations, opening hours, services, counts) are answered
+from the outlets DB via SQL; product questions go to the drinkware vector
+index; questions mentioning both get both.
+"""
+import re
+
+PRODUCT = "product"
+OUTLET = "outlet"
+BOTH = "both"
+
+_OUTLET_RE = re.compile(
+    r"\b(outlets?|stores?|shops?|branch(?:es)?|cafes?|locations?|located|address|near(?:by|est)?|"
+    r"open(?:ing)?|clos(?:e|es|ing)|hours?|dine[- ]?in|delivery|pick[- ]?up|mall|"
+    r"selangor|kuala lumpur|putrajaya|where)\b",
+    re.IGNORECASE,
+)
+_PRODUCT_RE = re.compile(
+    r"\b(products?|drinkware|cups?|mugs?|tumblers?|bottles?|flasks?|lids?|straws?|"
+    r"ceramic|stainless|\d+\s*(?:ml|oz)|price|cost|buy|sell|colou?rs?|merch(?:andise)?)\b",
+    re.IGNORECASE,
+)
+
+
+def route_query(query: str) -> str:
+    """Classify `query` as PRODUCT, OUTLET or BOTH (defaults to PRODUCT)."""
+    outlet = bool(_OUTLET_RE.search(query))
+    product = bool(_PRODUCT_RE.search(query))
+    if outlet and product:
+        return BOTH
+    return OUTLET if outlet else PRODUCT
@@ -0,0 +1,129 @@
+"""
+Second-stage reranking of retrieved passages with a small CPU cross-encoder.
+
+First-stage retrieval (hybrid BM25 + FAISS in api/main.py, FAISS in
+api/products.py) over-fetches RERANK_CANDIDATES passages. The
+cross-encoder then scores each (query, passage) pair jointly, and
+api/context.py packs the best-scoring ones into the prompt. Pairs are
+scored in batches, and scores are kept in an LRU cache, so repeat questions
+skip the model.
+
+The cross-encoder is a PyTorch model, which doesn't fit Render's memory
+and start-up limits (the reason api/main.py embeds with ONNX there), so it
+is opt-in: set RERANK_MODEL to a model name or local path, e.g.
+cross-encoder/ms-marco-MiniLM-L-6-v2. `warm_up` loads it on a background
+thread at start-up. Requests never load it: until it is ready, or if
+sentence-transformers or the model can't be loaded, BM25 over the candidate
+set is used instead, so the stage never fails or stalls a request.
+
+Environment (defaults in brackets):
+    RERANK_MODEL        cross-encoder name or path, or "lexical"         [lexical]
+    RERANK_CANDIDATES   passages retrieved for reranking                 [8]
+    RERANK_BATCH_SIZE   pairs per cross-encoder forward pass             [16]
+    RERANK_MAX_LENGTH   cross-encoder input length in word pieces        [256]
+    RERANK_CACHE_SIZE   cached (query, passage) scores                   [4096]
+"""
+import os
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import List, Sequence, Tuple
+
+from api.keyword_index import BM25Index
+from api.tracing import span
+
+RERANK_MODEL = os.getenv("RERANK_MODEL") or "lexical"
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "8"))
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+RERANK_MAX_LENGTH = int(os.getenv("RERANK_MAX_LENGTH", "256"))
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "4096"))
+
+logger = logging.getLogger(__name__)
+
+# Loaded by `load_cross_encoder`; False when disabled or loading failed, so it isn't retried
+_model = None
+_model_lock = threading.Lock()
+_warm_up_started = False
+# (model, query, sha1(passage)) -> score, least recently used first
+_scores: "OrderedDict[Tuple[str, str, str], float]" = OrderedDict()
+_scores_lock = threading.Lock()
+
+
+def load_cross_encoder():
+    """Load RERANK_MODEL now, blocking; the cross-encoder, or None if it is disabled or can't be loaded."""
+    global _model
+    with _model_lock:
+        if _model is None:
+            if RERANK_MODEL == "lexical":
+                _model = False
+            else:
+                try:
+                    from sentence_transformers import CrossEncoder  # type: ignore
+                    _model = CrossEncoder(RERANK_MODEL, max_length=RERANK_MAX_LENGTH, device="cpu")
+                    logger.info("Loaded reranker %s", RERANK_MODEL)
+                except Exception as e:
+                    logger.warning("Cross-encoder unavailable, reranking lexically: %s", e)
+                    _model = False
+    return _model or None
+
+
+def warm_up():
+    """Start loading an opted-in cross-encoder on a background thread, once."""
+    global _warm_up_started
+    with _model_lock:
+        if _model is not None or _warm_up_started or RERANK_MODEL == "lexical":
+            return
+        _warm_up_started = True
+    threading.Thread(target=load_cross_encoder, name="rerank-warm-up", daemon=True).start()
+
+
+def get_cross_encoder():
+    """The cross-encoder if it is loaded, else None; never waits for it."""
+    if _model is None:
+        warm_up()
+    return _model or None
+
+
+def _cache_key(query: str, passage: str) -> Tuple[str, str, str]:
+    return RERANK_MODEL, query, hashlib.sha1(passage.encode("utf-8")).hexdigest()
+
+
+def _cross_encoder_scores(model, query: str, passages: Sequence[str]) -> List[float]:
+    keys = [_cache_key(query, passage) for passage in passages]
+    scores: List[float] = [0.0] * len(passages)
+    missing = []
+    with _scores_lock:
+        for i, key in enumerate(keys):
+            if key in _scores:
+                _scores.move_to_end(key)
+                scores[i] = _scores[key]
+            else:
+                missing.append(i)
+    if missing:
+        # One batched predict for every uncached pair
+        predicted = model.predict([(query, passages[i]) for i in missing],
+                                  batch_size=RERANK_BATCH_SIZE, show_progress_bar=False)
+        with _scores_lock:
+            for i, score in zip(missing, predicted):
+                scores[i] = float(score)
+                _scores[keys[i]] = scores[i]
+            while len(_scores) > RERANK_CACHE_SIZE:
+                _scores.popitem(last=False)
+    return scores
+
+
+def _lexical_scores(query: str, passages: Sequence[str]) -> List[float]:
+    # IDF over the candidates only: terms shared by every candidate count for little
+    scores = BM25Index(passages).scores(query)
+    return [scores.get(i, 0.0) for i in range(len(passages))]
+
+
+def rerank(query: str, passages: Sequence[str]) -> List[Tuple[int, float]]:
+    """(position, score) for every passage, best first; ties keep retrieval order."""
+    if not passages:
+        return []
+    with span("rerank", candidates=len(passages)):
+        model = get_cross_encoder()
+        scores = _cross_encoder_scores(model, query, passages) if model else _lexical_scores(query, passages)
+    return sorted(enumerate(scores), key=lambda item: (-item[1], item[0]))
@@ -0,0 +1,105 @@
+"""
+Hybrid first-stage retrieval over a BM25Index and a PartitionedIndex built
+from the same documents, so a position means the same row in both.
+
+/rag/query (api/main.py) and bench/retrieval_eval.py both rank through these
+functions with their own indexes and embedder, so the eval measures the
+pipeline production serves:
+
+    1. BM25 (api/keyword_index.py), restricted to the rows matching `filters`.
+       A decisive exact-term hit (e.g. a product name) is the answer as is,
+       without an embedding call.
+    2. Otherwise the query is embedded and searched in the vector index, and
+       the HYBRID_CANDIDATES best of each ranking are merged with
+       reciprocal-rank fusion. If the embedder raises
+       UpstreamUnavailableError, the BM25 ranking is used alone.
+
+Reranking and context packing come after this, in api/context.select_context.
+"""
+import logging
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from api.keyword_index import HYBRID_CANDIDATES, BM25Index, reciprocal_rank_fusion
+from api.tracing import span
+from api.upstream import UpstreamUnavailableError
+from api.vector_index import PartitionedIndex
+
+# Sources embedded for RAG. Outlets are answered from db/outlets.db via SQL
+# (api/outlets.py), so only product rows go into the vector index.
+DATA_SOURCES = ["drinkware"]
+
+logger = logging.getLogger(__name__)
+
+Filters = Optional[Dict[str, str]]
+
+
+def keyword_stage(keyword_index: BM25Index, vector_index: PartitionedIndex, query: str, k: int,
+                  filters: Filters = None) -> Tuple[Optional[List[int]], List[int]]:
+    """(decisive exact-term hits or None, BM25 candidate ranking) for one query."""
+    allowed = set(vector_index.matching(filters).tolist()) if filters else None
+    with span("keyword_search"):
+        exact = keyword_index.decisive_matches(query, k=k, allowed=allowed)
+        if exact:
+            logger.debug("Exact keyword match, skipping vector search")
+            return exact, []
+        return None, [i for i, _ in keyword_index.search(query, HYBRID_CANDIDATES, allowed=allowed)]
+
+
+def hybrid_search(keyword_index: BM25Index, vector_index: PartitionedIndex, embed_query: Callable[[str], Sequence[float]],
+                  query: str, k: int = 4, filters: Filters = None) -> List[int]:
+    """Positions of the `k` best rows for `query`, best first."""
+    exact, keyword_ranking = keyword_stage(keyword_index, vector_index, query, k, filters)
+    if exact:
+        return exact
+
+    # Embed once and search by vector so each stage is timed separately
+    query_vector = None
+    with span("embedding"):
+        try:
+            query_vector = embed_query(query)
+        except UpstreamUnavailableError:
+            logger.warning("Embeddings unavailable, falling back to keyword retrieval")
+    if query_vector is None:
+        return keyword_ranking[:k]
+
+    with span("vector_search"):
+        vector_ranking = vector_index.search(query_vector, HYBRID_CANDIDATES, filters)
+    return reciprocal_rank_fusion([vector_ranking, keyword_ranking], k=k)
+
+
+def hybrid_search_many(keyword_index: BM25Index, vector_index: PartitionedIndex,
+                       embed_many: Callable[[List[str]], Sequence[Sequence[float]]],
+                       queries: List[Tuple[str, Filters]], k: int = 4) -> List[List[int]]:
+    """
+    `hybrid_search` for a batch of (query, filters): queries without a
+    decisive keyword hit are embedded with one `embed_many` call and
+    searched with one FAISS call per distinct filter set.
+    """
+    stages = [keyword_stage(keyword_index, vector_index, query, k, filters) for query, filters in queries]
+    pending = [i for i, (exact, _) in enumerate(stages) if not exact]
+    vector_rankings: Dict[int, List[int]] = {}
+    if pending:
+        vectors = None
+        try:
+            vectors = embed_many([queries[i][0] for i in pending])
+        except UpstreamUnavailableError:
+            logger.warning("Embeddings unavailable, falling back to keyword retrieval for %d queries", len(pending))
+        if vectors is not None:
+            groups: Dict[tuple, List[int]] = {}
+            for row, i in enumerate(pending):
+                groups.setdefault(tuple(sorted((queries[i][1] or {}).items())), []).append(row)
+            for filter_items, rows in groups.items():
+                with span("vector_search", batch=len(rows)):
+                    rankings = vector_index.search_many([vectors[row] for row in rows], HYBRID_CANDIDATES,
+                                                        dict(filter_items) or None)
+                vector_rankings.update((pending[row], ranking) for row, ranking in zip(rows, rankings))
+
+    results = []
+    for i, (exact, keyword_ranking) in enumerate(stages):
+        if exact:
+            results.append(exact)
+        elif i in vector_rankings:
+            results.append(reciprocal_rank_fusion([vector_rankings[i], keyword_ranking], k=k))
+        else:
+            results.append(keyword_ranking[:k])
+    return results
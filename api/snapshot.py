@@ -0,0 +1,208 @@
+"""
+Typed, versioned columnar snapshot of the scraped catalogue.
+
+`ingest/build_snapshot.py` is the only place that parses the scraper CSVs.
+It coerces them to the Arrow schemas below and writes one uncompressed
+Arrow IPC file per table under SNAPSHOT_DIR/<version>/, plus a manifest.
+SNAPSHOT_DIR/CURRENT names the active version.
+
+Everything downstream reads the snapshot instead of the CSVs. That covers
+DB seeding (scripts/init_db.py, ingest/outlets_ingest.py), the products
+index builder, the products metadata and the RAG documents. `open_table`
+memory-maps the file, so reads are zero-copy and repeat opens of an
+unchanged file come from a cache.
+
+Environment:
+    SNAPSHOT_DIR   snapshot root (default data/snapshot)
+"""
+import os
+import json
+import shutil
+import hashlib
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from collections.abc import Sequence
+from typing import Dict, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.csv as pacsv
+
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "data/snapshot")
+# Bump when a schema below changes so old snapshots are never mistaken for new ones
+SCHEMA_VERSION = 1
+
+SCHEMAS: Dict[str, pa.Schema] = {
+    "drinkware": pa.schema([
+        ("id", pa.int32()),
+        ("title", pa.string()),
+        ("content", pa.string()),
+    ]),
+    "outlets": pa.schema([
+        ("id", pa.int32()),
+        ("name", pa.string()),
+        ("location", pa.string()),
+        ("address", pa.string()),
+        ("opening_time", pa.string()),
+        ("closing_time", pa.string()),
+        ("dine_in", pa.bool_()),
+        ("delivery", pa.bool_()),
+        ("pickup", pa.bool_()),
+    ]),
+}
+SOURCE_CSVS = {"drinkware": "data/zus_drinkware.csv", "outlets": "data/zus_outlets.csv"}
+
+_SQLITE_TYPES = {pa.int32(): "INTEGER", pa.int64(): "INTEGER", pa.bool_(): "BOOLEAN", pa.string(): "TEXT"}
+
+# path -> ((mtime_ns, size), table)
+_tables: Dict[str, Tuple[Tuple[int, int], pa.Table]] = {}
+_tables_lock = threading.Lock()
+
+
+def read_csv_table(name: str, csv_path: str) -> pa.Table:
+    """Parse a scraper CSV straight into its typed schema (Arrow's multithreaded reader)."""
+    schema = SCHEMAS[name]
+    convert = pacsv.ConvertOptions(
+        column_types=schema,
+        include_columns=schema.names,
+        strings_can_be_null=False,
+        true_values=["1", "true", "True"],
+        false_values=["0", "false", "False", ""],
+    )
+    # Product descriptions contain quoted newlines
+    parse = pacsv.ParseOptions(newlines_in_values=True)
+    return pacsv.read_csv(csv_path, parse_options=parse, convert_options=convert).select(schema.names).cast(schema)
+
+
+def _fingerprint(paths: Dict[str, str]) -> str:
+    digest = hashlib.sha256(f"schema-v{SCHEMA_VERSION}".encode())
+    for name in sorted(paths):
+        digest.update(name.encode())
+        with open(paths[name], "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+def write_snapshot(sources: Optional[Dict[str, str]] = None, root: str = SNAPSHOT_DIR, keep: int = 2) -> dict:
+    """
+    Build a snapshot from `sources` (table -> CSV path) and make it CURRENT.
+    The version is a content hash, so re-running on unchanged CSVs is a no-op.
+    Older versions beyond `keep` are removed. Returns the manifest.
+    """
+    sources = sources or SOURCE_CSVS
+    version = _fingerprint(sources)
+    target = os.path.join(root, version)
+    manifest_path = os.path.join(target, "manifest.json")
+    if not os.path.exists(manifest_path):
+        staging = target + ".tmp"
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        tables = {}
+        for name, csv_path in sources.items():
+            table = read_csv_table(name, csv_path)
+            with pa.OSFile(os.path.join(staging, f"{name}.arrow"), "wb") as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            tables[name] = {"rows": table.num_rows, "source": csv_path, "schema": table.schema.to_string()}
+        manifest = {
+            "version": version,
+            "schema_version": SCHEMA_VERSION,
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "tables": tables,
+        }
+        with open(os.path.join(staging, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        # A target without a manifest is left over from an interrupted run
+        shutil.rmtree(target, ignore_errors=True)
+        os.replace(staging, target)
+
+    current_tmp = os.path.join(root, "CURRENT.tmp")
+    with open(current_tmp, "w", encoding="utf-8") as f:
+        f.write(version + "\n")
+    os.replace(current_tmp, os.path.join(root, "CURRENT"))
+
+    versions = sorted((d for d in os.listdir(root) if os.path.isfile(os.path.join(root, d, "manifest.json"))),
+                      key=lambda d: os.path.getmtime(os.path.join(root, d, "manifest.json")), reverse=True)
+    for old in [v for v in versions if v != version][max(keep - 1, 0):]:
+        shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+
+    with open(manifest_path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def current_version(root: str = SNAPSHOT_DIR) -> Optional[str]:
+    try:
+        with open(os.path.join(root, "CURRENT"), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def table_path(name: str, root: str = SNAPSHOT_DIR) -> Optional[str]:
+    """Path of `name` in the current snapshot, or None if there is no snapshot."""
+    version = current_version(root)
+    if version is None:
+        return None
+    path = os.path.join(root, version, f"{name}.arrow")
+    return path if os.path.exists(path) else None
+
+
+def open_table(name: str, root: str = SNAPSHOT_DIR) -> pa.Table:
+    """Memory-mapped, zero-copy table from the current snapshot."""
+    path = table_path(name, root)
+    if path is None:
+        raise FileNotFoundError(f"No '{name}' table in snapshot {root!r}; run `python -m ingest.build_snapshot`")
+    stat = os.stat(path)
+    version = (stat.st_mtime_ns, stat.st_size)
+    with _tables_lock:
+        cached = _tables.get(path)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+    with _tables_lock:
+        _tables[path] = (version, table)
+    return table
+
+
+class TableRows(Sequence):
+    """
+    Read-only list-of-dicts view over a table. Rows are materialised only when
+    indexed, so the table itself stays memory-mapped. `rename` maps column
+    names to the keys callers expect.
+    """
+
+    def __init__(self, table: pa.Table, rename: Optional[Dict[str, str]] = None):
+        self.table = table
+        self.rename = rename or {}
+
+    def __len__(self) -> int:
+        return self.table.num_rows
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        row = self.table.slice(index, 1).to_pylist()[0]
+        return {self.rename.get(key, key): value for key, value in row.items()}
+
+
+def seed_sqlite(conn: sqlite3.Connection, name: str, table: pa.Table, primary_key: str = "id"):
+    """(Re)create table `name` from the snapshot schema and bulk-insert its rows."""
+    columns = []
+    for field in table.schema:
+        column = f"{field.name} {_SQLITE_TYPES.get(field.type, 'TEXT')}"
+        if field.name == primary_key:
+            column += " PRIMARY KEY"
+        columns.append(column)
+    conn.execute(f"DROP TABLE IF EXISTS {name}")
+    conn.execute(f"CREATE TABLE {name} (\n    " + ",\n    ".join(columns) + "\n)")
+    placeholders = ", ".join("?" for _ in table.schema)
+    # Column-wise to Python once, then zip into row tuples
+    conn.executemany(
+        f"INSERT INTO {name} ({', '.join(table.schema.names)}) VALUES ({placeholders})",
+        zip(*(table.column(i).to_pylist() for i in range(table.num_columns))),
+    )
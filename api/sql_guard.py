@@ -0,0 +1,208 @@
+"""
+Guarded execution of generated SELECTs against a SQLite database.
+
+LLM-written SQL (agent.tools.generate_sql) is untrusted. Before a statement
+runs, `execute_select`:
+
+    1. prepares it under an authorizer that allows only SELECT, reads of
+       user tables (not sqlite_*) and a list of plain scalar/aggregate
+       functions; recursive CTEs, PRAGMA, ATTACH and writes are refused;
+    2. estimates the rows it would visit from EXPLAIN QUERY PLAN (a full
+       SCAN counts as the largest table, an index SEARCH as
+       SQL_SEARCH_ROWS, nested loops multiply) and refuses plans above
+       SQL_MAX_PLAN_ROWS, e.g. a three-way cross join;
+    3. runs it on a read-only connection with a progress handler that
+       interrupts it after SQL_TIME_LIMIT_MS, fetching at most `max_rows`.
+
+Results are kept in an LRU keyed by (database, database version,
+normalized SQL, max_rows). The version is the file's mtime and size, so a
+rebuilt DB never serves stale rows. Normalizing collapses whitespace and
+keyword/identifier case outside string literals, so trivially different
+spellings of one query share an entry.
+
+Environment (defaults in brackets):
+    SQL_TIME_LIMIT_MS    wall-clock budget per statement          [250]
+    SQL_PROGRESS_OPS     VM instructions between deadline checks  [1000]
+    SQL_MAX_PLAN_ROWS    largest estimated rows visited           [100000]
+    SQL_SEARCH_ROWS      rows assumed per indexed SEARCH          [10]
+    SQL_CACHE_SIZE       cached result sets                       [256]
+"""
+import os
+import re
+import time
+import sqlite3
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from api.tracing import span
+
+SQL_TIME_LIMIT_MS = float(os.getenv("SQL_TIME_LIMIT_MS", "250"))
+SQL_PROGRESS_OPS = int(os.getenv("SQL_PROGRESS_OPS", "1000"))
+SQL_MAX_PLAN_ROWS = int(os.getenv("SQL_MAX_PLAN_ROWS", "100000"))
+SQL_SEARCH_ROWS = int(os.getenv("SQL_SEARCH_ROWS", "10"))
+SQL_CACHE_SIZE = int(os.getenv("SQL_CACHE_SIZE", "256"))
+
+ALLOWED_FUNCTIONS = {
+    "abs", "avg", "coalesce", "count", "date", "datetime", "group_concat", "ifnull", "iif", "instr",
+    "julianday", "length", "like", "glob", "lower", "ltrim", "max", "min", "nullif", "round",
+    "rtrim", "strftime", "substr", "substring", "sum", "time", "total", "trim", "typeof", "upper",
+}
+
+_TOKEN_RE = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|\s+|[^\s'\"]+")
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"")
+_NESTED_LOOP_RE = re.compile(r"^(SCAN|SEARCH) ")
+
+_cache: "OrderedDict[tuple, List[Dict[str, Any]]]" = OrderedDict()
+_table_rows: Dict[Tuple[str, tuple], int] = {}
+_lock = threading.Lock()
+
+
+class UnsafeSQLError(sqlite3.OperationalError, ValueError):
+    """
+    The statement is not a single read-only SELECT the guard allows. Both a
+    sqlite3 error (what running it would have raised) and a ValueError (as
+    for outlets._clean_sql rejections).
+    """
+
+
+class SQLBudgetError(UnsafeSQLError):
+    """The statement's plan or run time exceeds the configured budget."""
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    Collapse whitespace and lowercase everything outside quotes; drop a
+    trailing ';'. Raises UnsafeSQLError if a quote is left unterminated, as
+    the tokens would no longer spell the statement that was validated.
+    """
+    text = sql.strip().rstrip(";")
+    tokens = _TOKEN_RE.findall(text)
+    if "".join(tokens) != text:
+        raise UnsafeSQLError(f"Unterminated quoted literal or identifier: {sql[:80]!r}")
+    parts = []
+    for token in tokens:
+        if token.isspace():
+            parts.append(" ")
+        elif token[0] in "'\"":
+            parts.append(token)
+        else:
+            parts.append(token.lower())
+    return "".join(parts).strip()
+
+
+def db_version(db_path: str) -> tuple:
+    stat = os.stat(db_path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _authorizer(action, arg1, arg2, db_name, trigger):
+    if action == sqlite3.SQLITE_SELECT:
+        return sqlite3.SQLITE_OK
+    if action == sqlite3.SQLITE_READ:
+        return sqlite3.SQLITE_DENY if arg1.lower().startswith("sqlite_") else sqlite3.SQLITE_OK
+    if action == sqlite3.SQLITE_FUNCTION:
+        return sqlite3.SQLITE_OK if arg2.lower() in ALLOWED_FUNCTIONS else sqlite3.SQLITE_DENY
+    return sqlite3.SQLITE_DENY
+
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _largest_table(conn: sqlite3.Connection, db_path: str, version: tuple) -> int:
+    """Row count of the biggest user table, cached per DB version (before the authorizer is set)."""
+    key = (db_path, version)
+    if key not in _table_rows:
+        tables = [row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")]
+        counts = [conn.execute(f'SELECT COUNT(*) FROM "{name}"').fetchone()[0] for name in tables]
+        _table_rows[key] = max(counts, default=0)
+    return _table_rows[key]
+
+
+def estimate_plan_rows(plan: List[Tuple[int, int, Any, str]], table_rows: int) -> int:
+    """
+    Rows visited by an EXPLAIN QUERY PLAN, roughly. Sibling SCAN/SEARCH
+    steps are nested loops (multiply); MATERIALIZE and subquery steps run
+    once and add, except correlated subqueries, which run per outer row.
+    """
+    children = defaultdict(list)
+    for node_id, parent, _, detail in plan:
+        children[parent].append((node_id, detail))
+
+    def cost(parent: int) -> int:
+        loops, has_loop, extra = 1, False, 0
+        for node_id, detail in children.get(parent, []):
+            if detail.startswith("SCAN CONSTANT ROW"):
+                continue
+            if _NESTED_LOOP_RE.match(detail):
+                loops *= table_rows if detail.startswith("SCAN") else SQL_SEARCH_ROWS
+                has_loop = True
+            elif detail.startswith("CORRELATED"):
+                extra += (loops if has_loop else 1) * cost(node_id)
+            else:
+                extra += cost(node_id)
+        return (loops if has_loop else 0) + extra
+
+    return cost(0)
+
+
+def _check_plan(conn: sqlite3.Connection, sql: str, table_rows: int):
+    try:
+        plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+    except sqlite3.DatabaseError as e:
+        if "not authorized" in str(e) or "prohibited" in str(e):
+            raise UnsafeSQLError(f"Statement uses something other than read-only SELECT: {e}")
+        raise UnsafeSQLError(f"Invalid SQL: {e}")
+    estimate = estimate_plan_rows([tuple(row) for row in plan], table_rows)
+    if estimate > SQL_MAX_PLAN_ROWS:
+        raise SQLBudgetError(f"Query plan visits ~{estimate} rows (limit {SQL_MAX_PLAN_ROWS})")
+
+
+def execute_select(db_path: str, sql: str, max_rows: int,
+                   time_limit_ms: Optional[float] = None) -> List[Dict[str, Any]]:
+    """Validate, plan-check and run `sql` with a time budget; cached per DB version."""
+    normalized = normalize_sql(sql)
+    if not normalized or ";" in _LITERAL_RE.sub("''", normalized):
+        raise UnsafeSQLError(f"Not a single statement: {sql[:80]!r}")
+    version = db_version(db_path)
+    key = (db_path, version, normalized, max_rows)
+    with _lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            with span("sql_cache", hit=True):
+                return [dict(row) for row in _cache[key]]
+
+    time_limit_ms = SQL_TIME_LIMIT_MS if time_limit_ms is None else time_limit_ms
+    conn = _connect(db_path)
+    try:
+        table_rows = _largest_table(conn, db_path, version)
+        conn.set_authorizer(_authorizer)
+        with span("sql_plan_check"):
+            _check_plan(conn, normalized, table_rows)
+        deadline = time.perf_counter() + time_limit_ms / 1000
+        conn.set_progress_handler(lambda: time.perf_counter() > deadline, SQL_PROGRESS_OPS)
+        try:
+            rows = [dict(row) for row in conn.execute(normalized).fetchmany(max_rows)]
+        except sqlite3.OperationalError as e:
+            if "interrupted" in str(e):
+                raise SQLBudgetError(f"Query exceeded {time_limit_ms:g} ms")
+            raise
+    finally:
+        conn.close()
+
+    with _lock:
+        _cache[key] = rows
+        _cache.move_to_end(key)
+        while len(_cache) > SQL_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return [dict(row) for row in rows]
+
+
+def clear_cache():
+    with _lock:
+        _cache.clear()
+        _table_rows.clear()
@@ -0,0 +1,266 @@
+"""
+Lightweight per-stage tracing for the chat and RAG pipelines.
+
+Every `span()` is recorded in an in-memory collector that backs the `/metrics`
+endpoint (p50/p95/p99 plus a fixed-bucket histogram per stage). If
+TRACE_EXPORT_PATH is set, finished spans are also appended to that file as
+OTLP/JSON lines by a background thread, so exporting never blocks a request.
+
+Stage names used across the app:
+    intent_parse, embedding, vector_search, sql_generation, sql_execution,
+    llm_generation, response_serialization
+"""
+import os
+import json
+import time
+import queue
+import secrets
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH")
+TRACE_SAMPLE_SIZE = int(os.getenv("TRACE_SAMPLE_SIZE", "2048"))
+SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "mindhive-bot")
+
+# Upper bounds (ms) of the histogram buckets; the last bucket is +Inf
+HISTOGRAM_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+class Span:
+    """A single timed operation. Parent/trace ids follow the current context."""
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "attributes",
+                 "start_ns", "end_ns", "error")
+
+    def __init__(self, name: str, parent: Optional["Span"] = None, **attributes):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.attributes: Dict[str, Any] = dict(attributes)
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.error: Optional[str] = None
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def to_otlp(self) -> dict:
+        """Render the span in the OTLP/JSON shape (one resourceSpans entry)."""
+        attrs = [{"key": k, "value": _otlp_value(v)} for k, v in self.attributes.items()]
+        otlp_span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": attrs,
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            otlp_span["parentSpanId"] = self.parent_id
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+                "scopeSpans": [{"scope": {"name": "api.tracing"}, "spans": [otlp_span]}],
+            }]
+        }
+
+
+def _otlp_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * (len(sorted_values) - 1)))))
+    return sorted_values[idx]
+
+
+class _StageStats:
+    __slots__ = ("count", "errors", "total_ms", "buckets", "samples")
+
+    def __init__(self, sample_size: int):
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.buckets = [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)
+        # Reservoir of the most recent durations, used for percentiles
+        self.samples: deque = deque(maxlen=sample_size)
+
+
+class SpanCollector:
+    """In-memory aggregation of finished spans, keyed by span name."""
+
+    def __init__(self, sample_size: int = TRACE_SAMPLE_SIZE):
+        self.sample_size = sample_size
+        self._stages: Dict[str, _StageStats] = {}
+        self._lock = threading.Lock()
+
+    def record(self, span: Span):
+        duration = span.duration_ms
+        bucket = len(HISTOGRAM_BUCKETS_MS)
+        for i, bound in enumerate(HISTOGRAM_BUCKETS_MS):
+            if duration <= bound:
+                bucket = i
+                break
+        with self._lock:
+            stats = self._stages.get(span.name)
+            if stats is None:
+                stats = self._stages[span.name] = _StageStats(self.sample_size)
+            stats.count += 1
+            stats.total_ms += duration
+            stats.buckets[bucket] += 1
+            stats.samples.append(duration)
+            if span.error:
+                stats.errors += 1
+
+    def snapshot(self) -> Dict[str, dict]:
+        """Per-stage count, mean, p50/p95/p99 and cumulative histogram buckets."""
+        with self._lock:
+            items = [(name, s.count, s.errors, s.total_ms, list(s.buckets), sorted(s.samples))
+                     for name, s in self._stages.items()]
+        result = {}
+        for name, count, errors, total_ms, buckets, samples in items:
+            cumulative, running = {}, 0
+            for bound, n in zip(list(HISTOGRAM_BUCKETS_MS) + ["+Inf"], buckets):
+                running += n
+                cumulative[str(bound)] = running
+            result[name] = {
+                "count": count,
+                "errors": errors,
+                "mean_ms": round(total_ms / count, 3) if count else 0.0,
+                "p50_ms": round(_percentile(samples, 50), 3),
+                "p95_ms": round(_percentile(samples, 95), 3),
+                "p99_ms": round(_percentile(samples, 99), 3),
+                "histogram_ms": cumulative,
+            }
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+
+
+class OTLPFileExporter:
+    """Appends spans as OTLP/JSON lines from a daemon thread."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="otlp-file-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, span: Span):
+        self._queue.put(span)
+
+    def _run(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                span = self._queue.get()
+                f.write(json.dumps(span.to_otlp()) + "\n")
+                # Drain whatever else is pending before flushing
+                while True:
+                    try:
+                        span = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    f.write(json.dumps(span.to_otlp()) + "\n")
+                f.flush()
+
+
+collector = SpanCollector()
+exporter = OTLPFileExporter(TRACE_EXPORT_PATH) if TRACE_EXPORT_PATH else None
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Time a block of code as a child of the current span."""
+    s = Span(name, parent=_current_span.get(), **attributes)
+    token = _current_span.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        s.end_ns = time.time_ns()
+        _current_span.reset(token)
+        collector.record(s)
+        if exporter is not None:
+            exporter.export(s)
+
+
+def traced(name: str):
+    """Decorator form of `span()` for whole functions."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def serialized(content: Any) -> JSONResponse:
+    """
+    `content` (a pydantic model or plain data) encoded and rendered to JSON
+    in a `response_serialization` span. FastAPI sends a returned Response
+    as is, so this is all the serialization the response gets.
+    """
+    with span("response_serialization"):
+        return JSONResponse(jsonable_encoder(content))
+
+
+async def trace_requests(request: Request, call_next):
+    """
+    HTTP middleware: wrap each request in a root span named after its route.
+    Unmatched paths (404s, scanners) share one name, so they can't grow the
+    collector without bound.
+    """
+    with span("http", method=request.method) as root:
+        response = await call_next(request)
+        route = request.scope.get("route")
+        root.name = f"{request.method} {getattr(route, 'path', '<unmatched>')}"
+        root.set_attribute("http.status_code", response.status_code)
+        return response
+
+
+metrics_router = APIRouter()
+
+
+@metrics_router.get("/metrics")
+def metrics():
+    """Latency percentiles and histograms per pipeline stage, and LLM token usage per prompt."""
+    from api.prompts import usage  # api/prompts.py records its usage on spans from this module
+
+    return {"stages": collector.snapshot(), "llm_usage": usage.snapshot()}
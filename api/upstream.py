@@ -0,0 +1,308 @@
+"""
+Guards for calls to OpenRouter.
+
+- `SingleFlight` collapses identical in-flight requests: the first caller for
+  a key makes the upstream call, everyone else arriving before it finishes
+  waits for and shares that result.
+- `UpstreamLimiter` caps concurrent upstream calls and (optionally) their rate
+  with a token bucket. Waiters are served strictly first-come-first-served.
+
+- `CircuitBreaker` fails fast once OpenRouter keeps failing, so callers can
+  switch to their degraded paths instead of tying up workers on timeouts.
+
+`call_openrouter(key, fn)` applies all three; pass `key=None` to skip
+coalescing. Only outage-shaped errors (`is_upstream_failure`: timeouts,
+connection errors, HTTP 429 and 5xx) count against the breaker; a bad
+request or a parsing bug is re-raised without opening it. It raises `CircuitOpenError` while the breaker is open and
+`UpstreamBusyError` when the queue times out; both are
+`UpstreamUnavailableError`.
+
+Environment:
+    OPENROUTER_MAX_CONCURRENCY   concurrent upstream calls per worker (default 16)
+    OPENROUTER_RATE_PER_SEC      sustained calls/second, 0 = unlimited (default 0)
+    OPENROUTER_BURST             token bucket size (default = max concurrency)
+    OPENROUTER_QUEUE_TIMEOUT     seconds to wait for a slot before failing (default 30)
+    OPENROUTER_TIMEOUT           per-request timeout for OpenRouter clients (default 15)
+    OPENROUTER_MAX_RETRIES       client-side retries per call (default 1)
+    CIRCUIT_FAILURE_THRESHOLD    consecutive failures that open the breaker (default 5)
+    CIRCUIT_RESET_TIMEOUT        seconds before a half-open probe is allowed (default 30)
+"""
+import os
+import time
+import logging
+import hashlib
+import threading
+from collections import deque
+from concurrent.futures import Future
+from contextlib import ExitStack, contextmanager
+from typing import Any, Callable, Dict, Hashable, Optional, TypeVar
+
+import httpx
+import openai
+import requests
+
+from api.tracing import span
+
+T = TypeVar("T")
+logger = logging.getLogger(__name__)
+
+OPENROUTER_TIMEOUT = float(os.getenv("OPENROUTER_TIMEOUT", "15"))
+OPENROUTER_MAX_RETRIES = int(os.getenv("OPENROUTER_MAX_RETRIES", "1"))
+
+
+class UpstreamUnavailableError(RuntimeError):
+    """OpenRouter was not called; callers should use their degraded path."""
+
+
+class UpstreamBusyError(UpstreamUnavailableError):
+    """Raised when no upstream slot frees up within the queue timeout."""
+
+
+class CircuitOpenError(UpstreamUnavailableError):
+    """Raised instead of calling OpenRouter while the breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Classic closed → open → half-open breaker. After `failure_threshold`
+    consecutive failures calls are rejected for `reset_timeout` seconds; then a
+    single probe call is let through and its outcome closes or re-opens it.
+    """
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == self.OPEN
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go upstream now."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    raise CircuitOpenError("OpenRouter circuit is open")
+                self._state = self.HALF_OPEN
+            # Half-open: exactly one probe at a time
+            if self._probe_in_flight:
+                raise CircuitOpenError("OpenRouter circuit is half-open; probe in flight")
+            self._probe_in_flight = True
+
+    def release_probe(self):
+        """Give up a half-open probe slot without recording an outcome."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info("OpenRouter circuit closed")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning("OpenRouter circuit opened after %d failures", self._failures)
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class SingleFlight:
+    """Deduplicate concurrent calls that share a key."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight: Dict[Hashable, Future] = {}
+        self.calls = 0
+        self.shared = 0
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+                self.calls += 1
+            else:
+                self.shared += 1
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+
+class UpstreamLimiter:
+    """FIFO semaphore with an optional token-bucket rate limit."""
+
+    def __init__(self, max_concurrency: int, rate_per_sec: float = 0.0,
+                 burst: Optional[int] = None, queue_timeout: float = 30.0):
+        self.max_concurrency = max_concurrency
+        self.rate_per_sec = rate_per_sec
+        self.burst = burst or max_concurrency
+        self.queue_timeout = queue_timeout
+        self._cond = threading.Condition()
+        self._waiters: deque = deque()
+        self._active = 0
+        self._tokens = float(self.burst)
+        self._last_refill = time.monotonic()
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def _refill(self, now: float):
+        if self.rate_per_sec > 0:
+            self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate_per_sec)
+        self._last_refill = now
+
+    def _wait_for_turn(self, me: object) -> float:
+        """0 if `me` may go now, seconds until the next token, or -1 if not its turn yet."""
+        now = time.monotonic()
+        self._refill(now)
+        if self._waiters[0] is not me or self._active >= self.max_concurrency:
+            return -1.0
+        if self.rate_per_sec > 0 and self._tokens < 1:
+            return (1 - self._tokens) / self.rate_per_sec
+        return 0.0
+
+    @contextmanager
+    def slot(self):
+        me = object()
+        deadline = time.monotonic() + self.queue_timeout
+        with self._cond:
+            self._waiters.append(me)
+            try:
+                while True:
+                    wait = self._wait_for_turn(me)
+                    if wait == 0.0:
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise UpstreamBusyError(
+                            f"No upstream slot within {self.queue_timeout}s "
+                            f"({self._active} active, {len(self._waiters)} queued)"
+                        )
+                    self._cond.wait(remaining if wait < 0 else min(wait, remaining))
+            except BaseException:
+                self._waiters.remove(me)
+                self._cond.notify_all()
+                raise
+            self._waiters.popleft()
+            self._active += 1
+            if self.rate_per_sec > 0:
+                self._tokens -= 1
+            # The next waiter may be able to go too
+            self._cond.notify_all()
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._active -= 1
+                self._cond.notify_all()
+
+
+_max_concurrency = int(os.getenv("OPENROUTER_MAX_CONCURRENCY", "16"))
+limiter = UpstreamLimiter(
+    max_concurrency=_max_concurrency,
+    rate_per_sec=float(os.getenv("OPENROUTER_RATE_PER_SEC", "0")),
+    burst=int(os.getenv("OPENROUTER_BURST", str(_max_concurrency))),
+    queue_timeout=float(os.getenv("OPENROUTER_QUEUE_TIMEOUT", "30")),
+)
+single_flight = SingleFlight()
+breaker = CircuitBreaker(
+    failure_threshold=int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5")),
+    reset_timeout=float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30")),
+)
+
+
+# Transport-level errors of the clients used to call OpenRouter
+_UPSTREAM_ERRORS = (
+    TimeoutError, ConnectionError,
+    requests.Timeout, requests.ConnectionError,
+    httpx.TransportError,
+    openai.APIConnectionError,
+)
+
+
+def is_upstream_failure(exc: BaseException) -> bool:
+    """True if `exc` says OpenRouter is unhealthy: a timeout, connection error, 429 or 5xx."""
+    if isinstance(exc, _UPSTREAM_ERRORS):
+        return True
+    # openai.APIStatusError has status_code; requests/httpx HTTP errors carry the response
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return isinstance(status, int) and (status == 429 or status >= 500)
+
+
+def prompt_key(namespace: str, *parts: Any) -> str:
+    """Stable coalescing key for a prompt built from `parts`."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\x1f")
+    return f"{namespace}:{digest.hexdigest()}"
+
+
+def call_openrouter(key: Optional[Hashable], fn: Callable[[], T]) -> T:
+    """Run an OpenRouter call coalesced on `key`, behind the breaker and limiter."""
+    def limited() -> T:
+        breaker.before_call()
+        with ExitStack() as stack:
+            try:
+                with span("upstream_queue_wait"):
+                    stack.enter_context(limiter.slot())
+            except UpstreamBusyError:
+                # Local saturation says nothing about upstream health
+                breaker.release_probe()
+                raise
+            try:
+                result = fn()
+            except Exception as e:
+                if is_upstream_failure(e):
+                    breaker.record_failure()
+                else:
+                    # OpenRouter answered (e.g. a 400) or the error is ours: no outage signal
+                    breaker.release_probe()
+                raise
+            breaker.record_success()
+            return result
+
+    if key is None:
+        return limited()
+    return single_flight.do(key, limited)
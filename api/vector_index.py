@@ -0,0 +1,219 @@
+"""
+FAISS index factory shared by the RAG store (api/main.py), the products
+index (api/products.py) and scripts/build_index.py. `PartitionedIndex`
+builds one index per metadata partition for filtered RAG search.
+
+Index types:
+    flat    exact brute-force L2 search (IndexFlatL2), the previous behaviour
+    hnsw    graph index (IndexHNSWFlat); recall/speed tuned by efSearch
+    ivfpq   inverted lists + product quantisation (IndexIVFPQ); compact,
+            tuned by nprobe. Needs enough vectors to train, otherwise the
+            factory falls back to flat.
+
+Environment (defaults in brackets):
+    VECTOR_INDEX_TYPE     flat | hnsw | ivfpq            [flat]
+    HNSW_M                graph degree                   [32]
+    HNSW_EF_CONSTRUCTION  build-time beam width          [200]
+    HNSW_EF_SEARCH        query-time beam width          [64]
+    IVF_NLIST             inverted lists, 0 = 4*sqrt(n)  [0]
+    IVF_NPROBE            lists scanned per query        [8]
+    PQ_M                  sub-quantisers (divides dim)   [16]
+    PQ_NBITS              bits per sub-quantiser code    [8]
+"""
+import os
+import math
+import logging
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("flat", "hnsw", "ivfpq")
+_BOOL_ALIASES = {"1": "true", "yes": "true", "0": "false", "no": "false"}
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+
+def default_params() -> dict:
+    return {
+        "hnsw_m": _env_int("HNSW_M", 32),
+        "ef_construction": _env_int("HNSW_EF_CONSTRUCTION", 200),
+        "ef_search": _env_int("HNSW_EF_SEARCH", 64),
+        "nlist": _env_int("IVF_NLIST", 0),
+        "nprobe": _env_int("IVF_NPROBE", 8),
+        "pq_m": _env_int("PQ_M", 16),
+        "pq_nbits": _env_int("PQ_NBITS", 8),
+    }
+
+
+def _largest_divisor_at_most(dim: int, m: int) -> int:
+    for candidate in range(min(m, dim), 0, -1):
+        if dim % candidate == 0:
+            return candidate
+    return 1
+
+
+def build_index(vectors: np.ndarray, index_type: Optional[str] = None, **overrides) -> faiss.Index:
+    """
+    Build and populate an index of `index_type` (default VECTOR_INDEX_TYPE)
+    from an (n, dim) float32 matrix. Keyword overrides take precedence over
+    the environment defaults in `default_params()`.
+    """
+    index_type = (index_type or os.getenv("VECTOR_INDEX_TYPE", "flat")).lower()
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {index_type!r}; expected one of {INDEX_TYPES}")
+    params = {**default_params(), **{k: v for k, v in overrides.items() if v is not None}}
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    n, dim = vectors.shape
+
+    if index_type == "ivfpq":
+        # k-means wants ~39 training points per list, PQ 2**nbits per codebook
+        nlist = min(params["nlist"] or int(4 * math.sqrt(n)), n // 39)
+        pq_m = _largest_divisor_at_most(dim, params["pq_m"])
+        if nlist < 1 or n < 2 ** params["pq_nbits"]:
+            logger.warning("Only %d vectors, too few to train IVF-PQ; using a flat index", n)
+            index_type = "flat"
+        else:
+            quantizer = faiss.IndexFlatL2(dim)
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, pq_m, params["pq_nbits"])
+            index.train(vectors)
+            index.add(vectors)
+            configure_search(index, nprobe=params["nprobe"])
+            return index
+
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, params["hnsw_m"])
+        index.hnsw.efConstruction = params["ef_construction"]
+        index.add(vectors)
+        configure_search(index, ef_search=params["ef_search"])
+        return index
+
+    index = faiss.IndexFlatL2(dim)
+    index.add(vectors)
+    return index
+
+
+def configure_search(index: faiss.Index, nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> faiss.Index:
+    """Apply query-time knobs to a built or loaded index (no-op for flat)."""
+    if nprobe is None:
+        nprobe = _env_int("IVF_NPROBE", 8)
+    if ef_search is None:
+        ef_search = _env_int("HNSW_EF_SEARCH", 64)
+    ivf = faiss.try_extract_index_ivf(index) if not isinstance(index, faiss.IndexFlat) else None
+    if ivf is not None:
+        ivf.nprobe = nprobe
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = ef_search
+    return index
+
+
+def index_kind(index: faiss.Index) -> str:
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivfpq"
+    return "flat"
+
+
+def index_memory_bytes(index: faiss.Index) -> int:
+    """Serialized size of the index, a close proxy for its resident memory."""
+    return int(faiss.serialize_index(index).nbytes)
+
+
+def filter_key(value) -> Optional[str]:
+    """Normalised form of a metadata or filter value, used for exact-match filtering."""
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value).strip().lower()
+
+
+def _search_params(index: faiss.Index, selector) -> faiss.SearchParameters:
+    """SearchParameters restricted to `selector`, keeping the index's nprobe/efSearch."""
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    ivf = faiss.try_extract_index_ivf(index) if not isinstance(index, faiss.IndexFlat) else None
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+    return faiss.SearchParameters(sel=selector)
+
+
+class PartitionedIndex:
+    """
+    One index (from `build_index`) per value of a partition field, e.g.
+    `source`, plus an inverted index over scalar metadata fields.
+
+    `search(vector, k, filters)` only touches the partitions named by the
+    filter and restricts those to the rows matching the remaining fields
+    with a FAISS ID selector. Results are positions in the `metadatas` list.
+    """
+
+    def __init__(self, vectors: np.ndarray, metadatas: List[dict], partition_key: str = "source",
+                 index_type: Optional[str] = None, **overrides):
+        vectors = np.ascontiguousarray(vectors, dtype="float32")
+        self.partition_key = partition_key
+        self.ntotal = len(metadatas)
+        # field -> normalised value -> sorted global positions
+        postings: Dict[str, Dict[str, List[int]]] = defaultdict(lambda: defaultdict(list))
+        for position, metadata in enumerate(metadatas):
+            for field, value in metadata.items():
+                if isinstance(value, (str, int, float, bool)) and len(str(value)) <= 200:
+                    postings[field][filter_key(value)].append(position)
+        self.postings = {field: {value: np.array(positions, dtype="int64") for value, positions in values.items()}
+                         for field, values in postings.items()}
+
+        # Each partition's index uses local ids 0..m-1; `_local` maps global -> local
+        self.partitions: Dict[str, Tuple[faiss.Index, np.ndarray]] = {}
+        self._local = np.empty(self.ntotal, dtype="int64")
+        for value, positions in self.postings.get(partition_key, {}).items():
+            self.partitions[value] = (build_index(vectors[positions], index_type, **overrides), positions)
+            self._local[positions] = np.arange(len(positions))
+
+    def matching(self, filters: Dict[str, object]) -> np.ndarray:
+        """Sorted global positions whose metadata matches every filter exactly."""
+        result = None
+        for field, value in filters.items():
+            values = self.postings.get(field, {})
+            key = filter_key(value)
+            if set(values) <= {"true", "false"}:
+                key = _BOOL_ALIASES.get(key, key)
+            positions = values.get(key, np.empty(0, dtype="int64"))
+            result = positions if result is None else np.intersect1d(result, positions, assume_unique=True)
+        return np.arange(self.ntotal) if result is None else result
+
+    def search(self, vector, k: int, filters: Optional[Dict[str, object]] = None) -> List[int]:
+        """Global positions of the `k` nearest vectors that satisfy `filters`."""
+        return self.search_many([vector], k, filters)[0]
+
+    def search_many(self, vectors, k: int, filters: Optional[Dict[str, object]] = None) -> List[List[int]]:
+        """`search` for many query vectors sharing `filters`: one FAISS call per partition."""
+        filters = dict(filters or {})
+        if self.partition_key in filters:
+            wanted = filter_key(filters.pop(self.partition_key))
+            partitions = [wanted] if wanted in self.partitions else []
+        else:
+            partitions = list(self.partitions)
+        allowed = self.matching(filters) if filters else None
+
+        queries = np.ascontiguousarray(vectors, dtype="float32").reshape(len(vectors), -1)
+        hits: List[List[Tuple[float, int]]] = [[] for _ in range(len(queries))]
+        for name in partitions:
+            index, positions = self.partitions[name]
+            params = None
+            if allowed is not None:
+                local = self._local[np.intersect1d(allowed, positions, assume_unique=True)]
+                if not len(local):
+                    continue
+                params = _search_params(index, faiss.IDSelectorBatch(local))
+            distances, ids = index.search(queries, min(k, index.ntotal), params=params)
+            for row, (row_distances, row_ids) in enumerate(zip(distances, ids)):
+                hits[row].extend((float(d), int(positions[i])) for d, i in zip(row_distances, row_ids) if i >= 0)
+        for row_hits in hits:
+            row_hits.sort()
+        return [[position for _, position in row_hits[:k]] for row_hits in hits]
@@ -0,0 +1,182 @@
+"""
+WebSocket chat channel (/ws/chat), served by app.py (ChatbotController with
+per-user memory) and api/main.py (the RAG pipeline behind static/js/chat.js).
+
+One socket carries a whole conversation, so a turn pays neither connection
+setup nor a session lookup. Frames are JSON text:
+
+    client  {"type": "message", "content": "..."}        one chat turn
+    server  {"type": "start", "id": n}                   turn n started
+    server  {"type": "delta", "id": n, "text": "..."}    partial response, in order
+    server  {"type": "done", "id": n, "response": "...", ...}   full response (+ e.g. sources)
+    server  {"type": "error", "id": n, "detail": "..."}  turn n failed, or was refused as busy
+    either  {"type": "ping"} / {"type": "pong"}          heartbeat; any frame counts as activity
+
+An idle socket costs one suspended receive coroutine. Turns run one at a
+time per socket, in order, on a worker task that exists only while turns
+are queued. A socket may queue WS_MAX_PENDING turns; further ones are
+refused with a "busy" error instead of buffering without bound. A frame the
+client doesn't read within WS_SEND_TIMEOUT closes the socket, so a stalled
+reader can't pin a turn. A single task per worker pings sockets idle for
+WS_HEARTBEAT_SECONDS and closes those silent for WS_IDLE_TIMEOUT.
+
+Environment (defaults in brackets):
+    WS_MAX_CONNECTIONS     open sockets per worker                    [10000]
+    WS_MAX_PENDING         queued turns per socket                    [4]
+    WS_HEARTBEAT_SECONDS   ping sockets idle this long                [25]
+    WS_IDLE_TIMEOUT        close sockets silent this long             [75]
+    WS_SEND_TIMEOUT        seconds a client has to accept a frame     [10]
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Optional, Set, Tuple, Union
+
+from fastapi import WebSocket
+from starlette.websockets import WebSocketDisconnect, WebSocketState
+
+from api.tracing import span
+
+WS_MAX_CONNECTIONS = int(os.getenv("WS_MAX_CONNECTIONS", "10000"))
+WS_MAX_PENDING = int(os.getenv("WS_MAX_PENDING", "4"))
+WS_HEARTBEAT_SECONDS = float(os.getenv("WS_HEARTBEAT_SECONDS", "25"))
+WS_IDLE_TIMEOUT = float(os.getenv("WS_IDLE_TIMEOUT", "75"))
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "10"))
+
+logger = logging.getLogger(__name__)
+
+# A turn's pipeline: yields response text chunks, and dicts of extra `done` fields
+Respond = Callable[[str], AsyncIterator[Union[str, Dict[str, Any]]]]
+
+
+class ChatConnection:
+    def __init__(self, websocket: WebSocket, respond: Respond):
+        self.websocket = websocket
+        self.respond = respond
+        self.pending: Deque[Tuple[int, str]] = deque()
+        self.worker: Optional[asyncio.Task] = None
+        self.last_seen = time.monotonic()
+        self.turns = 0
+        self._send_lock = asyncio.Lock()
+
+    async def send(self, frame: Dict[str, Any]):
+        async with self._send_lock:
+            await asyncio.wait_for(self.websocket.send_text(json.dumps(frame, ensure_ascii=False)), WS_SEND_TIMEOUT)
+
+    async def close(self, code: int, reason: str = ""):
+        if self.websocket.application_state == WebSocketState.CONNECTED:
+            try:
+                await self.websocket.close(code=code, reason=reason)
+            except RuntimeError:
+                pass
+
+    async def submit(self, content: str):
+        self.turns += 1
+        if not content.strip():
+            await self.send({"type": "error", "id": self.turns, "detail": "`content` must not be empty."})
+        elif len(self.pending) >= WS_MAX_PENDING:
+            await self.send({"type": "error", "id": self.turns, "detail": "busy"})
+        else:
+            self.pending.append((self.turns, content))
+            if self.worker is None or self.worker.done():
+                self.worker = asyncio.create_task(self._drain())
+
+    async def _drain(self):
+        try:
+            while self.pending:
+                turn, content = self.pending.popleft()
+                await self._run_turn(turn, content)
+        except (asyncio.TimeoutError, WebSocketDisconnect, RuntimeError) as e:
+            logger.info("Closing chat socket: %s", type(e).__name__)
+            await self.close(1008, "client not reading")
+
+    async def _run_turn(self, turn: int, content: str):
+        await self.send({"type": "start", "id": turn})
+        parts, extra = [], {}
+        try:
+            with span("ws_chat_turn"):
+                async for chunk in self.respond(content):
+                    if isinstance(chunk, dict):
+                        extra.update(chunk)
+                        continue
+                    parts.append(chunk)
+                    await self.send({"type": "delta", "id": turn, "text": chunk})
+        except (asyncio.TimeoutError, WebSocketDisconnect):
+            raise
+        except Exception as e:
+            logger.exception("Chat turn failed: %s: %s", type(e).__name__, e)
+            await self.send({"type": "error", "id": turn, "detail": f"{type(e).__name__}: {e}"})
+            return
+        await self.send({"type": "done", "id": turn, "response": "".join(parts), **extra})
+
+
+class ConnectionHub:
+    """Open sockets of this worker and the one heartbeat task that watches them."""
+
+    def __init__(self):
+        self.connections: Set[ChatConnection] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    def add(self, connection: ChatConnection):
+        self.connections.add(connection)
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._task = loop.create_task(self._heartbeat())
+
+    def discard(self, connection: ChatConnection):
+        self.connections.discard(connection)
+
+    async def _heartbeat(self):
+        while self.connections:
+            await asyncio.sleep(min(WS_HEARTBEAT_SECONDS, WS_IDLE_TIMEOUT) / 2)
+            now = time.monotonic()
+            actions = []
+            for connection in list(self.connections):
+                idle = now - connection.last_seen
+                if idle >= WS_IDLE_TIMEOUT:
+                    self.discard(connection)
+                    actions.append(connection.close(1001, "idle timeout"))
+                elif idle >= WS_HEARTBEAT_SECONDS and not connection.pending:
+                    actions.append(connection.send({"type": "ping"}))
+            # One slow socket must not hold up the others
+            await asyncio.gather(*actions, return_exceptions=True)
+
+
+hub = ConnectionHub()
+
+
+async def serve_chat(websocket: WebSocket, respond: Respond):
+    """Run one chat socket until the client goes away, answering turns with `respond`."""
+    if len(hub.connections) >= WS_MAX_CONNECTIONS:
+        # Try Again Later: this worker is full
+        await websocket.close(code=1013)
+        return
+    await websocket.accept()
+    connection = ChatConnection(websocket, respond)
+    hub.add(connection)
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            connection.last_seen = time.monotonic()
+            try:
+                frame = json.loads(message.get("text") or "")
+            except ValueError:
+                frame = None
+            kind = frame.get("type") if isinstance(frame, dict) else None
+            if kind == "message":
+                await connection.submit(str(frame.get("content") or ""))
+            elif kind == "ping":
+                await connection.send({"type": "pong"})
+            elif kind != "pong":
+                await connection.send({"type": "error", "detail": "Expected a JSON frame with type message, ping or pong."})
+    except (WebSocketDisconnect, asyncio.TimeoutError, RuntimeError):
+        pass
+    finally:
+        hub.discard(connection)
+        if connection.worker is not None:
+            connection.worker.cancel()
@@ -1,13 +1,34 @@
-from fastapi import FastAPI
+import logging
+
+from fastapi import FastAPI, WebSocket
 from pydantic import BaseModel
 
-from agent.memory import MemoryManager
+from agent.memory import MemoryStore
 from agent.controller import ChatbotController
+from api.outlets import router as outlets_router
+from api.admin import router as admin_router
+from api.logging_config import LOG_QUERIES, configure_logging, request_id_middleware
+from api.tracing import metrics_router, serialized, span, trace_requests
+from api.faq import lookup as faq_lookup
+from api.ws_chat import serve_chat
+
+configure_logging()
+logger = logging.getLogger(__name__)
 
 app = FastAPI()
 
-# Module‐level instances
-memory = MemoryManager()
+# Per-stage tracing, request IDs and the /metrics endpoint
+app.middleware("http")(trace_requests)
+app.middleware("http")(request_id_middleware)
+app.include_router(metrics_router)
+# /admin memory, CPU profile and cache diagnostics, only when ADMIN_TOKEN is set (api/admin.py)
+app.include_router(admin_router)
+
+# GET /outlets, called by OutletTool
+app.include_router(outlets_router)
+
+# Module‐level instances: conversation memory is kept per user
+memories = MemoryStore()
 controller = ChatbotController()
 
 # Define the request body schema
@@ -20,6 +41,45 @@ async def chat(msg: Message):
     """
     Handle incoming chat messages by delegating to the ChatbotController.
     """
-    # Call the controller's run method (async)
+    # Raw messages are logged only when opted in, for mining the FAQ table (scripts/build_faq.py)
+    if LOG_QUERIES:
+        logger.info("Chat message", extra={"query": msg.content})
+    # Record the message so the controller can read it back from memory
+    memory = memories.get(msg.user)
+    memory.add_user_message(msg.content)
+    # Frequent questions have a precomputed answer (api/faq.py); the turn stays in the history
+    with span("faq_lookup"):
+        hit = faq_lookup(msg.content)
+    if hit is not None:
+        memory.add_bot_message(hit["answer"])
+        return {"response": hit["answer"]}
+    # Call the controller's run method (async); its reply joins the history like an FAQ answer
     response = await controller.run(msg.user, memory)
-    return {"response": response}
\ No newline at end of file
+    memory.add_bot_message(response)
+    return serialized({"response": response})
+
+@app.websocket("/ws/chat")
+async def ws_chat(websocket: WebSocket, user: str = "anonymous"):
+    """
+    The /chat pipeline over one WebSocket per conversation (api/ws_chat.py).
+    The user's memory is looked up on the first turn and stays bound to the
+    socket, so idle sockets hold no memory.
+    """
+    memory = None
+
+    async def respond(content: str):
+        nonlocal memory
+        if memory is None:
+            memory = memories.get(user)
+        memory.add_user_message(content)
+        hit = faq_lookup(content)
+        if hit is not None:
+            memory.add_bot_message(hit["answer"])
+            yield hit["answer"]
+            yield {"sources": hit["sources"]}
+            return
+        response = await controller.run(user, memory)
+        memory.add_bot_message(response)
+        yield response
+
+    await serve_chat(websocket, respond)
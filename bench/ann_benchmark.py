@@ -0,0 +1,148 @@
+"""
+Compare FAISS index types for recall, latency and memory.
+
+For every configuration (flat, HNSW over an efSearch sweep, IVF-PQ over an
+nprobe sweep) reports build time, recall@k against exact flat search, p50/p95
+single-query latency and serialized index size, as JSON.
+
+The corpus is either the product CSV embedded with `fake_embedding`
+(default) or a synthetic clustered set, which is how to size the choice for
+catalogues much larger than the current one:
+
+    python -m bench.ann_benchmark
+    python -m bench.ann_benchmark --synthetic 100000 --dim 384 --queries 500 --k 10
+    python -m bench.ann_benchmark --synthetic 50000 --ef-search 16,64,256 --nprobe 1,8,32 --out ann.json
+"""
+import sys
+import csv
+import json
+import time
+import argparse
+from typing import List
+
+import numpy as np
+
+from api.vector_index import build_index, configure_search, index_kind, index_memory_bytes
+from bench.fake_openrouter import EMBEDDING_DIM, fake_embedding
+from bench.load_test import percentile
+
+
+def csv_corpus(csv_path: str, n_queries: int, seed: int):
+    """Product rows as the corpus; queries are product titles (paraphrase-ish)."""
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    corpus = np.array([fake_embedding(f"{r['title']} {r['content']}") for r in rows], dtype="float32")
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(rows), size=min(n_queries, len(rows)), replace=False)
+    queries = np.array([fake_embedding(rows[i]["title"]) for i in picks], dtype="float32")
+    return corpus, queries
+
+
+def synthetic_corpus(n: int, dim: int, n_queries: int, seed: int, n_clusters: int = 256):
+    """Gaussian blobs around random unit centres, roughly how text embeddings clump."""
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(n_clusters, dim)).astype("float32")
+    centres /= np.linalg.norm(centres, axis=1, keepdims=True)
+
+    def sample(count):
+        x = centres[rng.integers(0, n_clusters, size=count)] + rng.normal(scale=0.15, size=(count, dim)).astype("float32")
+        return (x / np.linalg.norm(x, axis=1, keepdims=True)).astype("float32")
+
+    return sample(n), sample(n_queries)
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    k = truth.shape[1]
+    hits = sum(len(set(f[f >= 0]) & set(t)) for f, t in zip(found, truth))
+    return hits / (k * len(truth))
+
+
+def measure(index, queries: np.ndarray, k: int, truth: np.ndarray) -> dict:
+    latencies: List[float] = []
+    found = np.empty((len(queries), k), dtype="int64")
+    for i, q in enumerate(queries):
+        start = time.perf_counter()
+        _, I = index.search(q[None, :], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        found[i] = I[0]
+    latencies.sort()
+    return {
+        f"recall@{k}": round(recall_at_k(found, truth), 4),
+        "p50_ms": round(percentile(latencies, 50), 4),
+        "p95_ms": round(percentile(latencies, 95), 4),
+    }
+
+
+def run(corpus: np.ndarray, queries: np.ndarray, k: int, ef_search: List[int], nprobe: List[int], **params) -> List[dict]:
+    results = []
+
+    def build(index_type):
+        start = time.perf_counter()
+        index = build_index(corpus, index_type, **params)
+        return index, round(time.perf_counter() - start, 3)
+
+    flat, build_s = build("flat")
+    _, truth = flat.search(queries, k)
+    results.append({"index": "flat", "build_s": build_s, "memory_bytes": index_memory_bytes(flat),
+                    **measure(flat, queries, k, truth)})
+
+    for index_type, knob, values in (("hnsw", "ef_search", ef_search), ("ivfpq", "nprobe", nprobe)):
+        index, build_s = build(index_type)
+        if index_kind(index) != index_type:
+            print(f"{index_type}: corpus too small, skipped", file=sys.stderr)
+            continue
+        memory = index_memory_bytes(index)
+        for value in values:
+            configure_search(index, **{knob: value})
+            results.append({"index": index_type, knob: value, "build_s": build_s, "memory_bytes": memory,
+                            **measure(index, queries, k, truth)})
+
+    for r in results:
+        knob = f" {'efSearch' if 'ef_search' in r else 'nprobe'}={r.get('ef_search', r.get('nprobe'))}" \
+            if r["index"] != "flat" else ""
+        print(f"{r['index'] + knob:>18}  recall@{k}={r[f'recall@{k}']:<6} p50={r['p50_ms']}ms "
+              f"p95={r['p95_ms']}ms mem={r['memory_bytes'] / 1024:.0f}KiB build={r['build_s']}s",
+              file=sys.stderr)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark FAISS index types against exact search.")
+    parser.add_argument("--csv", default="data/zus_drinkware.csv")
+    parser.add_argument("--synthetic", type=int, default=0, help="Use N synthetic vectors instead of the CSV")
+    parser.add_argument("--dim", type=int, default=EMBEDDING_DIM)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--ef-search", default="16,32,64,128", help="Comma list of HNSW efSearch values")
+    parser.add_argument("--nprobe", default="1,4,8,16,32", help="Comma list of IVF nprobe values")
+    parser.add_argument("--nlist", type=int)
+    parser.add_argument("--pq-m", type=int)
+    parser.add_argument("--hnsw-m", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        corpus, queries = synthetic_corpus(args.synthetic, args.dim, args.queries, args.seed)
+    else:
+        corpus, queries = csv_corpus(args.csv, args.queries, args.seed)
+
+    report = {
+        "config": {"vectors": len(corpus), "dim": corpus.shape[1], "queries": len(queries), "k": args.k},
+        "results": run(
+            corpus, queries, args.k,
+            ef_search=[int(v) for v in args.ef_search.split(",")],
+            nprobe=[int(v) for v in args.nprobe.split(",")],
+            nlist=args.nlist, pq_m=args.pq_m, hnsw_m=args.hnsw_m,
+        ),
+    }
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
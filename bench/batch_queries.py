@@ -0,0 +1,126 @@
+"""
+Offline throughput of the NDJSON batch endpoints (api/batch.py).
+
+Answers the same --count questions (a mix of repeated and distinct ones, as
+in an FAQ or QA-regression run) two ways, in-process against the fake
+OpenRouter server: one POST /rag/query (or GET /products/qa) per question
+in a loop, and one POST /rag/query/batch (or /products/qa/batch) request.
+Reports wall time, questions per second and upstream calls for each.
+
+Usage:
+    python -m bench.batch_queries
+    python -m bench.batch_queries --count 500 --llm-latency-ms 200 --embedding-latency-ms 50
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+from typing import Dict, List
+
+from bench.fake_openrouter import FakeOpenRouter
+from bench.load_test import SAMPLE_QUESTIONS, build_products_index
+
+
+def questions(count: int) -> List[str]:
+    """Every third question repeats a sample one; the rest are distinct."""
+    return [
+        SAMPLE_QUESTIONS[i % len(SAMPLE_QUESTIONS)] if i % 3 == 0
+        else f"{SAMPLE_QUESTIONS[i % len(SAMPLE_QUESTIONS)]} (variant {i})"
+        for i in range(count)
+    ]
+
+
+def run(server, client, name: str, fn) -> Dict[str, object]:
+    server.calls.clear()
+    start = time.perf_counter()
+    answered, errors = fn(client)
+    elapsed = time.perf_counter() - start
+    result = {
+        "seconds": round(elapsed, 3),
+        "questions_per_sec": round(answered / elapsed, 1),
+        "errors": errors,
+        "upstream_calls": dict(server.calls),
+    }
+    print(f"{name:>20} {result['seconds']:>8}s {result['questions_per_sec']:>8} q/s  "
+          f"calls={result['upstream_calls']} err={errors}", file=sys.stderr)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the batch query endpoints.")
+    parser.add_argument("--count", type=int, default=200, help="Questions per run")
+    parser.add_argument("--llm-latency-ms", type=float, default=100.0)
+    parser.add_argument("--embedding-latency-ms", type=float, default=20.0)
+    parser.add_argument("--max-concurrency", type=int, help="Batch answer concurrency (default BATCH_MAX_CONCURRENCY)")
+    parser.add_argument("--out", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    queries = questions(args.count)
+    report: Dict[str, object] = {"count": args.count, "distinct": len(set(queries)),
+                                 "llm_latency_ms": args.llm_latency_ms,
+                                 "embedding_latency_ms": args.embedding_latency_ms}
+
+    with FakeOpenRouter(latency_ms=args.llm_latency_ms, embedding_latency_ms=args.embedding_latency_ms) as server, \
+            tempfile.TemporaryDirectory() as workdir:
+        os.environ["OPENROUTER_API_KEY"] = os.getenv("OPENROUTER_API_KEY") or "bench-key"
+        os.environ["OPENROUTER_API_BASE"] = server.base_url
+        os.environ["RENDER"] = "1"  # embed via the fake server
+        os.environ.setdefault("LOG_LEVEL", "WARNING")
+        build_products_index(workdir)
+
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+        import api.main as rag_module
+        from api import products
+
+        products_app = FastAPI()
+        products_app.include_router(products.router)
+        rag_client, products_client = TestClient(rag_module.app), TestClient(products_app)
+        # Build the RAG index and load the products index outside the measurement
+        rag_client.post("/rag/query", json={"query": "warm up"})
+        products_client.get("/products/qa", params={"query": "warm up"})
+
+        def single(path: str, method: str):
+            def fn(client):
+                errors = 0
+                for query in queries:
+                    if method == "GET":
+                        response = client.get(path, params={"query": query})
+                    else:
+                        response = client.post(path, json={"query": query})
+                    errors += response.status_code != 200
+                return len(queries), errors
+            return fn
+
+        def batch(path: str, body: Dict[str, object]):
+            def fn(client):
+                lines = [json.loads(line) for line in client.post(path, json=body).text.splitlines()]
+                return len(lines), sum("error" in line for line in lines) + len(queries) - len(lines)
+            return fn
+
+        rag_batch = {"queries": [{"query": q} for q in queries], "max_concurrency": args.max_concurrency}
+        products_batch = {"queries": queries, "max_concurrency": args.max_concurrency}
+        report["rag"] = {
+            "single": run(server, rag_client, "rag single", single("/rag/query", "POST")),
+            "batch": run(server, rag_client, "rag batch", batch("/rag/query/batch", rag_batch)),
+        }
+        report["products"] = {
+            "single": run(server, products_client, "products single", single("/products/qa", "GET")),
+            "batch": run(server, products_client, "products batch", batch("/products/qa/batch", products_batch)),
+        }
+    for endpoint in ("rag", "products"):
+        report[endpoint]["speedup"] = round(
+            report[endpoint]["single"]["seconds"] / max(report[endpoint]["batch"]["seconds"], 1e-9), 1)
+
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
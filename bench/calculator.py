@@ -0,0 +1,90 @@
+"""
+Calculator engine throughput (api/calc_engine.py).
+
+Evaluates --count generated same-shape expressions one at a time
+(`evaluate`, as GET /calculate does) and as one batch (`evaluate_many`, as
+POST /calculate/batch does), cold (cache cleared) and warm. It also times
+a few hostile inputs, which must be rejected quickly.
+
+Usage:
+    python -m bench.calculator
+    python -m bench.calculator --count 2000 --out calculator.json
+"""
+import sys
+import json
+import time
+import random
+import argparse
+from typing import Callable, Dict, List
+
+from api import calc_engine
+from api.calc_engine import CalculationError, compile_expression, evaluate, evaluate_many
+
+HOSTILE = {
+    "tower": "9**9**9",
+    "huge_power": "2**100000000",
+    "deep_unary": "-" * 400 + "1",
+    "many_terms": "+".join(["1"] * 240),
+}
+
+
+def one_by_one(expressions: List[str]):
+    for expression in expressions:
+        try:
+            evaluate(expression)
+        except CalculationError:
+            pass
+
+
+def timed(fn: Callable[[], object], repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return round(best * 1000, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the calculator engine.")
+    parser.add_argument("--count", type=int, default=1000, help="Expressions per batch")
+    parser.add_argument("--out", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    expressions = [
+        f"{rng.randint(1, 500)} * (1 + {rng.randint(1, 99)} / 100) - {rng.randint(0, 50)} ** 2"
+        for _ in range(args.count)
+    ]
+    report: Dict[str, object] = {"count": args.count}
+    for name, fn in (("one_by_one", one_by_one), ("batch", evaluate_many)):
+        cold = timed(lambda: (compile_expression.cache_clear(), fn(expressions)))
+        warm = timed(lambda: fn(expressions))
+        report[name] = {"cold_ms": cold, "warm_ms": warm}
+        print(f"{name:>10}: {report[name]}", file=sys.stderr)
+    report["warm_speedup"] = round(report["one_by_one"]["warm_ms"] / report["batch"]["warm_ms"], 2)
+
+    report["hostile"] = {}
+    for name, expression in HOSTILE.items():
+        try:
+            evaluate(expression)
+            outcome = "evaluated"
+        except CalculationError as e:
+            outcome = str(e)
+        report["hostile"][name] = {"ms": timed(lambda: one_by_one([expression])), "outcome": outcome}
+    report["limits"] = {
+        "max_length": calc_engine.CALC_MAX_LENGTH, "max_nodes": calc_engine.CALC_MAX_NODES,
+        "max_depth": calc_engine.CALC_MAX_DEPTH, "max_magnitude": calc_engine.CALC_MAX_MAGNITUDE,
+        "time_limit_ms": calc_engine.CALC_TIME_LIMIT_MS,
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
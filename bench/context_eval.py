@@ -0,0 +1,110 @@
+"""
+Prompt-context evaluation: tokens spent vs grounding, before and after reranking.
+
+For each labelled query in bench/context_eval_queries.json the first stage
+mirrors api/main.retrieve: BM25 and flat FAISS rankings merged with RRF.
+The vectors come from `fake_embedding`, so the script runs offline. Two
+contexts are compared:
+
+    baseline   the top-k retrieved documents in full (the previous prompt)
+    reranked   RERANK_CANDIDATES documents through select_context (reranker +
+               token budget + field truncation), as /rag/query does now
+
+and for each it reports the context tokens per answer (mean / p95), the
+recall of the labelled documents, the hit rate and the MRR.
+
+Usage:
+    python -m bench.context_eval
+    CONTEXT_TOKEN_BUDGET=400 python -m bench.context_eval --k 5 --out context.json
+    RERANK_MODEL=cross-encoder/ms-marco-MiniLM-L-6-v2 python -m bench.context_eval
+"""
+import sys
+import json
+import argparse
+from typing import Dict, List
+
+import numpy as np
+
+from api.context import count_tokens, select_context
+from api.documents import load_source_documents
+from api.keyword_index import HYBRID_CANDIDATES, BM25Index, reciprocal_rank_fusion
+from api.rerank import RERANK_CANDIDATES, load_cross_encoder
+from api.vector_index import build_index
+from bench.fake_openrouter import fake_embedding
+from bench.load_test import percentile
+
+QUERIES_PATH = "bench/context_eval_queries.json"
+
+
+def first_stage(query: str, keyword_index: BM25Index, vector_index, k: int) -> List[int]:
+    keyword_ranking = [i for i, _ in keyword_index.search(query, HYBRID_CANDIDATES)]
+    _, ids = vector_index.search(np.array([fake_embedding(query)], dtype="float32"), HYBRID_CANDIDATES)
+    vector_ranking = [int(i) for i in ids[0] if i >= 0]
+    return reciprocal_rank_fusion([vector_ranking, keyword_ranking], k=k)
+
+
+def score(contexts: List[List[str]], tokens: List[int], labels: List[List[str]]) -> Dict[str, float]:
+    recalls, hits, reciprocal_ranks = [], [], []
+    for ids, relevant in zip(contexts, labels):
+        found = [i for i in ids if i in relevant]
+        recalls.append(len(set(found)) / len(relevant))
+        hits.append(1.0 if found else 0.0)
+        first = next((rank for rank, i in enumerate(ids, 1) if i in relevant), None)
+        reciprocal_ranks.append(1.0 / first if first else 0.0)
+    return {
+        "context_tokens_mean": round(float(np.mean(tokens)), 1),
+        "context_tokens_p95": round(percentile(sorted(tokens), 95), 1),
+        "passages_mean": round(float(np.mean([len(c) for c in contexts])), 2),
+        "recall": round(float(np.mean(recalls)), 3),
+        "hit_rate": round(float(np.mean(hits)), 3),
+        "mrr": round(float(np.mean(reciprocal_ranks)), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate prompt context size vs grounding.")
+    parser.add_argument("--queries", default=QUERIES_PATH)
+    parser.add_argument("--k", type=int, default=4, help="Documents in the baseline context (the old retrieve k)")
+    parser.add_argument("--out", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+    load_cross_encoder()  # requests only use it once loaded; the eval waits for it
+
+    with open(args.queries, encoding="utf-8") as f:
+        labelled = json.load(f)
+    documents = load_source_documents("drinkware")
+    texts = [d.page_content for d in documents]
+    keyword_index = BM25Index(texts)
+    vector_index = build_index(np.array([fake_embedding(t) for t in texts], dtype="float32"), "flat")
+
+    labels = [item["relevant"] for item in labelled]
+    baseline, baseline_tokens, reranked, reranked_tokens = [], [], [], []
+    for item in labelled:
+        query = item["query"]
+        top = first_stage(query, keyword_index, vector_index, args.k)
+        baseline.append([documents[i].metadata["id"] for i in top])
+        baseline_tokens.append(sum(count_tokens(texts[i]) for i in top))
+
+        candidates = first_stage(query, keyword_index, vector_index, RERANK_CANDIDATES)
+        context = select_context(query, [texts[i] for i in candidates])
+        reranked.append([documents[candidates[i]].metadata["id"] for i, _ in context])
+        reranked_tokens.append(sum(count_tokens(text) for _, text in context))
+
+    report = {
+        "queries": len(labelled),
+        "baseline": score(baseline, baseline_tokens, labels),
+        "reranked": score(reranked, reranked_tokens, labels),
+    }
+    report["token_reduction"] = round(
+        1 - report["reranked"]["context_tokens_mean"] / report["baseline"]["context_tokens_mean"], 3)
+    for name in ("baseline", "reranked"):
+        print(f"{name:>9}: {report[name]}", file=sys.stderr)
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
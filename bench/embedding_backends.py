@@ -0,0 +1,125 @@
+"""
+Compare local query-embedding backends: memory, load time, latency, agreement.
+
+Each backend is loaded in a fresh subprocess so its resident memory can be
+measured on its own (peak RSS after load and one batch, minus the
+interpreter's). The report covers:
+
+    load_seconds       import + model load
+    rss_mb             peak resident memory attributable to the backend
+    query_ms_p50/p95   single embed_query latency
+    batch_per_sec      embed_documents throughput over the product texts
+    cosine_vs_first    mean cosine to the first backend listed (quantisation drift)
+
+Usage:
+    python -m bench.embedding_backends                         # onnx,huggingface
+    python -m bench.embedding_backends --backends onnx --out embeddings.json
+"""
+import sys
+import json
+import time
+import argparse
+import resource
+import subprocess
+
+import numpy as np
+
+from bench.load_test import percentile
+
+QUERIES = [
+    "Which tumbler keeps drinks cold?",
+    "OG Cup screw-on lid",
+    "ceramic mug with a handle",
+    "stainless steel mug for outdoors",
+]
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def load_backend(name: str):
+    if name == "onnx":
+        from api.onnx_embeddings import OnnxEmbeddings
+        return OnnxEmbeddings()
+    if name == "huggingface":
+        from langchain_huggingface import HuggingFaceEmbeddings
+        return HuggingFaceEmbeddings(
+            model_name="sentence-transformers/all-MiniLM-L6-v2",
+            model_kwargs={"device": "cpu"},
+            encode_kwargs={"normalize_embeddings": True},
+        )
+    raise ValueError(f"Unknown backend {name!r}")
+
+
+def measure(name: str) -> dict:
+    """Runs inside the subprocess."""
+    from api.documents import load_source_documents
+
+    texts = [d.page_content for d in load_source_documents("drinkware")]
+    baseline_rss = _peak_rss_mb()
+    start = time.perf_counter()
+    embeddings = load_backend(name)
+    load_seconds = time.perf_counter() - start
+
+    embeddings.embed_query(QUERIES[0])  # warm-up
+    latencies = []
+    for _ in range(5):
+        for query in QUERIES:
+            start = time.perf_counter()
+            embeddings.embed_query(query)
+            latencies.append((time.perf_counter() - start) * 1000)
+    start = time.perf_counter()
+    vectors = embeddings.embed_documents(texts)
+    batch_seconds = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "load_seconds": round(load_seconds, 2),
+        "rss_mb": round(_peak_rss_mb() - baseline_rss, 1),
+        "query_ms_p50": round(percentile(latencies, 50), 2),
+        "query_ms_p95": round(percentile(latencies, 95), 2),
+        "batch_per_sec": round(len(texts) / batch_seconds, 1),
+        "dim": len(vectors[0]),
+        "vectors": [embeddings.embed_query(q) for q in QUERIES],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare local embedding backends.")
+    parser.add_argument("--backends", default="onnx,huggingface")
+    parser.add_argument("--measure", help=argparse.SUPPRESS)
+    parser.add_argument("--out", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.measure)))
+        return
+
+    report, reference = {}, None
+    for name in args.backends.split(","):
+        proc = subprocess.run([sys.executable, "-m", "bench.embedding_backends", "--measure", name],
+                              capture_output=True, text=True)
+        if proc.returncode != 0:
+            report[name] = {"error": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "failed"}
+            print(f"{name:>12}: {report[name]['error']}", file=sys.stderr)
+            continue
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        vectors = np.array(result.pop("vectors"))
+        if reference is None:
+            reference = vectors
+        elif reference.shape == vectors.shape:
+            result["cosine_vs_first"] = round(float((reference * vectors).sum(axis=1).mean()), 4)
+        report[name] = result
+        print(f"{name:>12}: {result}", file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
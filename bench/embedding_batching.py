@@ -0,0 +1,114 @@
+"""
+Query-embedding throughput with and without micro-batching (api/microbatch.py).
+
+Fires --requests single-query embeddings from a thread pool at each
+concurrency level. It compares one call per query (the previous
+behaviour) with `BatchedEmbeddings`, and reports throughput, p50/p95
+latency and upstream calls per level.
+
+Backends:
+    openrouter  OpenAIEmbeddings against bench/fake_openrouter.py, with
+                --embedding-latency-ms per call standing in for the network
+                round trip; calls go through call_openrouter as in the app
+    onnx        the local int8 model (python -m scripts.export_onnx_embeddings)
+
+Usage:
+    python -m bench.embedding_batching
+    python -m bench.embedding_batching --backend onnx --concurrency 1,16,64
+    python -m bench.embedding_batching --embedding-latency-ms 80 --out batching.json
+"""
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+from api.microbatch import EMBED_MAX_INFLIGHT, BatchedEmbeddings
+from api.upstream import call_openrouter, prompt_key
+from bench.fake_openrouter import FakeOpenRouter
+from bench.load_test import percentile
+
+QUERIES = [
+    "Which tumbler keeps drinks cold?", "OG Cup screw-on lid", "ceramic mug with a handle",
+    "stainless steel mug", "Frozee cold cup colours", "All Day Cup collections", "tote bag",
+    "glass food container", "Kopi Patah Hati", "fridge magnets",
+]
+
+
+def run_level(embed: Callable[[str], List[float]], concurrency: int, requests: int) -> Dict[str, float]:
+    latencies: List[float] = []
+
+    def one(i: int):
+        # A counter suffix keeps texts distinct, so results measure batching, not de-duplication
+        start = time.perf_counter()
+        embed(f"{QUERIES[i % len(QUERIES)]} #{i}")
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "rps": round(requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark micro-batched query embeddings.")
+    parser.add_argument("--backend", choices=["openrouter", "onnx"], default="openrouter")
+    parser.add_argument("--concurrency", default="1,8,32,64")
+    parser.add_argument("--requests", type=int, default=256, help="Queries per concurrency level")
+    parser.add_argument("--embedding-latency-ms", type=float, default=50.0)
+    parser.add_argument("--out", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    server = None
+    if args.backend == "openrouter":
+        from langchain_openai import OpenAIEmbeddings
+
+        server = FakeOpenRouter(embedding_latency_ms=args.embedding_latency_ms).start()
+        base = OpenAIEmbeddings(api_key="bench", base_url=server.base_url, check_embedding_ctx_length=False)
+        unbatched = lambda text: call_openrouter(prompt_key("embed", text), lambda: base.embed_query(text))
+        batched = BatchedEmbeddings(
+            base, guard=lambda texts, call: call_openrouter(prompt_key("embed", *texts), call),
+            max_inflight=EMBED_MAX_INFLIGHT,
+        )
+        upstream_calls = lambda: server.calls["embeddings"]
+    else:
+        from api.onnx_embeddings import OnnxEmbeddings
+
+        base = OnnxEmbeddings()
+        unbatched = base.embed_query
+        batched = BatchedEmbeddings(base, max_wait_ms=0)  # as in api/main.get_rag_chain
+        upstream_calls = None
+
+    report = {"backend": args.backend, "levels": {}}
+    try:
+        for concurrency in [int(c) for c in args.concurrency.split(",")]:
+            level = {}
+            for name, embed in (("unbatched", unbatched), ("batched", batched.embed_query)):
+                before = upstream_calls() if upstream_calls else None
+                level[name] = run_level(embed, concurrency, args.requests)
+                if upstream_calls:
+                    level[name]["upstream_calls"] = upstream_calls() - before
+                print(f"c={concurrency:<4} {name:>9}: {level[name]}", file=sys.stderr)
+            level["speedup"] = round(level["batched"]["rps"] / level["unbatched"]["rps"], 2)
+            report["levels"][concurrency] = level
+    finally:
+        if server is not None:
+            server.stop()
+
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""
+Local stand-in for the OpenRouter API, used by the benchmark harness.
+
+Serves the three endpoints the app talks to:
+    GET  /api/v1/models
+    POST /api/v1/chat/completions   canned completion after a configurable delay
+    POST /api/v1/embeddings         deterministic hashed bag-of-words vectors
+
+The completion is shaped by the prompt: intent-parser prompts get intent JSON,
+SQL prompts get a SELECT, everything else gets a short answer. `GET /stats`
+returns call counts so runs can check how many upstream calls were made.
+
+Usage:
+    python -m bench.fake_openrouter --port 9100 --latency-ms 300 --jitter-ms 50
+"""
+import re
+import json
+import time
+import random
+import socket
+import asyncio
+import argparse
+import threading
+import zlib
+from collections import Counter
+from typing import List, Union
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+
+EMBEDDING_DIM = 384
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def fake_embedding(text: str, dim: int = EMBEDDING_DIM) -> List[float]:
+    """
+    Deterministic, L2-normalised embedding: hashed word unigrams plus
+    character trigrams. Texts sharing words land close together, which is
+    enough for retrieval benchmarks to be meaningful.
+    """
+    vec = np.zeros(dim, dtype=np.float32)
+    words = _TOKEN_RE.findall(text.lower())
+    for word in words:
+        vec[zlib.crc32(word.encode()) % dim] += 1.0
+        padded = f"#{word}#"
+        for i in range(len(padded) - 2):
+            vec[zlib.crc32(padded[i:i + 3].encode()) % dim] += 0.25
+    norm = np.linalg.norm(vec)
+    if norm == 0:
+        vec[0] = 1.0
+        norm = 1.0
+    return (vec / norm).tolist()
+
+
+def _intent_for(user_input: str) -> dict:
+    text = user_input.lower()
+    if re.search(r"\d\s*[-+*/]\s*\d", text):
+        expr = re.sub(r"[^0-9+\-*/(). ]", "", user_input).strip()
+        return {"intent": "calculate", "slots": {"expression": expr}}
+    if "hour" in text or "open" in text:
+        return {"intent": "get_opening_hours", "slots": {"outlet": "SS2"}}
+    if "outlet" in text or "where" in text:
+        return {"intent": "find_outlet", "slots": {"location": "Petaling Jaya"}}
+    if text.strip(" !.") in ("hi", "hello", "hey"):
+        return {"intent": "greeting", "slots": {}}
+    return {"intent": "unknown", "slots": {}}
+
+
+def _completion_for(messages: list) -> str:
+    prompt = "\n".join(str(m.get("content", "")) for m in messages)
+    if "extracts structured intent" in prompt:
+        # The question is the last user message; the earlier ones are few-shot examples
+        users = [str(m.get("content", "")) for m in messages if m.get("role") == "user"]
+        return json.dumps(_intent_for(users[-1] if users else ""))
+    if "SQL" in prompt or "SELECT" in prompt:
+        return "SELECT id, name, location, opening_time, closing_time FROM outlets LIMIT 5"
+    return "Stub answer from the fake OpenRouter server."
+
+
+def create_app(latency_ms: float = 0.0, jitter_ms: float = 0.0, embedding_dim: int = EMBEDDING_DIM,
+               embedding_latency_ms: float = 0.0) -> FastAPI:
+    app = FastAPI()
+    app.state.calls = Counter()
+
+    async def _delay():
+        delay = latency_ms + random.uniform(-jitter_ms, jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+
+    @app.get("/api/v1/models")
+    async def models():
+        app.state.calls["models"] += 1
+        return {"data": [{"id": "meta-llama/llama-3.3-70b-instruct"}, {"id": "meta-llama/llama-3-70b-instruct"}]}
+
+    @app.post("/api/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.calls["chat_completions"] += 1
+        await _delay()
+        content = _completion_for(body.get("messages", []))
+        prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in body.get("messages", []))
+        completion_tokens = len(content.split())
+        return {
+            "id": f"fake-{time.time_ns()}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    @app.post("/api/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        app.state.calls["embeddings"] += 1
+        if embedding_latency_ms > 0:
+            # Per call, not per input: models the network round trip batching saves
+            await asyncio.sleep(embedding_latency_ms / 1000)
+        raw: Union[str, list] = body.get("input", "")
+        # Accept a string, a list of strings, or (tiktoken) lists of token ids
+        if isinstance(raw, str) or (raw and isinstance(raw[0], int)):
+            raw = [raw]
+        texts = [" ".join(f"t{t}" for t in item) if isinstance(item, list) else str(item) for item in raw]
+        data = [{"object": "embedding", "index": i, "embedding": fake_embedding(t, embedding_dim)}
+                for i, t in enumerate(texts)]
+        return {"object": "list", "data": data, "model": body.get("model", "fake"),
+                "usage": {"prompt_tokens": 0, "total_tokens": 0}}
+
+    @app.get("/stats")
+    async def stats():
+        return dict(app.state.calls)
+
+    @app.post("/stats/reset")
+    async def reset_stats():
+        app.state.calls.clear()
+        return {}
+
+    return app
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class FakeOpenRouter:
+    """Run the fake server on a background thread: `with FakeOpenRouter() as srv: srv.base_url`."""
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 embedding_dim: int = EMBEDDING_DIM, port: int = 0, embedding_latency_ms: float = 0.0):
+        self.app = create_app(latency_ms, jitter_ms, embedding_dim, embedding_latency_ms)
+        self.port = port or free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}/api/v1"
+        config = uvicorn.Config(self.app, host="127.0.0.1", port=self.port, log_level="warning")
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+
+    @property
+    def calls(self) -> Counter:
+        return self.app.state.calls
+
+    def start(self):
+        self._thread.start()
+        deadline = time.time() + 10
+        while not self._server.started:
+            if time.time() > deadline:
+                raise RuntimeError("Fake OpenRouter server did not start")
+            time.sleep(0.01)
+        return self
+
+    def stop(self):
+        self._server.should_exit = True
+        self._thread.join(timeout=5)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local fake OpenRouter server.")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--embedding-dim", type=int, default=EMBEDDING_DIM)
+    parser.add_argument("--embedding-latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+    app = create_app(args.latency_ms, args.jitter_ms, args.embedding_dim, args.embedding_latency_ms)
+    uvicorn.run(app, host="127.0.0.1", port=args.port)
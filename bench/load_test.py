@@ -0,0 +1,225 @@
+"""
+Concurrency benchmark for the real FastAPI apps against a fake OpenRouter.
+
+Starts `bench.fake_openrouter` on a local port, points the app at it via
+OPENROUTER_API_BASE, builds a throwaway products index with the same
+deterministic embeddings, then drives each endpoint in-process (ASGI) at
+increasing concurrency. Reports throughput, latency percentiles and error
+rate per endpoint and concurrency level as JSON.
+
+Usage:
+    python -m bench.load_test --concurrency 1,8,32 --requests 200 --out bench_results.json
+    python -m bench.load_test --baseline bench_results.json --max-regression 0.2
+
+With --baseline the run exits non-zero if any endpoint's p95 latency or
+throughput regresses by more than --max-regression (relative).
+"""
+import os
+import csv
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+from statistics import mean
+from typing import Dict, List
+
+import numpy as np
+
+from bench.fake_openrouter import EMBEDDING_DIM, FakeOpenRouter, fake_embedding
+
+ENDPOINTS = ("chat", "rag", "products", "calculate")
+
+SAMPLE_QUESTIONS = [
+    "What drinkware products are available?",
+    "Tell me about the OG cup",
+    "Which tumbler keeps drinks cold?",
+    "Where is the outlet in Petaling Jaya?",
+    "What are the opening hours for SS2?",
+    "Do you sell a 600ml tumbler?",
+]
+SAMPLE_EXPRESSIONS = ["2+2*3", "(1+2)*(3+4)/5", "-7 + 3**2", "100/8 - 3"]
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * (len(sorted_values) - 1)))))
+    return sorted_values[idx]
+
+
+def build_products_index(workdir: str, csv_path: str = "data/zus_drinkware.csv") -> None:
+    """Write a products FAISS index + metadata embedded with `fake_embedding`."""
+    import faiss
+
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    meta = [{"id": r["id"], "title": r["title"], "description": r["content"]} for r in rows]
+    vectors = np.array([fake_embedding(f"{m['title']} {m['description']}") for m in meta], dtype="float32")
+    index = faiss.IndexFlatL2(EMBEDDING_DIM)
+    index.add(vectors)
+    index_path = os.path.join(workdir, "products.index")
+    meta_path = os.path.join(workdir, "products.json")
+    faiss.write_index(index, index_path)
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.environ["PRODUCTS_INDEX_PATH"] = index_path
+    os.environ["PRODUCTS_META_PATH"] = meta_path
+
+
+def load_apps() -> Dict[str, tuple]:
+    """Import the real apps (after env is pointed at the fake server)."""
+    from fastapi import FastAPI
+
+    import app as chat_module
+    import api.main as rag_module
+    from api import calculator, products
+
+    products_app = FastAPI()
+    products_app.include_router(products.router)
+    calculator_app = FastAPI()
+    calculator_app.include_router(calculator.router)
+
+    def chat_request(i):
+        question = SAMPLE_QUESTIONS[i % len(SAMPLE_QUESTIONS)]
+        return "POST", "/chat", {"json": {"user": f"user{i % 50}", "content": question}}
+
+    def rag_request(i):
+        return "POST", "/rag/query", {"json": {"query": SAMPLE_QUESTIONS[i % len(SAMPLE_QUESTIONS)]}}
+
+    def products_request(i):
+        return "GET", "/products/qa", {"params": {"query": SAMPLE_QUESTIONS[i % len(SAMPLE_QUESTIONS)]}}
+
+    def calculate_request(i):
+        return "GET", "/calculate", {"params": {"expression": SAMPLE_EXPRESSIONS[i % len(SAMPLE_EXPRESSIONS)]}}
+
+    return {
+        "chat": (chat_module.app, chat_request),
+        "rag": (rag_module.app, rag_request),
+        "products": (products_app, products_request),
+        "calculate": (calculator_app, calculate_request),
+    }
+
+
+async def run_level(app, make_request, concurrency: int, total: int) -> dict:
+    """Fire `total` requests with at most `concurrency` in flight."""
+    import httpx
+
+    latencies: List[float] = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        async def one(i):
+            nonlocal errors
+            method, url, kwargs = make_request(i)
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    resp = await client.request(method, url, **kwargs)
+                    if resp.status_code >= 400:
+                        errors += 1
+                except Exception:
+                    errors += 1
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        wall_start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        wall = time.perf_counter() - wall_start
+
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "throughput_rps": round(total / wall, 2) if wall else 0.0,
+        "mean_ms": round(mean(latencies), 2) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "error_rate": round(errors / total, 4) if total else 0.0,
+    }
+
+
+def compare(results: dict, baseline: dict, max_regression: float) -> List[str]:
+    """Return a list of human-readable regressions versus a previous run."""
+    problems = []
+    for endpoint, levels in results["endpoints"].items():
+        base_levels = {lvl["concurrency"]: lvl for lvl in baseline.get("endpoints", {}).get(endpoint, [])}
+        for lvl in levels:
+            base = base_levels.get(lvl["concurrency"])
+            if not base:
+                continue
+            if base["p95_ms"] and lvl["p95_ms"] > base["p95_ms"] * (1 + max_regression):
+                problems.append(f"{endpoint}@{lvl['concurrency']}: p95 {base['p95_ms']} -> {lvl['p95_ms']} ms")
+            if base["throughput_rps"] and lvl["throughput_rps"] < base["throughput_rps"] * (1 - max_regression):
+                problems.append(f"{endpoint}@{lvl['concurrency']}: throughput {base['throughput_rps']} -> {lvl['throughput_rps']} rps")
+            if lvl["error_rate"] > base["error_rate"] + 0.01:
+                problems.append(f"{endpoint}@{lvl['concurrency']}: error rate {base['error_rate']} -> {lvl['error_rate']}")
+    return problems
+
+
+async def main(args) -> int:
+    endpoints = [e.strip() for e in args.endpoints.split(",") if e.strip()]
+    levels = [int(c) for c in args.concurrency.split(",")]
+    results = {
+        "config": {
+            "llm_latency_ms": args.llm_latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "requests_per_level": args.requests,
+            "concurrency": levels,
+        },
+        "endpoints": {},
+    }
+
+    with FakeOpenRouter(latency_ms=args.llm_latency_ms, jitter_ms=args.jitter_ms) as server, \
+            tempfile.TemporaryDirectory() as workdir:
+        os.environ["OPENROUTER_API_KEY"] = os.getenv("OPENROUTER_API_KEY") or "bench-key"
+        os.environ["OPENROUTER_API_BASE"] = server.base_url
+        os.environ["RENDER"] = "1"  # skip the local HuggingFace model; embed via the fake server
+        os.environ.setdefault("LOG_LEVEL", "WARNING")
+        build_products_index(workdir)
+        apps = load_apps()
+
+        for endpoint in endpoints:
+            app, make_request = apps[endpoint]
+            # Warm up lazy initialisation (RAG index build) outside the measurement
+            await run_level(app, make_request, 1, 1)
+            results["endpoints"][endpoint] = []
+            for concurrency in levels:
+                server.calls.clear()
+                level = await run_level(app, make_request, concurrency, args.requests)
+                level["upstream_calls"] = dict(server.calls)
+                results["endpoints"][endpoint].append(level)
+                print(f"{endpoint:>10} c={concurrency:<4} {level['throughput_rps']:>8} rps  "
+                      f"p50={level['p50_ms']}ms p95={level['p95_ms']}ms err={level['error_rate']}",
+                      file=sys.stderr)
+
+    output = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            problems = compare(results, json.load(f), args.max_regression)
+        for problem in problems:
+            print(f"REGRESSION {problem}", file=sys.stderr)
+        return 1 if problems else 0
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the API against a fake OpenRouter.")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help=f"Comma list of {ENDPOINTS}")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma list of concurrency levels")
+    parser.add_argument("--requests", type=int, default=100, help="Requests per concurrency level")
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0)
+    parser.add_argument("--jitter-ms", type=float, default=50.0)
+    parser.add_argument("--out", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="Previous JSON report to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    sys.exit(asyncio.run(main(parser.parse_args())))
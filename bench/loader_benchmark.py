@@ -0,0 +1,103 @@
+"""
+Micro-benchmark for CSV -> Document loading.
+
+Compares the previous `load_csvs` (pandas `read_csv` + `DataFrame.iterrows`)
+with the csv-module streaming loader in api/documents.py, cold and memoized,
+and with reading the same rows back from an Arrow snapshot, on a synthetic
+drinkware-shaped CSV of --rows rows.
+
+Usage:
+    python -m bench.loader_benchmark --rows 100000
+    python -m bench.loader_benchmark --rows 1000000 --skip-pandas --out loader.json
+"""
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import tempfile
+
+from api.documents import build_document, iter_csv_documents, iter_table_documents, load_csv_documents, source_name
+import pyarrow as pa
+
+from api.snapshot import open_table, read_csv_table, table_path, write_snapshot
+
+
+def write_csv(path: str, rows: int):
+    description = ("Double-wall stainless steel keeps drinks cold for 24 hours and hot for 12. "
+                   "Leak-proof screw-on lid, fits most cup holders. ") * 2
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "title", "content"])
+        for i in range(1, rows + 1):
+            writer.writerow([i, f"ZUS Tumbler {i % 97} {300 + i % 7 * 100}ml", f"{description}Batch {i}."])
+
+
+def load_with_iterrows(path: str):
+    """The previous implementation: one pandas Series per row."""
+    import pandas as pd
+
+    source = source_name(path)
+    df = pd.read_csv(path, dtype=str, keep_default_na=False)
+    return [build_document(row.to_dict(), source, path, position) for position, row in df.iterrows()]
+
+
+def timed(fn, *args) -> tuple:
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark CSV document loading.")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--skip-pandas", action="store_true", help="Skip the (slow) iterrows baseline")
+    parser.add_argument("--out", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    results = {"rows": args.rows}
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "zus_drinkware.csv")
+        write_csv(path, args.rows)
+        results["file_bytes"] = os.path.getsize(path)
+
+        snapshot_dir = os.path.join(workdir, "snapshot")
+        _, results["snapshot_build_seconds"] = timed(write_snapshot, {"drinkware": path}, snapshot_dir)
+
+        # Parsing + type coercion alone: what every consumer paid before the snapshot
+        _, csv_seconds = timed(read_csv_table, "drinkware", path)
+        _, mmap_seconds = timed(lambda: pa.ipc.open_file(pa.memory_map(table_path("drinkware", snapshot_dir))).read_all())
+        results["typed_table"] = {"csv_parse_seconds": round(csv_seconds, 4), "arrow_mmap_seconds": round(mmap_seconds, 4)}
+        print(f"{'typed table':>16}: csv {csv_seconds:.3f}s vs arrow mmap {mmap_seconds:.4f}s", file=sys.stderr)
+
+        def from_snapshot(_):
+            table = open_table("drinkware", snapshot_dir)
+            return list(iter_table_documents("drinkware", table, table_path("drinkware", snapshot_dir)))
+
+        runs = [("csv_stream", lambda p: list(iter_csv_documents(p))),
+                ("arrow_snapshot", from_snapshot),
+                ("memoized_cold", load_csv_documents),
+                ("memoized_warm", load_csv_documents)]
+        if not args.skip_pandas:
+            runs.insert(0, ("pandas_iterrows", load_with_iterrows))
+
+        for name, fn in runs:
+            docs, seconds = timed(fn, path)
+            assert len(docs) == args.rows
+            results[name] = {"seconds": round(seconds, 4), "rows_per_sec": round(args.rows / seconds) if seconds else None}
+            print(f"{name:>16}: {seconds:8.3f}s  {results[name]['rows_per_sec']} rows/s", file=sys.stderr)
+
+    if "pandas_iterrows" in results:
+        results["speedup_vs_iterrows"] = round(
+            results["pandas_iterrows"]["seconds"] / results["csv_stream"]["seconds"], 2)
+    output = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
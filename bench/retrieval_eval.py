@@ -0,0 +1,211 @@
+"""
+Retrieval quality and latency per retriever configuration, with a regression gate.
+
+The corpus is every row of the sources /rag/query embeds (DATA_SOURCES in
+api/retrieval.py, i.e. drinkware), in one PartitionedIndex per source,
+embedded with `fake_embedding`. The run is offline and deterministic. The
+labelled questions in bench/retrieval_eval_queries.json whose relevant rows
+are in the corpus are answered by each combination of
+
+    index      flat (exact) or --ann (hnsw by default; api/vector_index.py)
+    retriever  dense (vector search only) or hybrid (api/retrieval.hybrid_search,
+               the function /rag/query ranks with)
+    rerank     off, or RERANK_CANDIDATES first-stage hits reranked and packed
+               into the context budget by api/context.select_context, as
+               /rag/query does (lexical unless RERANK_MODEL names a cross-encoder)
+
+Outlet questions are answered from SQL in production, not from the vector
+index. `--sources drinkware,outlets` also indexes and scores them, but that
+measures a configuration /rag/query doesn't serve: such reports carry
+"served": false and are never compared with the served baseline.
+
+Each configuration reports recall@k for every --k, the MRR over the deepest
+k, and the p50/p95 latency of one query from text to ranking. That includes
+embedding, search and reranking, measured over --repeat passes.
+
+With --baseline the run exits non-zero if any configuration's recall@k or
+MRR drops by more than --max-recall-drop (absolute), or its p95 latency
+grows by more than --max-latency-regression (relative) and more than
+--latency-slack-ms (so timer noise on sub-millisecond queries doesn't trip
+it). Recall is deterministic, so tests/test_retrieval_eval.py checks it
+against the stored bench/retrieval_baseline.json on every test run. Latency
+depends on the machine: compare against a baseline recorded on the same host.
+
+Usage:
+    python -m bench.retrieval_eval
+    python -m bench.retrieval_eval --baseline bench/retrieval_baseline.json
+    python -m bench.retrieval_eval --out bench/retrieval_baseline.json      # lexical reranker
+    RERANK_MODEL=cross-encoder/ms-marco-MiniLM-L-6-v2 python -m bench.retrieval_eval
+"""
+import sys
+import json
+import time
+import argparse
+from itertools import product
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from api.context import select_context
+from api.documents import load_source_documents
+from api.keyword_index import BM25Index
+from api.rerank import RERANK_CANDIDATES, load_cross_encoder
+from api.retrieval import DATA_SOURCES, hybrid_search
+from api.vector_index import PartitionedIndex
+from bench.fake_openrouter import fake_embedding
+from bench.load_test import percentile
+
+QUERIES_PATH = "bench/retrieval_eval_queries.json"
+BASELINE_PATH = "bench/retrieval_baseline.json"
+
+
+def load_corpus(sources: Sequence[str] = DATA_SOURCES):
+    """(documents, texts, embedding matrix) for every row of `sources`."""
+    documents = [doc for source in sources for doc in load_source_documents(source)]
+    texts = [d.page_content for d in documents]
+    vectors = np.array([fake_embedding(t) for t in texts], dtype="float32")
+    return documents, texts, vectors
+
+
+def make_retriever(texts: List[str], vector_index: PartitionedIndex, keyword_index: BM25Index,
+                   hybrid: bool, reranked: bool) -> Callable[[str, int], List[int]]:
+    """`retrieve(query, k)` -> corpus positions, best first, for one configuration."""
+    def first_stage(query: str, k: int) -> List[int]:
+        if hybrid:
+            return hybrid_search(keyword_index, vector_index, fake_embedding, query, k)
+        return vector_index.search(fake_embedding(query), k)
+
+    def retrieve(query: str, k: int) -> List[int]:
+        if not reranked:
+            return first_stage(query, k)
+        candidates = first_stage(query, max(k, RERANK_CANDIDATES))
+        return [candidates[i] for i, _ in select_context(query, [texts[c] for c in candidates])][:k]
+
+    return retrieve
+
+
+def answerable(labelled: List[dict], sources: Sequence[str]) -> List[dict]:
+    """The questions whose relevant rows all come from `sources`."""
+    return [item for item in labelled if all(i.split(":", 1)[0] in sources for i in item["relevant"])]
+
+
+def score(rankings: List[List[str]], labels: List[List[str]], ks: Sequence[int]) -> Dict[str, float]:
+    """Mean recall@k for each k and MRR over the full rankings."""
+    result = {}
+    for k in ks:
+        recalls = [len(set(ids[:k]) & set(relevant)) / len(relevant) for ids, relevant in zip(rankings, labels)]
+        result[f"recall@{k}"] = round(float(np.mean(recalls)), 3)
+    reciprocal_ranks = []
+    for ids, relevant in zip(rankings, labels):
+        first = next((rank for rank, i in enumerate(ids, 1) if i in relevant), None)
+        reciprocal_ranks.append(1.0 / first if first else 0.0)
+    result["mrr"] = round(float(np.mean(reciprocal_ranks)), 3)
+    return result
+
+
+def evaluate(labelled: List[dict], ks: Sequence[int] = (1, 5), ann: str = "hnsw", repeat: int = 20,
+             sources: Sequence[str] = DATA_SOURCES) -> Dict[str, dict]:
+    """Configuration name (e.g. "hnsw+hybrid+rerank") -> quality and latency metrics over `answerable` questions."""
+    labelled = answerable(labelled, sources)
+    load_cross_encoder()  # before timing, and so reranked configs never run lexically while it loads
+    documents, texts, vectors = load_corpus(sources)
+    metadatas = [d.metadata for d in documents]
+    keyword_index = BM25Index(texts)
+    indexes = {kind: PartitionedIndex(vectors, metadatas, partition_key="source", index_type=kind)
+               for kind in ("flat", ann)}
+    depth = max(ks)
+    labels = [item["relevant"] for item in labelled]
+
+    results = {}
+    for kind, hybrid, reranked in product(indexes, (False, True), (False, True)):
+        name = "+".join([kind, "hybrid" if hybrid else "dense"] + (["rerank"] if reranked else []))
+        retrieve = make_retriever(texts, indexes[kind], keyword_index, hybrid, reranked)
+        rankings = [[documents[i].metadata["id"] for i in retrieve(item["query"], depth)] for item in labelled]
+        latencies = []
+        for _ in range(repeat):
+            for item in labelled:
+                start = time.perf_counter()
+                retrieve(item["query"], depth)
+                latencies.append((time.perf_counter() - start) * 1000)
+        latencies.sort()
+        results[name] = {
+            **score(rankings, labels, ks),
+            "latency_ms_p50": round(percentile(latencies, 50), 3),
+            "latency_ms_p95": round(percentile(latencies, 95), 3),
+        }
+    return results
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], max_recall_drop: float,
+            max_latency_regression: Optional[float], latency_slack_ms: float = 0.0) -> List[str]:
+    """Human-readable regressions versus a previous run; latency is skipped when its threshold is None."""
+    problems = []
+    if results.get("sources", DATA_SOURCES) != baseline.get("sources", DATA_SOURCES):
+        return [f"sources {results.get('sources')} differ from the baseline's {baseline.get('sources')}"]
+    for name, base in baseline.get("configs", {}).items():
+        current = results.get("configs", {}).get(name)
+        if current is None:
+            problems.append(f"{name}: missing from this run")
+            continue
+        for metric, value in base.items():
+            if (metric.startswith("recall@") or metric == "mrr") and metric in current:
+                if current[metric] < value - max_recall_drop:
+                    problems.append(f"{name}: {metric} {current[metric]} < baseline {value}")
+        if max_latency_regression is not None and base.get("latency_ms_p95"):
+            limit = max(base["latency_ms_p95"] * (1 + max_latency_regression), base["latency_ms_p95"] + latency_slack_ms)
+            if current["latency_ms_p95"] > limit:
+                problems.append(f"{name}: p95 {current['latency_ms_p95']}ms > {limit:.3f}ms "
+                                f"(baseline {base['latency_ms_p95']}ms)")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate retrieval quality and latency per configuration.")
+    parser.add_argument("--queries", default=QUERIES_PATH)
+    parser.add_argument("--k", default="1,5", help="Comma-separated cut-offs for recall@k")
+    parser.add_argument("--ann", default="hnsw", choices=["hnsw", "ivfpq"], help="Approximate index to compare with flat")
+    parser.add_argument("--sources", default=",".join(DATA_SOURCES),
+                        help="Comma-separated sources to index; anything beyond DATA_SOURCES isn't served")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed passes over the query set")
+    parser.add_argument("--baseline", help="Previous JSON report to compare against")
+    parser.add_argument("--max-recall-drop", type=float, default=0.02)
+    parser.add_argument("--max-latency-regression", type=float, default=0.5)
+    parser.add_argument("--latency-slack-ms", type=float, default=0.25,
+                        help="p95 growth below this many ms is never a regression")
+    parser.add_argument("--out", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    with open(args.queries, encoding="utf-8") as f:
+        labelled = json.load(f)
+    ks = sorted({int(k) for k in args.k.split(",")})
+    sources = [s.strip() for s in args.sources.split(",") if s.strip()]
+    report = {
+        "sources": sources,
+        "served": set(sources) <= set(DATA_SOURCES),
+        "queries": len(answerable(labelled, sources)),
+        "configs": evaluate(labelled, ks, args.ann, args.repeat, sources),
+    }
+    if not report["served"]:
+        print("note: sources beyond DATA_SOURCES measure a configuration /rag/query doesn't serve", file=sys.stderr)
+    for name, metrics in report["configs"].items():
+        print(f"{name:>22}: {metrics}", file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            problems = compare(report, json.load(f), args.max_recall_drop, args.max_latency_regression,
+                               args.latency_slack_ms)
+        for problem in problems:
+            print(f"REGRESSION {problem}", file=sys.stderr)
+        return 1 if problems else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+"""
+Cost of idle /ws/chat connections (api/ws_chat.py) on one worker.
+
+Starts `uvicorn app:app` in a subprocess, opens --connections WebSockets to
+/ws/chat from this process and leaves them idle. The report covers:
+
+    rss_mb_before / rss_mb_idle   server resident memory before and with every socket open
+    kib_per_connection            the difference per socket
+    connect_seconds               time to open them all
+    ping_ms_p50/p95/p99           round trip of an app-level ping on every socket at once
+    turn_ms_p50/p95               one chat turn each on --turns sockets (intent parse against the fake server)
+
+Usage:
+    python -m bench.ws_idle
+    python -m bench.ws_idle --connections 5000 --out ws_idle.json
+    python -m bench.ws_idle --compress --server-args "--ws-per-message-deflate false"
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import subprocess
+from typing import List
+
+from bench.fake_openrouter import FakeOpenRouter
+from bench.load_test import percentile
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status", encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+async def _wait_ready(url: str, timeout: float = 60.0):
+    import aiohttp
+
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while True:
+            try:
+                async with session.get(url) as resp:
+                    if resp.status < 500:
+                        return
+            except aiohttp.ClientError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"server at {url} did not start")
+            await asyncio.sleep(0.2)
+
+
+async def _round_trip(ws, frame: dict, until: str) -> float:
+    start = time.perf_counter()
+    await ws.send_json(frame)
+    while (await ws.receive_json())["type"] != until:
+        pass
+    return (time.perf_counter() - start) * 1000
+
+
+async def measure(base: str, pid: int, connections: int, turns: int, compress: bool) -> dict:
+    import aiohttp
+
+    await _wait_ready(f"http://{base}/metrics")
+    await asyncio.sleep(1)
+    report = {"connections": connections, "rss_mb_before": round(_rss_mb(pid), 1)}
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0)) as session:
+        start = time.perf_counter()
+        sockets = []
+        # Open in waves so the listen backlog isn't the bottleneck
+        for wave in range(0, connections, 500):
+            sockets += await asyncio.gather(*(
+                session.ws_connect(f"ws://{base}/ws/chat?user=user{i}", heartbeat=None, compress=15 if compress else 0)
+                for i in range(wave, min(wave + 500, connections))
+            ))
+        report["connect_seconds"] = round(time.perf_counter() - start, 2)
+        await asyncio.sleep(2)
+        report["rss_mb_idle"] = round(_rss_mb(pid), 1)
+        report["kib_per_connection"] = round(
+            (report["rss_mb_idle"] - report["rss_mb_before"]) * 1024 / max(connections, 1), 1)
+
+        pings: List[float] = sorted(await asyncio.gather(*(_round_trip(ws, {"type": "ping"}, "pong") for ws in sockets)))
+        report.update({f"ping_ms_p{p}": round(percentile(pings, p), 2) for p in (50, 95, 99)})
+        chats = sorted(await asyncio.gather(*(
+            _round_trip(ws, {"type": "message", "content": "hello"}, "done") for ws in sockets[:turns]
+        )))
+        report.update({f"turn_ms_p{p}": round(percentile(chats, p), 2) for p in (50, 95)})
+        await asyncio.gather(*(ws.close() for ws in sockets))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure idle WebSocket chat connections.")
+    parser.add_argument("--connections", type=int, default=2000)
+    parser.add_argument("--turns", type=int, default=100, help="Sockets that also run one chat turn")
+    parser.add_argument("--compress", action="store_true",
+                        help="Negotiate permessage-deflate, as browsers do")
+    parser.add_argument("--server-args", default="",
+                        help="Extra uvicorn flags, e.g. '--ws-per-message-deflate false'")
+    parser.add_argument("--out", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    port = _free_port()
+    with FakeOpenRouter() as server:
+        env = {**os.environ, "OPENROUTER_API_KEY": os.getenv("OPENROUTER_API_KEY") or "bench-key",
+               "OPENROUTER_API_BASE": server.base_url, "LOG_LEVEL": "WARNING"}
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--log-level", "warning",
+             *args.server_args.split()], env=env,
+        )
+        try:
+            report = asyncio.run(measure(f"127.0.0.1:{port}", proc.pid, args.connections, args.turns, args.compress))
+        finally:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+# ingest/build_snapshot.py
+"""
+Build the columnar catalogue snapshot from the scraper CSVs.
+
+This is the single ingest step: it parses and type-coerces the CSVs once and
+writes Arrow files under data/snapshot/<version>/ (see api/snapshot.py).
+DB seeding, the products index and the RAG documents all read that snapshot.
+
+Usage:
+  python -m ingest.build_snapshot
+  python -m ingest.build_snapshot --drinkware data/zus_drinkware.csv --outlets data/zus_outlets.csv --keep 3
+"""
+import argparse
+import logging
+
+from api.snapshot import SNAPSHOT_DIR, SOURCE_CSVS, write_snapshot
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s"
+)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build the typed Arrow snapshot from the scraper CSVs.")
+    parser.add_argument('--drinkware', default=SOURCE_CSVS["drinkware"], help='Path to drinkware CSV file.')
+    parser.add_argument('--outlets', default=SOURCE_CSVS["outlets"], help='Path to outlets CSV file.')
+    parser.add_argument('--out', default=SNAPSHOT_DIR, help='Snapshot root directory.')
+    parser.add_argument('--keep', type=int, default=2, help='Snapshot versions to keep.')
+    args = parser.parse_args()
+
+    manifest = write_snapshot({"drinkware": args.drinkware, "outlets": args.outlets}, root=args.out, keep=args.keep)
+    for name, info in manifest["tables"].items():
+        logging.info(f"{name}: {info['rows']} rows")
+    logging.info(f"Snapshot {manifest['version']} is current in {args.out}.")
@@ -1,20 +1,26 @@
 # ingest/outlets_ingest.py
 """
-Script to create and seed the SQLite database from CSV files.
+Script to create and seed the SQLite database from the catalogue snapshot.
 Supports both outlets and drinkware tables.
 
+Tables are created from the snapshot's Arrow schemas (api/snapshot.py), so
+the outlets table here is the same one scripts/init_db.py builds.
+
+`--changes` instead applies the added/changed/removed outlets written by
+scripts/scrape_zus_outlets.py to an existing outlets table, in place.
+
 Usage:
-  python ingest/outlets_ingest.py \
-      --outlets data/zus_outlets.csv \
-      --drinkware data/zus_drinkware.csv \
-      --db db/app_data.db
+  python -m ingest.build_snapshot
+  python -m ingest.outlets_ingest --tables outlets,drinkware --db db/app_data.db
+  python -m ingest.outlets_ingest --changes data/zus_outlets.changes.jsonl --db db/outlets.db
 """
 import argparse
+import json
 import sqlite3
-import csv
 import os
 import logging
-from pathlib import Path
+
+from api.snapshot import SCHEMAS, SNAPSHOT_DIR, current_version, open_table, seed_sqlite
 
 # Configure logging
 logging.basicConfig(
@@ -23,91 +29,47 @@ logging.basicConfig(
 )
 
 
-def create_tables(conn):
-    logging.info("Dropping existing tables if they exist...")
-    conn.execute("DROP TABLE IF EXISTS outlets;")
-    conn.execute("DROP TABLE IF EXISTS drinkware;")
-
-    logging.info("Creating 'outlets' table...")
-    conn.execute("""
-        CREATE TABLE outlets (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            location TEXT NOT NULL,
-            opening_time TEXT,
-            closing_time TEXT,
-            services TEXT
-        );
-    """
-    )
-    logging.info("Creating 'drinkware' table...")
-    conn.execute("""
-        CREATE TABLE drinkware (
-            id INTEGER PRIMARY KEY,
-            title TEXT NOT NULL,
-            content TEXT
-        );
-    """
-    )
+def seed_table(conn, name: str, snapshot_dir: str):
+    logging.info(f"Seeding '{name}' from snapshot {current_version(snapshot_dir)}...")
+    table = open_table(name, snapshot_dir)
+    seed_sqlite(conn, name, table)
     conn.commit()
-    logging.info("Table creation complete.")
+    logging.info(f"Inserted {table.num_rows} rows into '{name}'.")
 
 
-def seed_outlets(conn, csv_path):
-    logging.info(f"Seeding 'outlets' from CSV: {csv_path}...")
-    with open(csv_path, newline='', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        rows = []
-        for idx, row in enumerate(reader, start=1):
-            rows.append((
-                row.get('name'),
-                row.get('location'),
-                row.get('opening_time'),
-                row.get('closing_time'),
-                row.get('services')
-            ))
-            if idx % 50 == 0:
-                logging.info(f"  Processed {idx} outlet rows...")
-    conn.executemany(
-        "INSERT INTO outlets (name, location, opening_time, closing_time, services) VALUES (?, ?, ?, ?, ?);",
-        rows
-    )
+def apply_outlet_changes(conn, changes_path: str) -> int:
+    """Upsert added/changed outlets and delete removed ones; returns the number applied."""
+    applied = 0
+    with open(changes_path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            change = json.loads(line)
+            outlet = change["outlet"]
+            if change["op"] == "removed":
+                conn.execute("DELETE FROM outlets WHERE id = ?", (outlet["id"],))
+            else:
+                columns = list(outlet)
+                conn.execute(
+                    f"INSERT OR REPLACE INTO outlets ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                    [outlet[column] for column in columns],
+                )
+            applied += 1
     conn.commit()
-    logging.info(f"Inserted {len(rows)} rows into 'outlets'.")
+    return applied
 
 
-def seed_drinkware(conn, csv_path):
-    logging.info(f"Seeding 'drinkware' from CSV: {csv_path}...")
-    with open(csv_path, newline='', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        rows = []
-        for idx, row in enumerate(reader, start=1):
-            rows.append((
-                int(row.get('id', idx)),
-                row.get('title'),
-                row.get('content')
-            ))
-            if idx % 50 == 0:
-                logging.info(f"  Processed {idx} drinkware rows...")
-    conn.executemany(
-        "INSERT INTO drinkware (id, title, content) VALUES (?, ?, ?);",
-        rows
-    )
-    conn.commit()
-    logging.info(f"Inserted {len(rows)} rows into 'drinkware'.")
-
-
-def main(outlets_csv: str, drinkware_csv: str, db_path: str):
+def main(tables: list, db_path: str, snapshot_dir: str = SNAPSHOT_DIR):
     # Ensure output directory exists
-    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
     logging.info(f"Connecting to SQLite DB at {db_path}...")
     conn = sqlite3.connect(db_path)
     try:
-        create_tables(conn)
-        if outlets_csv:
-            seed_outlets(conn, outlets_csv)
-        if drinkware_csv:
-            seed_drinkware(conn, drinkware_csv)
+        for name in tables:
+            seed_table(conn, name, snapshot_dir)
+        if "outlets" in tables:
+            with open("schema/outlet_schema.sql", "r") as schema_file:
+                conn.executescript(schema_file.read())
         logging.info(f"Seeding complete. Database ready at {db_path}.")
     except Exception as e:
         logging.error(f"Error during seeding: {e}")
@@ -116,13 +78,24 @@ def main(outlets_csv: str, drinkware_csv: str, db_path: str):
         logging.info("Database connection closed.")
 
 if __name__ == '__main__':
-    parser = argparse.ArgumentParser(description="Seed app SQLite database from CSVs.")
-    parser.add_argument('--outlets', required=False, help='Path to outlets CSV file.')
-    parser.add_argument('--drinkware', required=False, help='Path to drinkware CSV file.')
+    parser = argparse.ArgumentParser(description="Seed app SQLite database from the catalogue snapshot.")
+    parser.add_argument('--tables', default=",".join(SCHEMAS), help='Comma list of snapshot tables to seed.')
+    parser.add_argument('--snapshot', default=SNAPSHOT_DIR, help='Snapshot root directory.')
     parser.add_argument('--db', required=True, help='Output path for SQLite database.')
+    parser.add_argument('--changes', help='Apply a scraper change file to --db instead of reseeding.')
     args = parser.parse_args()
 
-    if not args.outlets and not args.drinkware:
-        parser.error("At least one of --outlets or --drinkware must be provided.")
+    if args.changes:
+        conn = sqlite3.connect(args.db)
+        try:
+            logging.info(f"Applied {apply_outlet_changes(conn, args.changes)} outlet changes to {args.db}.")
+        finally:
+            conn.close()
+        raise SystemExit(0)
+
+    tables = [t.strip() for t in args.tables.split(",") if t.strip()]
+    unknown = set(tables) - set(SCHEMAS)
+    if not tables or unknown:
+        parser.error(f"--tables must be a subset of {sorted(SCHEMAS)}")
 
-    main(args.outlets, args.drinkware, args.db)
+    main(tables, args.db, args.snapshot)
@@ -0,0 +1,4 @@
+-- Indexes for the outlet lookups issued by api/outlets.py (applied by scripts/init_db.py)
+CREATE INDEX IF NOT EXISTS idx_outlets_name ON outlets(name);
+CREATE INDEX IF NOT EXISTS idx_outlets_location ON outlets(location);
+CREATE INDEX IF NOT EXISTS idx_outlets_hours ON outlets(opening_time, closing_time);
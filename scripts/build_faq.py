@@ -0,0 +1,165 @@
+"""
+Build the precomputed FAQ answer table served by api/faq.py.
+
+1. Mine: count the queries in the API's JSON log lines (the `query` field
+   of "RAG query answered" / "Outlet query answered" / "Chat message", only
+   logged with LOG_QUERIES=1) and the seed questions in
+   data/faq_seed.jsonl. Seeds are always kept; other questions need
+   --min-count occurrences.
+2. Cluster: embed the distinct questions, most frequent first, and group
+   paraphrases whose cosine similarity reaches --threshold.
+3. Answer: each cluster's most frequent phrasing goes through
+   POST /rag/query/batch in-process, so answers come from the same routing,
+   retrieval and generation as live traffic.
+4. Vet: drop errors, empty or source-less answers and degraded extractive
+   answers (LLM unavailable); write the rest with the current snapshot and
+   outlets DB versions.
+
+Re-run after `python -m ingest.build_snapshot` or an outlets DB update.
+Until then the table no longer matches and every query takes the normal path.
+
+Usage:
+    python -m scripts.build_faq --logs logs/api-*.jsonl
+    python -m scripts.build_faq --logs api.log --min-count 5 --max-entries 100
+    python -m scripts.build_faq --fake-embeddings      # cluster offline, no API key needed
+"""
+import sys
+import json
+import glob
+import argparse
+import logging
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+from api.degraded import DEGRADED_PREFIX
+from api.faq import FAQ_TABLE_PATH, cluster_queries, normalize_query, outlets_version, write_table
+from api.snapshot import current_version
+
+SEED_PATH = "data/faq_seed.jsonl"
+
+logger = logging.getLogger(__name__)
+
+
+def mine_queries(lines: Iterable[str]) -> Counter:
+    """Normalized query -> count over JSON lines carrying a `query` field (other lines are skipped)."""
+    counts: Counter = Counter()
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        query = record.get("query") if isinstance(record, dict) else None
+        if isinstance(query, str) and normalize_query(query):
+            counts[normalize_query(query)] += 1
+    return counts
+
+
+def select_questions(counts: Counter, seeds: List[str], min_count: int, max_entries: int) -> List[Tuple[str, int]]:
+    """(question, count), most frequent first: seeds plus logged questions seen `min_count` times."""
+    seeds = [normalize_query(s) for s in seeds if normalize_query(s)]
+    frequent = {q: c for q, c in counts.items() if c >= min_count}
+    for seed in seeds:
+        frequent.setdefault(seed, counts.get(seed, 0))
+    ranked = sorted(frequent.items(), key=lambda item: (-item[1], item[0]))
+    return ranked[:max(max_entries, len(seeds))]
+
+
+def vet(result: Dict) -> Optional[str]:
+    """Why an answer line can't be served as-is, or None if it can."""
+    if "error" in result:
+        return result["error"]
+    answer = (result.get("answer") or "").strip()
+    if not answer:
+        return "empty answer"
+    if answer.startswith(DEGRADED_PREFIX) or answer.startswith("I can't reach the language model"):
+        return "degraded answer"
+    if not result.get("sources"):
+        return "no sources"
+    return None
+
+
+def build_entries(questions: List[Tuple[str, int]], embed: Callable[[List[str]], np.ndarray],
+                  answer: Callable[[List[str]], List[Dict]], threshold: float) -> Tuple[List[dict], List[dict]]:
+    """(vetted entries, rejected clusters) for `questions`, most frequent first."""
+    texts = [q for q, _ in questions]
+    clusters = cluster_queries(embed(texts), threshold) if texts else []
+    leaders = [texts[members[0]] for members in clusters]
+    results = answer(leaders)
+
+    entries, rejected = [], []
+    for members, result in zip(clusters, results):
+        question = texts[members[0]]
+        reason = vet(result)
+        if reason:
+            rejected.append({"question": question, "reason": reason})
+            continue
+        entries.append({
+            "id": f"faq:{len(entries) + 1}",
+            "question": question,
+            "variants": [texts[i] for i in members[1:]],
+            "count": sum(questions[i][1] for i in members),
+            "answer": result["answer"].strip(),
+            "sources": result["sources"],
+        })
+    return entries, rejected
+
+
+def answer_in_process(questions: List[str]) -> List[Dict]:
+    """Answers in request order from POST /rag/query/batch on the real app."""
+    from fastapi.testclient import TestClient
+    import api.main
+
+    response = TestClient(api.main.app).post("/rag/query/batch", json={"queries": [{"query": q} for q in questions]})
+    response.raise_for_status()
+    results: List[Dict] = [{"error": "no answer"} for _ in questions]
+    for line in response.text.splitlines():
+        record = json.loads(line)
+        results[record.pop("index")] = record
+    return results
+
+
+def read_lines(patterns: List[str]) -> Iterable[str]:
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)) or [pattern]:
+            with open(path, encoding="utf-8") as f:
+                yield from f
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Build the precomputed FAQ answer table.")
+    parser.add_argument("--logs", nargs="*", default=[], help="JSON log files or globs to mine")
+    parser.add_argument("--seed", default=SEED_PATH, help="JSON lines of questions that are always included")
+    parser.add_argument("--min-count", type=int, default=3, help="Occurrences a logged question needs")
+    parser.add_argument("--max-entries", type=int, default=50, help="Most questions to cluster and answer")
+    parser.add_argument("--threshold", type=float, default=0.9, help="Cosine similarity that merges two questions")
+    parser.add_argument("--out", default=FAQ_TABLE_PATH)
+    parser.add_argument("--fake-embeddings", action="store_true",
+                        help="Use the deterministic embeddings from bench/fake_openrouter.py")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    from scripts.build_index import embed_fake, embed_openrouter
+
+    counts = mine_queries(read_lines(args.logs))
+    seeds = list(mine_queries(read_lines([args.seed])))
+    questions = select_questions(counts, seeds, args.min_count, args.max_entries)
+    logger.info("%d logged questions, %d selected", len(counts), len(questions))
+
+    # Stamp the data the answers are generated from, before generating them
+    snapshot_version, outlets_db_version = current_version(), outlets_version()
+    entries, rejected = build_entries(
+        questions, embed_fake if args.fake_embeddings else embed_openrouter, answer_in_process, args.threshold,
+    )
+    for item in rejected:
+        logger.warning("Skipped %r: %s", item["question"], item["reason"])
+    write_table(entries, snapshot_version, args.out, outlets_db_version)
+    logger.info("Wrote %d entries (%d clusters rejected) to %s", len(entries), len(rejected), args.out)
+    return 0 if entries or not questions else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
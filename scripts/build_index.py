@@ -0,0 +1,103 @@
+"""
+Build the products vector index (db/products.index + db/products.json) used by
+api/products.py from the drinkware table of the Arrow snapshot
+(`python -m ingest.build_snapshot`), falling back to the CSV if there is none.
+
+Usage (from the repo root):
+    python -m scripts.build_index --type hnsw --ef-search 64
+    python -m scripts.build_index --type ivfpq --nlist 64 --nprobe 8 --pq-m 16
+    python -m scripts.build_index --fake-embeddings      # offline, no API key needed
+
+Unset options fall back to the environment defaults in api/vector_index.py.
+Query-time knobs (nprobe/efSearch) are stored in the index but api/products.py
+re-applies IVF_NPROBE / HNSW_EF_SEARCH when it loads it.
+"""
+import os
+import json
+import time
+import argparse
+
+import faiss
+import numpy as np
+from dotenv import load_dotenv
+
+from api.snapshot import SOURCE_CSVS, open_table, read_csv_table, table_path
+from api.vector_index import INDEX_TYPES, build_index, index_kind, index_memory_bytes
+
+EMBEDDING_MODEL = "text-embedding-ada-002"
+BATCH_SIZE = 64
+
+
+def load_products(csv_path: str = None) -> list[dict]:
+    """Product rows in snapshot order, which is the order api/products.py expects."""
+    if csv_path is None and table_path("drinkware") is not None:
+        table = open_table("drinkware")
+    else:
+        table = read_csv_table("drinkware", csv_path or SOURCE_CSVS["drinkware"])
+    columns = table.to_pydict()
+    return [{"id": i, "title": t, "description": c}
+            for i, t, c in zip(columns["id"], columns["title"], columns["content"])]
+
+
+def embed_openrouter(texts: list[str]) -> np.ndarray:
+    from openai import OpenAI
+
+    client = OpenAI(
+        api_key=os.getenv("OPENROUTER_API_KEY"),
+        base_url=os.getenv("OPENROUTER_API_BASE", "https://openrouter.ai/api/v1"),
+    )
+    vectors = []
+    for start in range(0, len(texts), BATCH_SIZE):
+        resp = client.embeddings.create(model=EMBEDDING_MODEL, input=texts[start:start + BATCH_SIZE])
+        vectors.extend(d.embedding for d in sorted(resp.data, key=lambda d: d.index))
+    return np.array(vectors, dtype="float32")
+
+
+def embed_fake(texts: list[str]) -> np.ndarray:
+    from bench.fake_openrouter import fake_embedding
+
+    return np.array([fake_embedding(t) for t in texts], dtype="float32")
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Build the products FAISS index.")
+    parser.add_argument("--csv", help="Read this CSV instead of the snapshot")
+    parser.add_argument("--type", choices=INDEX_TYPES, help="Index type (default VECTOR_INDEX_TYPE or flat)")
+    parser.add_argument("--nlist", type=int, help="IVF inverted lists (0 = 4*sqrt(n))")
+    parser.add_argument("--nprobe", type=int, help="IVF lists scanned per query")
+    parser.add_argument("--pq-m", type=int, help="PQ sub-quantisers")
+    parser.add_argument("--pq-nbits", type=int, help="Bits per PQ code")
+    parser.add_argument("--hnsw-m", type=int, help="HNSW graph degree")
+    parser.add_argument("--ef-construction", type=int, help="HNSW build-time beam width")
+    parser.add_argument("--ef-search", type=int, help="HNSW query-time beam width")
+    parser.add_argument("--out-index", default=os.getenv("PRODUCTS_INDEX_PATH", "db/products.index"))
+    parser.add_argument("--out-meta", default=os.getenv("PRODUCTS_META_PATH", "db/products.json"))
+    parser.add_argument("--fake-embeddings", action="store_true",
+                        help="Use the deterministic embeddings from bench/fake_openrouter.py")
+    args = parser.parse_args()
+
+    meta = load_products(args.csv)
+    texts = [f"{m['title']} {m['description']}" for m in meta]
+    start = time.perf_counter()
+    vectors = embed_fake(texts) if args.fake_embeddings else embed_openrouter(texts)
+    print(f"Embedded {len(texts)} products in {time.perf_counter() - start:.1f}s")
+
+    start = time.perf_counter()
+    index = build_index(
+        vectors, args.type,
+        nlist=args.nlist, nprobe=args.nprobe, pq_m=args.pq_m, pq_nbits=args.pq_nbits,
+        hnsw_m=args.hnsw_m, ef_construction=args.ef_construction, ef_search=args.ef_search,
+    )
+    print(f"Built {index_kind(index)} index in {time.perf_counter() - start:.2f}s "
+          f"({index_memory_bytes(index) / 1024:.0f} KiB)")
+
+    os.makedirs(os.path.dirname(args.out_index) or ".", exist_ok=True)
+    faiss.write_index(index, args.out_index)
+    with open(args.out_meta, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+    print(f"Wrote {args.out_index} and {args.out_meta}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Export sentence-transformers/all-MiniLM-L6-v2 to ONNX and quantise it to int8
+for api/onnx_embeddings.py.
+
+Needs torch, transformers and optimum at export time only; the server needs
+just onnxruntime and tokenizers:
+
+    pip install "optimum[onnxruntime]"
+    python -m scripts.export_onnx_embeddings
+    python -m scripts.export_onnx_embeddings --out models/minilm-onnx-int8 --check
+
+Weights are quantised dynamically (per-channel int8 MatMuls, activations
+quantised at run time), so no calibration data is needed.
+"""
+import os
+import shutil
+import argparse
+import tempfile
+
+from api.onnx_embeddings import MODEL_FILE, ONNX_EMBEDDINGS_DIR, TOKENIZER_FILE
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+CHECK_TEXTS = [
+    "ZUS OG CUP 2.0 With Screw-On Lid 500ml (17oz)",
+    "Which tumbler keeps drinks cold?",
+    "ZUS Coffee outlets open after 9pm in Petaling Jaya",
+]
+
+
+def export(model_name: str, out_dir: str):
+    from optimum.onnxruntime import ORTModelForFeatureExtraction
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoTokenizer
+
+    with tempfile.TemporaryDirectory() as workdir:
+        model = ORTModelForFeatureExtraction.from_pretrained(model_name, export=True)
+        model.save_pretrained(workdir)
+        AutoTokenizer.from_pretrained(model_name).save_pretrained(workdir)
+        os.makedirs(out_dir, exist_ok=True)
+        quantize_dynamic(
+            os.path.join(workdir, "model.onnx"),
+            os.path.join(out_dir, MODEL_FILE),
+            weight_type=QuantType.QInt8,
+            per_channel=True,
+        )
+        shutil.copy(os.path.join(workdir, TOKENIZER_FILE), os.path.join(out_dir, TOKENIZER_FILE))
+    size = os.path.getsize(os.path.join(out_dir, MODEL_FILE))
+    print(f"Wrote {out_dir}/{MODEL_FILE} ({size / 1e6:.1f} MB) and {TOKENIZER_FILE}")
+
+
+def check(model_name: str, out_dir: str):
+    """Cosine similarity of the int8 vectors against the fp32 sentence-transformers ones."""
+    import numpy as np
+    from sentence_transformers import SentenceTransformer
+
+    from api.onnx_embeddings import OnnxEmbeddings
+
+    reference = SentenceTransformer(model_name, device="cpu").encode(CHECK_TEXTS, normalize_embeddings=True)
+    quantised = np.array(OnnxEmbeddings(out_dir).embed_documents(CHECK_TEXTS))
+    cosines = (reference * quantised).sum(axis=1)
+    print("cosine vs fp32:", " ".join(f"{c:.4f}" for c in cosines))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export an int8 ONNX MiniLM for local query embeddings.")
+    parser.add_argument("--model", default=MODEL_NAME)
+    parser.add_argument("--out", default=ONNX_EMBEDDINGS_DIR)
+    parser.add_argument("--check", action="store_true", help="Compare against the fp32 sentence-transformers model")
+    args = parser.parse_args()
+
+    export(args.model, args.out)
+    if args.check:
+        check(args.model, args.out)
+
+
+if __name__ == "__main__":
+    main()
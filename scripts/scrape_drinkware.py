@@ -1,35 +1,303 @@
 #!/usr/bin/env python3
-import requests
+# scripts/scrape_drinkware.py
+"""
+Async, incremental fetcher for the ZUS Shopify catalogue.
+
+Collections come from /collections.json (or --collections). Each
+collection's /collections/<handle>/products.json is paged with `limit=250`
+until a short page. Collections are fetched concurrently, at most
+--concurrency requests at a time.
+
+Every page request is conditional. The previous run's ETag and
+Last-Modified go out as If-None-Match / If-Modified-Since, and a
+304 Not Modified reuses the products that page had last time, so a nightly
+refresh only downloads pages that changed.
+
+Products are de-duplicated by Shopify ID (one product can be in several
+collections) and streamed to `CatalogWriter` as they arrive. The writer
+appends one JSON line per product to data/zus_products.jsonl. That line
+keeps the variants, prices and updated_at. On close, the writer rewrites
+data/zus_drinkware.csv (id, title, plain-text content) for
+`python -m ingest.build_snapshot`. CSV ids stay stable per Shopify ID
+across runs.
+
+Usage:
+    python -m scripts.scrape_drinkware
+    python -m scripts.scrape_drinkware --collections tumbler,mugs --concurrency 8
+    python -m scripts.scrape_drinkware --base-url http://127.0.0.1:9200
+"""
+import os
 import csv
-import re
+import json
+import asyncio
+import argparse
+import logging
+from html.parser import HTMLParser
 from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+target = Path(__file__).resolve().parent.parent / 'data'
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+
+BASE_URL = "https://shop.zuscoffee.com"
+CSV_PATH = target / "zus_drinkware.csv"
+CATALOG_PATH = target / "zus_products.jsonl"
+STATE_PATH = target / "zus_products.state.json"
+PAGE_LIMIT = 250
+BLOCK_TAGS = {"p", "div", "br", "li", "ul", "ol", "tr", "h1", "h2", "h3", "h4", "h5", "h6", "table"}
+
+
+class _TextExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ("script", "style"):
+            self._skip += 1
+        elif tag in BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in ("script", "style"):
+            self._skip = max(0, self._skip - 1)
+        elif tag in BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self._skip:
+            self.parts.append(data)
+
+
+def html_to_text(html: str) -> str:
+    """Plain text of a product description: entities decoded, one line per block, spaces collapsed."""
+    parser = _TextExtractor()
+    parser.feed(html or "")
+    parser.close()
+    lines = (" ".join(line.split()) for line in "".join(parser.parts).splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def product_record(product: Dict, base_url: str) -> Dict:
+    """The catalogue fields we keep from a Shopify products.json entry."""
+    variants = [
+        {
+            "id": v.get("id"), "title": v.get("title"), "sku": v.get("sku"),
+            "price": v.get("price"), "compare_at_price": v.get("compare_at_price"),
+            "available": v.get("available"),
+        }
+        for v in product.get("variants", [])
+    ]
+    prices = [float(v["price"]) for v in variants if v.get("price") not in (None, "")]
+    return {
+        "shopify_id": product["id"],
+        "handle": product.get("handle"),
+        "title": (product.get("title") or "").strip(),
+        "content": html_to_text(product.get("body_html") or ""),
+        "vendor": product.get("vendor"),
+        "product_type": product.get("product_type"),
+        "tags": product.get("tags"),
+        "updated_at": product.get("updated_at"),
+        "price_min": min(prices, default=None),
+        "price_max": max(prices, default=None),
+        "variants": variants,
+        "url": f"{base_url}/products/{product.get('handle')}",
+    }
+
+
+class CatalogWriter:
+    """
+    Streams product records to a JSON-lines catalogue (via a temp file
+    swapped in on close) and then writes the id/title/content CSV.
+    `ids` maps Shopify ID -> CSV id from the last run. Without one,
+    `title_ids` (from the existing CSV) keeps ids by title, so row ids such
+    as `drinkware:3` survive the first run. New products get the next free id.
+    """
+
+    def __init__(self, catalog_path: Path, csv_path: Path, ids: Dict[str, int],
+                 title_ids: Optional[Dict[str, int]] = None):
+        self.catalog_path = catalog_path
+        self.csv_path = csv_path
+        self.ids = dict(ids)
+        self.title_ids = {} if ids else dict(title_ids or {})
+        self.written: List[Tuple[int, str, str]] = []
+        self._next_id = max([*self.ids.values(), *self.title_ids.values()], default=0) + 1
+        self._tmp = catalog_path.with_name(catalog_path.name + ".tmp")
+        catalog_path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self._tmp, "w", encoding="utf-8")
+
+    def write(self, record: Dict):
+        key = str(record["shopify_id"])
+        if key not in self.ids:
+            if record["title"] in self.title_ids:
+                self.ids[key] = self.title_ids.pop(record["title"])
+            else:
+                self.ids[key] = self._next_id
+                self._next_id += 1
+        self._file.write(json.dumps({"id": self.ids[key], **record}, ensure_ascii=False) + "\n")
+        self.written.append((self.ids[key], record["title"], record["content"]))
+
+    def close(self):
+        self._file.close()
+        os.replace(self._tmp, self.catalog_path)
+        with open(self.csv_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["id", "title", "content"])
+            writer.writerows(sorted(self.written))
+
+    def abort(self):
+        self._file.close()
+        os.remove(self._tmp)
+
+
+def csv_title_ids(csv_path: Path) -> Dict[str, int]:
+    if not csv_path.exists():
+        return {}
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        return {row["title"].strip(): int(row["id"]) for row in csv.DictReader(f)}
+
+
+def load_previous(state_path: Path, catalog_path: Path) -> Tuple[Dict, Dict[str, Dict]]:
+    """Last run's state (page validators, product ids per page, CSV ids) and catalogue records by Shopify ID."""
+    try:
+        with open(state_path, encoding="utf-8") as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        state = {}
+    state.setdefault("pages", {})
+    state.setdefault("ids", {})
+    records: Dict[str, Dict] = {}
+    if catalog_path.exists():
+        with open(catalog_path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    record.pop("id", None)
+                    records[str(record["shopify_id"])] = record
+    return state, records
+
+
+class CatalogFetcher:
+    """Conditional, concurrent page fetches against one Shopify storefront."""
+
+    def __init__(self, session, base_url: str, state: Dict, records: Dict[str, Dict], concurrency: int):
+        self.session = session
+        self.base_url = base_url.rstrip("/")
+        self.old_pages: Dict[str, Dict] = state["pages"]
+        self.records = records
+        self.pages: Dict[str, Dict] = {}
+        self.slots = asyncio.Semaphore(concurrency)
+        self.stats = {"requests": 0, "downloaded": 0, "not_modified": 0, "bytes": 0}
+
+    async def get_json(self, url: str) -> Tuple[Optional[Dict], Dict]:
+        """(body or None on 304, validators) for a conditional GET of `url`."""
+        old = self.old_pages.get(url, {})
+        headers = {}
+        if old.get("etag"):
+            headers["If-None-Match"] = old["etag"]
+        if old.get("last_modified"):
+            headers["If-Modified-Since"] = old["last_modified"]
+        async with self.slots, self.session.get(url, headers=headers) as resp:
+            self.stats["requests"] += 1
+            if resp.status == 304:
+                self.stats["not_modified"] += 1
+                return None, old
+            resp.raise_for_status()
+            body = await resp.read()
+            self.stats["downloaded"] += 1
+            self.stats["bytes"] += len(body)
+            validators = {"etag": resp.headers.get("ETag"), "last_modified": resp.headers.get("Last-Modified")}
+            return json.loads(body), validators
+
+    async def collections(self) -> List[str]:
+        handles: List[str] = []
+        page = 1
+        while True:
+            url = f"{self.base_url}/collections.json?limit={PAGE_LIMIT}&page={page}"
+            body, validators = await self.get_json(url)
+            if body is None:
+                found = self.old_pages[url]["handles"]
+            else:
+                found = [c["handle"] for c in body.get("collections", [])]
+            self.pages[url] = {**validators, "handles": found}
+            # A storefront that ignores `page` repeats itself instead of running out
+            if len(found) < PAGE_LIMIT or found[0] in handles:
+                return handles + [h for h in found if h not in handles]
+            handles.extend(found)
+            page += 1
+
+    async def products(self, handle: str, emit):
+        """Page through one collection, calling `emit(record)` for each product (cached on 304)."""
+        page, previous = 1, None
+        while True:
+            url = f"{self.base_url}/collections/{handle}/products.json?limit={PAGE_LIMIT}&page={page}"
+            body, validators = await self.get_json(url)
+            if body is None and all(str(pid) in self.records for pid in self.old_pages[url]["products"]):
+                records = [self.records[str(pid)] for pid in self.old_pages[url]["products"]]
+            else:
+                if body is None:
+                    # Validators survived but the cached records didn't: fetch unconditionally
+                    self.old_pages.pop(url)
+                    continue
+                records = [product_record(p, self.base_url) for p in body.get("products", [])]
+            ids = [r["shopify_id"] for r in records]
+            if ids and ids == previous:
+                return
+            self.pages[url] = {**validators, "products": ids}
+            for record in records:
+                emit(record)
+            if len(records) < PAGE_LIMIT:
+                return
+            page, previous = page + 1, ids
+
 
-# 1. Point this at your actual collection JSON
-JSON_URL = "https://shop.zuscoffee.com/collections/tumbler/products.json?limit=250"
-CSV_PATH = Path("data/zus_drinkware.csv")  # or tumbler.csv
+async def scrape(base_url: str = BASE_URL, collections: Optional[List[str]] = None, concurrency: int = 4,
+                 csv_path: Path = CSV_PATH, catalog_path: Path = CATALOG_PATH,
+                 state_path: Path = STATE_PATH) -> Dict:
+    """Fetch the catalogue, stream it to the writer and save the new state; returns run stats."""
+    import aiohttp
 
-# 2. Fetch the JSON
-resp = requests.get(JSON_URL, timeout=10)
-resp.raise_for_status()
-data = resp.json()
+    state, records = load_previous(state_path, catalog_path)
+    writer = CatalogWriter(catalog_path, csv_path, state["ids"], csv_title_ids(csv_path))
+    seen = set()
+    updated = 0
 
-products = data.get("products", [])
-if not products:
-    print("⚠️  No products returned. Check that JSON_URL is correct.")
-    exit(1)
+    def emit(record: Dict):
+        nonlocal updated
+        key = str(record["shopify_id"])
+        if key not in seen:
+            seen.add(key)
+            updated += records.get(key, {}).get("updated_at") != record["updated_at"]
+            writer.write(record)
 
-# 3. Write CSV
-CSV_PATH.parent.mkdir(exist_ok=True, parents=True)
-with open(CSV_PATH, "w", newline="", encoding="utf-8") as f:
-    writer = csv.writer(f)
-    writer.writerow(["id", "title", "content"])
-    for i, p in enumerate(products, start=1):
-        title = p.get("title", "").strip()
-        body_html = p.get("body_html", "")
-        # Strip HTML tags
-        text = re.sub(r"<[^>]+>", "", body_html).strip()
-        writer.writerow([i, title, text])
+    try:
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30)) as session:
+            fetcher = CatalogFetcher(session, base_url, state, records, concurrency)
+            handles = collections or await fetcher.collections()
+            logging.info(f"→ {len(handles)} collections")
+            await asyncio.gather(*(fetcher.products(handle, emit) for handle in handles))
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close()
 
-print(f"✅ Exported {len(products)} items to {CSV_PATH}")
+    with open(state_path, "w", encoding="utf-8") as f:
+        json.dump({"pages": fetcher.pages, "ids": writer.ids}, f)
+    summary = {**fetcher.stats, "collections": len(handles), "products": len(seen),
+               "new_or_updated": updated, "removed": len(set(records) - seen)}
+    logging.info(f"✅ {summary}")
+    return summary
 
 
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Incrementally fetch the ZUS Shopify catalogue.")
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--collections", help="Comma list of collection handles (default: all)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent requests")
+    parser.add_argument("--csv", default=str(CSV_PATH))
+    parser.add_argument("--catalog", default=str(CATALOG_PATH))
+    parser.add_argument("--state", default=str(STATE_PATH))
+    args = parser.parse_args()
+    handles = [h.strip() for h in args.collections.split(",") if h.strip()] if args.collections else None
+    asyncio.run(scrape(args.base_url, handles, args.concurrency, Path(args.csv), Path(args.catalog), Path(args.state)))
@@ -1,10 +1,44 @@
 #!/usr/bin/env python3
 # scripts/scrape_zus_outlets.py
+"""
+Incremental, concurrent scraper for the ZUS outlet listing.
 
+Page 1 is fetched first to read the page count from its pagination links.
+The remaining pages are then fetched concurrently:
+
+    playwright  (default) a pool of --concurrency browser contexts on one
+                Chromium. Images, fonts, stylesheets and media are blocked,
+                so only the HTML and scripts load.
+    http        plain aiohttp GETs, for server-rendered pages and tests
+
+Each page's outlet grid is hashed, and the hashes are kept in a state file
+next to the CSV. A page whose hash hasn't changed is not parsed again; its
+outlets carry over from the last run. The outlets are diffed by key
+(`outlet_keys`: the name, numbered when several outlets share one) against
+the previous run (or, on the first run, against the existing CSV):
+
+    added    new outlet, given the next free id
+    changed  same outlet, different fields (keeps its id)
+    removed  no longer listed. Only decided when every page was fetched, so
+             a failed page never looks like a closure.
+
+The changes are written as JSON lines (`{"op": ..., "outlet": {...}}`) for
+`python -m ingest.outlets_ingest --changes`. The CSV is rewritten only when
+something changed.
+
+Usage:
+    python -m scripts.scrape_zus_outlets
+    python -m scripts.scrape_zus_outlets --fetcher http --base-url http://127.0.0.1:8000/page/{}/
+"""
+import json
 import asyncio
 import csv
+import hashlib
+import argparse
+from html.parser import HTMLParser
 from pathlib import Path
-from playwright.async_api import async_playwright
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
 import logging
 
 # Configure logging
@@ -13,60 +47,334 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(me
 
 BASE_URL = "https://zuscoffee.com/category/store/kuala-lumpur-selangor/page/{}/"
 CSV_PATH = target / "zus_outlets.csv"
+STATE_PATH = target / "zus_outlets.state.json"
+CHANGES_PATH = target / "zus_outlets.changes.jsonl"
+MAX_PAGES = 22
+CARD_SELECTOR = "article.elementor-post.elementor-grid-item"
+BLOCKED_RESOURCES = {"image", "font", "stylesheet", "media"}
+FIELDS = ['id', 'name', 'location', 'address', 'opening_time', 'closing_time', 'dine_in', 'delivery', 'pickup']
 
 def ensure_data_dir():
     target.mkdir(parents=True, exist_ok=True)
 
-async def scrape():
+
+class OutletPageParser(HTMLParser):
+    """
+    Collects outlet cards (name, location), the raw markup of the card grid
+    (for hashing) and the highest page number linked from the pagination
+    (None if the page has no pagination links).
+    """
+    VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "wbr"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.cards: List[Dict[str, str]] = []
+        self.last_page: Optional[int] = None
+        self._grid: List[str] = []
+        self._depth = 0           # open tags inside the current <article>, 0 outside
+        self._field: Optional[str] = None
+        self._field_depth = 0
+        self._location_depth = 0
+        self._in_page_link = False
+
+    @property
+    def grid_markup(self) -> str:
+        return "".join(self._grid)
+
+    def handle_startendtag(self, tag, attrs):
+        if self._depth:
+            self._grid.append(self.get_starttag_text() or "")
+
+    def handle_starttag(self, tag, attrs):
+        classes = set((dict(attrs).get("class") or "").split())
+        if self._depth:
+            self._grid.append(self.get_starttag_text() or "")
+            if tag in self.VOID_TAGS:
+                return
+            self._depth += 1
+            if tag == "p" and "elementor-heading-title" in classes:
+                self._field, self._field_depth = "name", self._depth
+            elif tag == "div" and "location" in classes:
+                self._location_depth = self._depth
+            elif tag == "a" and self._location_depth:
+                self._field, self._field_depth = "location", self._depth
+        elif tag == "article" and {"elementor-post", "elementor-grid-item"} <= classes:
+            self._depth = 1
+            self._grid.append(self.get_starttag_text() or "")
+            self.cards.append({"name": "", "location": ""})
+        elif tag == "a" and "page-numbers" in classes:
+            self._in_page_link = True
+
+    def handle_endtag(self, tag):
+        if self._depth:
+            self._grid.append(f"</{tag}>")
+            if self._depth == self._field_depth:
+                self._field = None
+            if self._depth == self._location_depth:
+                self._location_depth = 0
+            self._depth -= 1
+        elif tag == "a":
+            self._in_page_link = False
+
+    def handle_data(self, data):
+        if self._depth:
+            self._grid.append(data)
+            if self._field:
+                self.cards[-1][self._field] += data
+        elif self._in_page_link and data.strip().replace(",", "").isdigit():
+            self.last_page = max(self.last_page or 1, int(data.strip().replace(",", "")))
+
+
+def parse_page(html: str) -> Tuple[List[Dict[str, str]], str, Optional[int]]:
+    """(outlets, grid content hash, last linked page number or None) for one listing page."""
+    parser = OutletPageParser()
+    parser.feed(html)
+    parser.close()
+    outlets = [
+        {"name": " ".join(card["name"].split()), "location": " ".join(card["location"].split()) or "Unknown"}
+        for card in parser.cards
+    ]
+    digest = hashlib.sha256(parser.grid_markup.encode("utf-8")).hexdigest()
+    return outlets, digest, parser.last_page
+
+
+def outlet_record(outlet: Dict[str, str]) -> Dict:
+    # The listing only shows name and location; the rest are the defaults the CSV has always had
+    return {
+        "name": outlet["name"], "location": outlet["location"], "address": "",
+        "opening_time": "08:00", "closing_time": "22:00", "dine_in": 0, "delivery": 0, "pickup": 0,
+    }
+
+
+def outlet_keys(outlets: Iterable[Dict]) -> List[str]:
+    """
+    Keys in listing (or CSV id) order: the outlet's name, then "<name> #2",
+    "<name> #3"... for later outlets listed under the same name. The
+    listing shows no address, so same-named outlets (e.g. two "BINJAI 8
+    PREMIUM SOHO" cards) can only be told apart by their order.
+    """
+    seen: Counter = Counter()
+    keys = []
+    for outlet in outlets:
+        seen[outlet["name"]] += 1
+        count = seen[outlet["name"]]
+        keys.append(outlet["name"] if count == 1 else f"{outlet['name']} #{count}")
+    return keys
+
+
+class HttpFetcher:
+    """aiohttp GETs, at most `concurrency` at a time; 404 means past the last page."""
+
+    def __init__(self, concurrency: int = 4, timeout: float = 20.0):
+        self.concurrency = concurrency
+        self.timeout = timeout
+
+    async def __aenter__(self):
+        import aiohttp
+
+        self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+        self._slots = asyncio.Semaphore(self.concurrency)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._session.close()
+
+    async def fetch(self, url: str) -> Optional[str]:
+        async with self._slots, self._session.get(url) as resp:
+            if resp.status == 404:
+                return None
+            resp.raise_for_status()
+            return await resp.text()
+
+
+class PlaywrightFetcher:
+    """A pool of `contexts` browser contexts on one Chromium, with heavy resources blocked."""
+
+    def __init__(self, contexts: int = 4, timeout_ms: int = 10000):
+        self.size = contexts
+        self.timeout_ms = timeout_ms
+
+    async def __aenter__(self):
+        from playwright.async_api import async_playwright
+
+        self._playwright = await async_playwright().start()
+        self._browser = await self._playwright.chromium.launch(headless=True)
+        self._pool: asyncio.Queue = asyncio.Queue()
+        for _ in range(self.size):
+            context = await self._browser.new_context()
+            await context.route("**/*", self._route)
+            self._pool.put_nowait(context)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._browser.close()
+        await self._playwright.stop()
+
+    @staticmethod
+    async def _route(route):
+        if route.request.resource_type in BLOCKED_RESOURCES:
+            await route.abort()
+        else:
+            await route.continue_()
+
+    async def fetch(self, url: str) -> Optional[str]:
+        context = await self._pool.get()
+        page = await context.new_page()
+        try:
+            response = await page.goto(url)
+            if response is not None and response.status == 404:
+                return None
+            try:
+                await page.wait_for_selector(CARD_SELECTOR, timeout=self.timeout_ms)
+            except Exception:
+                logging.warning(f"✖ No outlet articles rendered on {url}")
+            return await page.content()
+        finally:
+            await page.close()
+            self._pool.put_nowait(context)
+
+
+def load_state(path: Path, csv_path: Path) -> Dict:
+    """Last run's page hashes and outlets; without a state file, outlets (and ids) come from the CSV."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        pass
+    records: List[Dict] = []
+    if csv_path.exists():
+        with open(csv_path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                record = {field: row[field] for field in FIELDS}
+                for field in ("id", "dine_in", "delivery", "pickup"):
+                    record[field] = int(record[field] or 0)
+                records.append(record)
+    records.sort(key=lambda record: record["id"])
+    return {"pages": {}, "outlets": dict(zip(outlet_keys(records), records))}
+
+
+def diff_outlets(previous: Dict[str, Dict], current: List[Dict], complete: bool) -> Tuple[Dict[str, Dict], List[Dict]]:
+    """
+    Assign ids and diff `current` (in listing order) against `previous`
+    (key -> record with id). Returns the new key -> record map and the
+    change list. When the crawl is incomplete, unseen outlets are kept, not removed.
+    """
+    next_id = max((record["id"] for record in previous.values()), default=0) + 1
+    outlets: Dict[str, Dict] = {}
+    changes: List[Dict] = []
+    for key, outlet in zip(outlet_keys(current), current):
+        old = previous.get(key)
+        if old is None:
+            record = {"id": next_id, **outlet}
+            next_id += 1
+            changes.append({"op": "added", "outlet": record})
+        else:
+            record = {"id": old["id"], **outlet}
+            if record != old:
+                changes.append({"op": "changed", "outlet": record})
+        outlets[key] = record
+    for key, old in previous.items():
+        if key not in outlets:
+            if complete:
+                changes.append({"op": "removed", "outlet": old})
+            else:
+                outlets[key] = old
+    return outlets, changes
+
+
+async def scrape(fetcher, base_url: str = BASE_URL, state_path: Path = STATE_PATH,
+                 csv_path: Path = CSV_PATH, changes_path: Path = CHANGES_PATH,
+                 max_pages: int = MAX_PAGES) -> Dict:
+    """Crawl every listing page, write changes/CSV/state and return a run summary."""
+    state = load_state(state_path, csv_path)
+    pages: Dict[str, Dict] = state.get("pages", {})
+    stats = {"fetched": 0, "unchanged": 0, "missing": 0, "failed": 0}
+
+    async def fetch_page(num: int) -> Tuple[str, Optional[str]]:
+        """("ok", html), ("missing", None) past the last page, or ("failed", None)."""
+        url = base_url.format(num)
+        try:
+            html = await fetcher.fetch(url)
+        except Exception as e:
+            logging.error(f"✖ Page {num}: {e}")
+            stats["failed"] += 1
+            return "failed", None
+        if html is None:
+            stats["missing"] += 1
+            return "missing", None
+        stats["fetched"] += 1
+        return "ok", html
+
+    status, first = await fetch_page(1)
+    if first is None:
+        raise RuntimeError(f"Could not fetch the first listing page {base_url.format(1)}")
+    # Without pagination links, try every page up to max_pages; 404s mark the end
+    last_page = parse_page(first)[2] or max_pages
+    nums = list(range(1, min(last_page, max_pages) + 1))
+    logging.info(f"→ {len(nums)} pages, fetching {len(nums) - 1} concurrently")
+    fetched = [(status, first)] + await asyncio.gather(*(fetch_page(num) for num in nums[1:]))
+
+    new_pages: Dict[str, Dict] = {}
+    listed: List[Dict] = []
+    for num, (status, html) in zip(nums, fetched):
+        key = str(num)
+        previous = pages.get(key)
+        if status == "missing":
+            continue
+        if status == "ok":
+            outlets, digest, _ = parse_page(html)
+            if previous and previous["outlets"] and not outlets:
+                # A page that listed outlets rendering none is a scrape failure, not mass closure
+                logging.warning(f"✖ Page {num} had {len(previous['outlets'])} outlets and now has none")
+                stats["failed"] += 1
+                status = "failed"
+            elif previous and previous["hash"] == digest:
+                stats["unchanged"] += 1
+                new_pages[key] = previous
+            else:
+                new_pages[key] = {"hash": digest, "outlets": [outlet_record(o) for o in outlets]}
+        if status == "failed":
+            if previous is None:
+                continue
+            new_pages[key] = previous  # keep last run's view of a page that failed
+        listed.extend(new_pages[key]["outlets"])
+
+    complete = stats["failed"] == 0
+    outlets, changes = diff_outlets(state.get("outlets", {}), listed, complete)
+
     ensure_data_dir()
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        page = await browser.new_page()
-
-        with open(CSV_PATH, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                'id', 'name', 'location', 'address',
-                'opening_time', 'closing_time',
-                'dine_in', 'delivery', 'pickup'
-            ])
-
-            outlet_id = 1
-            for page_num in range(1, 23):  # pages 1–22
-                url = BASE_URL.format(page_num)
-                logging.info(f"→ Page {page_num}: {url}")
-                await page.goto(url)
-                # Wait for rendered items
-                try:
-                    await page.wait_for_selector("article.elementor-post.elementor-grid-item", timeout=10000)
-                except Exception:
-                    logging.error(f"✖ No outlet articles found on page {page_num}")
-                    break
-
-                cards = await page.query_selector_all("article.elementor-post.elementor-grid-item")
-                logging.info(f"  • Found {len(cards)} cards")
-
-                for card in cards:
-                    # Name
-                    name_el = await card.query_selector("p.elementor-heading-title.elementor-size-default")
-                    name = (await name_el.inner_text()).strip() if name_el else ""
-                    # Location
-                    loc_el = await card.query_selector("div.location h2 a")
-                    location = (await loc_el.inner_text()).strip() if loc_el else "Unknown"
-                    # Defaults
-                    address = ""
-                    opening_time, closing_time = "08:00", "22:00"
-                    dine_in = delivery = pickup = 0
-
-                    writer.writerow([
-                        outlet_id, name, location, address,
-                        opening_time, closing_time,
-                        dine_in, delivery, pickup
-                    ])
-                    outlet_id += 1
-
-        await browser.close()
-        logging.info(f"✅ Scraped {outlet_id - 1} outlets into {CSV_PATH}")
+    with open(changes_path, "w", encoding="utf-8") as f:
+        for change in changes:
+            f.write(json.dumps(change, ensure_ascii=False) + "\n")
+    if changes or not csv_path.exists():
+        with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDS)
+            writer.writeheader()
+            writer.writerows(sorted(outlets.values(), key=lambda record: record["id"]))
+    with open(state_path, "w", encoding="utf-8") as f:
+        json.dump({"pages": new_pages, "outlets": outlets}, f, ensure_ascii=False)
+
+    summary = {
+        **stats, "pages": len(nums), "outlets": len(outlets), "complete": complete,
+        **{op: sum(change["op"] == op for change in changes) for op in ("added", "changed", "removed")},
+    }
+    logging.info(f"✅ {summary}")
+    return summary
+
+
+async def main(args):
+    fetcher = HttpFetcher(args.concurrency) if args.fetcher == "http" else PlaywrightFetcher(args.concurrency)
+    async with fetcher:
+        await scrape(fetcher, args.base_url, Path(args.state), Path(args.csv), Path(args.changes), args.max_pages)
+
 
 if __name__ == '__main__':
-    asyncio.run(scrape())
+    parser = argparse.ArgumentParser(description="Incrementally scrape the ZUS outlet listing.")
+    parser.add_argument("--fetcher", choices=["playwright", "http"], default="playwright")
+    parser.add_argument("--concurrency", type=int, default=4, help="Browser contexts (or HTTP requests) in parallel")
+    parser.add_argument("--base-url", default=BASE_URL, help="Listing URL with {} for the page number")
+    parser.add_argument("--max-pages", type=int, default=MAX_PAGES)
+    parser.add_argument("--csv", default=str(CSV_PATH))
+    parser.add_argument("--state", default=str(STATE_PATH))
+    parser.add_argument("--changes", default=str(CHANGES_PATH))
+    asyncio.run(main(parser.parse_args()))
@@ -24,6 +24,12 @@ class ZUSChatBot {
             }
         });
         
+        // One WebSocket per conversation; POST /rag/query is the fallback
+        this.socket = null;
+        this.turns = [];
+        this.reconnectDelay = 1000;
+        this.connect();
+        
         // Auto-focus input
         this.messageInput.focus();
         
@@ -31,6 +37,75 @@ class ZUSChatBot {
         this.scrollToBottom();
     }
     
+    connect() {
+        if (!('WebSocket' in window)) return;
+        const scheme = window.location.protocol === 'https:' ? 'wss' : 'ws';
+        const socket = new WebSocket(`${scheme}://${window.location.host}/ws/chat`);
+        
+        socket.addEventListener('open', () => {
+            this.socket = socket;
+            this.reconnectDelay = 1000;
+        });
+        socket.addEventListener('message', (event) => this.handleFrame(JSON.parse(event.data)));
+        socket.addEventListener('close', () => {
+            this.socket = null;
+            // Turns in flight are lost with the socket
+            this.turns.splice(0).forEach(turn => turn.reject(new Error('connection closed')));
+            setTimeout(() => this.connect(), this.reconnectDelay);
+            this.reconnectDelay = Math.min(this.reconnectDelay * 2, 30000);
+        });
+    }
+    
+    handleFrame(frame) {
+        if (frame.type === 'ping') {
+            this.socket.send(JSON.stringify({ type: 'pong' }));
+            return;
+        }
+        // Turns are answered in the order they were sent
+        const turn = this.turns[0];
+        if (!turn || frame.type === 'pong') return;
+        if (frame.type === 'delta') {
+            turn.text += frame.text;
+            if (!turn.element) {
+                this.setLoading(false);
+                turn.element = this.addMessage(turn.text, 'bot');
+            } else {
+                turn.element.querySelector('p').innerHTML = this.formatMessage(turn.text);
+            }
+        } else if (frame.type === 'done') {
+            this.turns.shift();
+            if (turn.element) turn.element.remove();
+            turn.resolve({ answer: frame.response, sources: frame.sources });
+        } else if (frame.type === 'error') {
+            this.turns.shift();
+            if (turn.element) turn.element.remove();
+            turn.reject(new Error(frame.detail));
+        }
+    }
+    
+    askOverSocket(message) {
+        return new Promise((resolve, reject) => {
+            this.turns.push({ text: '', element: null, resolve, reject });
+            this.socket.send(JSON.stringify({ type: 'message', content: message }));
+        });
+    }
+    
+    async askOverHttp(message) {
+        const response = await fetch('/rag/query', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({ query: message })
+        });
+        
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+        }
+        
+        return response.json();
+    }
+    
     async sendMessage() {
         const message = this.messageInput.value.trim();
         if (!message) return;
@@ -44,19 +119,9 @@ class ZUSChatBot {
         
         try {
             // Send to API
-            const response = await fetch('/rag/query', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify({ query: message })
-            });
-            
-            if (!response.ok) {
-                throw new Error(`HTTP ${response.status}: ${response.statusText}`);
-            }
-            
-            const data = await response.json();
+            const data = this.socket && this.socket.readyState === WebSocket.OPEN
+                ? await this.askOverSocket(message)
+                : await this.askOverHttp(message);
             
             // Add bot response
             this.addMessage(data.answer, 'bot', data.sources);
@@ -111,6 +176,7 @@ class ZUSChatBot {
         
         this.chatMessages.appendChild(messageDiv);
         this.scrollToBottom();
+        return messageDiv;
     }
     
     formatMessage(message) {
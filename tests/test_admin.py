@@ -0,0 +1,89 @@
+import threading
+import tracemalloc
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import api.admin as admin
+from agent.memory import MemoryStore
+from api.calc_engine import evaluate
+
+AUTH = {"Authorization": "Bearer s3cret"}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", "s3cret")
+    app = FastAPI()
+    app.include_router(admin.router)
+    yield TestClient(app)
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+    admin._baseline = None
+
+
+def test_disabled_without_token(client, monkeypatch):
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", "")
+    assert client.get("/admin/memory", headers=AUTH).status_code == 404
+
+
+def test_requires_bearer_token(client):
+    assert client.get("/admin/caches").status_code == 401
+    assert client.get("/admin/caches", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    assert client.get("/admin/caches", headers=AUTH).status_code == 200
+
+
+def test_tracemalloc_top_and_diff(client):
+    assert client.get("/admin/memory/top", headers=AUTH).status_code == 409
+    assert client.post("/admin/memory/start", headers=AUTH).json()["tracemalloc"] is True
+
+    leak = [bytearray(1024) for _ in range(2000)]  # noqa: F841 - kept alive until the diff
+    top = client.get("/admin/memory/top", params={"limit": 5}, headers=AUTH).json()["top"]
+    growth = client.get("/admin/memory/diff", params={"limit": 5}, headers=AUTH).json()["growth"]
+    assert any(entry["where"].startswith("tests/test_admin.py:") for entry in top)
+    assert growth[0]["where"].startswith("tests/test_admin.py:")
+    assert growth[0]["size_diff_bytes"] >= 2000 * 1024
+
+    assert client.post("/admin/memory/stop", headers=AUTH).json()["tracemalloc"] is False
+
+
+def busy_loop(stop: threading.Event):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_cpu_profile_returns_collapsed_stacks(client):
+    stop = threading.Event()
+    worker = threading.Thread(target=busy_loop, args=(stop,), name="busy")
+    worker.start()
+    try:
+        response = client.get("/admin/profile/cpu", params={"seconds": 0.3, "hz": 200}, headers=AUTH)
+    finally:
+        stop.set()
+        worker.join()
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    lines = response.text.splitlines()
+    stack, count = lines[0].rsplit(" ", 1)
+    assert int(count) > 0 and " " not in stack
+    busy = [line for line in lines if line.startswith("busy;")]
+    assert busy and any("tests/test_admin.py:busy_loop" in line for line in busy)
+
+
+def test_cpu_profile_is_bounded(client):
+    assert client.get("/admin/profile/cpu", params={"seconds": 3600}, headers=AUTH).status_code == 422
+
+
+def test_cache_sizes_cover_loaded_modules(client):
+    evaluate("1 + 2")
+    caches = client.get("/admin/caches", headers=AUTH).json()["caches"]
+    assert caches["calc.compiled"]["entries"] >= 1
+    assert caches["calc.compiled"]["limit"] > 0
+
+
+def test_memory_store_stats():
+    store = MemoryStore(max_users=2)
+    store.get("a").add_user_message("hello")
+    store.get("b").add_bot_message("hi there")
+    assert store.stats() == {"entries": 2, "limit": 2, "messages": 2, "text_bytes": 13}
@@ -0,0 +1,85 @@
+import json
+import threading
+import time
+
+from api.batch import dedupe, error_lines, stream_results
+
+
+def _parse(lines):
+    return [json.loads(line) for line in lines]
+
+
+def test_dedupe_keeps_first_seen_order_and_every_position():
+    unique, positions = dedupe(["a", "b", "a", "c", "b"])
+    assert unique == ["a", "b", "c"]
+    assert positions == {"a": [0, 2], "b": [1, 4], "c": [3]}
+
+
+def test_stream_results_runs_each_distinct_key_once_and_fans_out():
+    calls = []
+    unique, positions = dedupe(["x", "y", "x"])
+
+    def work(key):
+        calls.append(key)
+        return {"answer": key.upper()}
+
+    results = sorted(_parse(stream_results(unique, positions, work)), key=lambda r: r["index"])
+    assert sorted(calls) == ["x", "y"]
+    assert results == [{"index": 0, "answer": "X"}, {"index": 1, "answer": "Y"}, {"index": 2, "answer": "X"}]
+
+
+def test_stream_results_yields_in_completion_order():
+    unique, positions = dedupe(["slow", "fast"])
+    work = lambda key: time.sleep(0.2 if key == "slow" else 0) or {"answer": key}
+    assert [r["index"] for r in _parse(stream_results(unique, positions, work))] == [1, 0]
+
+
+def test_stream_results_bounds_concurrency():
+    active, peak, lock = 0, 0, threading.Lock()
+
+    def work(key):
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        time.sleep(0.02)
+        with lock:
+            active -= 1
+        return {}
+
+    unique, positions = dedupe(range(12))
+    assert len(list(stream_results(unique, positions, work, max_concurrency=3))) == 12
+    assert peak <= 3
+
+
+def test_failures_become_error_lines():
+    unique, positions = dedupe(["ok", "bad"])
+
+    def work(key):
+        if key == "bad":
+            raise LookupError("nothing found")
+        return {"answer": "fine"}
+
+    results = {r["index"]: r for r in _parse(stream_results(unique, positions, work))}
+    assert results[0] == {"index": 0, "answer": "fine"}
+    assert results[1] == {"index": 1, "error": "LookupError: nothing found"}
+    assert _parse(error_lines(positions, RuntimeError("down"))) == [
+        {"index": 0, "error": "RuntimeError: down"}, {"index": 1, "error": "RuntimeError: down"},
+    ]
+
+
+def test_closing_the_stream_cancels_queued_work():
+    calls = []
+    unique, positions = dedupe(range(10))
+
+    def work(key):
+        calls.append(key)
+        time.sleep(0.05)
+        return {"answer": key}
+
+    lines = stream_results(unique, positions, work, max_concurrency=1)
+    assert json.loads(next(lines))["index"] == 0
+    lines.close()
+    time.sleep(0.2)
+    # Only the running generation may finish; the other eight never start
+    assert calls[0] == 0 and set(calls) <= {0, 1}
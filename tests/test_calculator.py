@@ -0,0 +1,58 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from agent.tools import CalculatorTool
+from api import calc_engine
+from api.calc_engine import CalculationError, CalculationLimitError, compile_expression, evaluate, evaluate_many
+from api.calculator import router
+
+
+@pytest.mark.parametrize("expression, expected", [
+    ("2+2*3", 8), ("(1+2)*(3+4)/5", 4.2), ("-7 + 3**2", 2), ("100/8 - 3", 9.5), ("2**-1", 0.5),
+])
+def test_evaluate_matches_python_arithmetic(expression, expected):
+    assert evaluate(expression) == expected
+
+
+@pytest.mark.parametrize("expression, limit", [
+    ("9**9**9", True), ("2**100000000", True), ("-" * 200 + "1", True), ("1e308*10", True),
+    ("1/0", False), ("(-8)**0.5", False), ("__import__('os')", False), ("True+1", False), ("", False),
+])
+def test_hostile_or_invalid_expressions_are_rejected(expression, limit):
+    with pytest.raises(CalculationLimitError if limit else CalculationError):
+        evaluate(expression)
+
+
+def test_vectorised_batch_matches_scalar_results(monkeypatch):
+    """Same-shape rows run through NumPy; overflowing or inexact rows fall back."""
+    expressions = [f"{a} * (1 + {b}) / {c}" for a in range(-3, 4) for b in (0.5, 2) for c in (0, 3)]
+    expressions += ["3**40"] * 10 + ["2**0.5"] * 10 + ["(-2)**0.5"] * 10 + ["10**200 * 10**200"] * 10
+    vectorised = evaluate_many(expressions)
+    monkeypatch.setattr(calc_engine, "CALC_VECTOR_MIN_GROUP", 10 ** 9)
+    assert vectorised == evaluate_many(expressions)
+    assert vectorised[0][1] == "Division by zero" and vectorised[-1][0] is None
+    assert 12157665459056928801 in [result for result, _ in vectorised]
+
+
+def test_compiled_programs_are_cached():
+    compile_expression.cache_clear()
+    evaluate("6*7")
+    evaluate(" 6*7 ".strip())
+    info = compile_expression.cache_info()
+    assert (info.hits, info.misses) == (1, 1)
+
+
+def test_calculator_endpoints_and_tool():
+    app = FastAPI()
+    app.include_router(router)
+    client = TestClient(app)
+    assert client.get("/calculate", params={"expression": "2+2*3"}).json()["result"] == 8.0
+    assert client.get("/calculate", params={"expression": "9**9**9"}).status_code == 400
+    body = client.post("/calculate/batch", json={"expressions": ["1+1", "1/0"]}).json()
+    assert body["results"] == [
+        {"expression": "1+1", "result": 2.0, "error": None},
+        {"expression": "1/0", "result": None, "error": "Division by zero"},
+    ]
+    with pytest.raises(ValueError, match="Error evaluating expression '9\\*\\*9\\*\\*9'"):
+        CalculatorTool().evaluate("9**9**9")
@@ -0,0 +1,62 @@
+import api.rerank as rerank_module
+from api.context import build_context, count_tokens, select_context, truncate_fields
+
+PASSAGES = [
+    "title: ZUS All Day Cup 500ml\ncontent: " + "Refreshed colours for your refreshments. " * 40,
+    "title: ZUS Frozee Cold Cup 650ml\ncontent: Keeps iced drinks cold.\nFeatures: double wall",
+    "title: ZUS OG Ceramic Mug\ncontent: Ceramic mug with an ergonomic handle.",
+]
+
+
+def test_truncate_fields_cuts_only_long_fields():
+    text = truncate_fields(PASSAGES[0], limit=20)
+    assert text.startswith("title: ZUS All Day Cup 500ml\ncontent: Refreshed")
+    assert text.endswith("…")
+    assert count_tokens(text) < count_tokens(PASSAGES[0]) / 5
+    # Short fields and short descriptions are left alone
+    assert truncate_fields(PASSAGES[1], limit=20) == PASSAGES[1]
+
+
+def test_build_context_respects_budget_and_order():
+    packed = build_context(PASSAGES, budget=60, field_tokens=30)
+    assert [position for position, _ in packed][0] == 0
+    assert sum(count_tokens(text) for _, text in packed) <= 60
+    # A passage too big for what's left is skipped, not the ones after it
+    assert build_context([PASSAGES[0], PASSAGES[2]], budget=40, field_tokens=1000)[0][0] == 0
+
+
+def test_select_context_reranks_lexically(monkeypatch):
+    monkeypatch.setattr(rerank_module, "_model", False)
+    positions = [position for position, _ in select_context("ceramic mug handle", PASSAGES, budget=1000)]
+    assert positions[0] == 2
+    assert sorted(positions) == [0, 1, 2]
+
+
+def test_cross_encoder_scores_are_batched_and_cached(monkeypatch):
+    calls = []
+
+    class FakeCrossEncoder:
+        def predict(self, pairs, batch_size, show_progress_bar):
+            calls.append(list(pairs))
+            return [float("cold" in passage) for _, passage in pairs]
+
+    monkeypatch.setattr(rerank_module, "_model", FakeCrossEncoder())
+    monkeypatch.setattr(rerank_module, "_scores", type(rerank_module._scores)())
+    assert rerank_module.rerank("cold cup", PASSAGES)[0][0] == 1
+    assert rerank_module.rerank("cold cup", PASSAGES)[0][0] == 1
+    assert len(calls) == 1 and len(calls[0]) == 3
+
+
+def test_requests_never_wait_for_the_cross_encoder(monkeypatch):
+    started = []
+    monkeypatch.setattr(rerank_module, "RERANK_MODEL", "cross-encoder/some-model")
+    monkeypatch.setattr(rerank_module, "_model", None)
+    monkeypatch.setattr(rerank_module, "_warm_up_started", False)
+    monkeypatch.setattr(rerank_module.threading, "Thread",
+                        lambda target, **kwargs: type("T", (), {"start": lambda self: started.append(target)})())
+    # Not loaded yet: the request reranks lexically and only kicks off the background load, once
+    assert rerank_module.get_cross_encoder() is None
+    assert rerank_module.get_cross_encoder() is None
+    assert started == [rerank_module.load_cross_encoder]
+    assert select_context("ceramic mug handle", PASSAGES, budget=1000)[0][0] == 2
+
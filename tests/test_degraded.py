@@ -0,0 +1,67 @@
+import pytest
+
+from agent.planner import heuristic_intent
+from agent.tools import templated_sql
+import api.products as products
+from api.degraded import DEGRADED_PREFIX, extractive_answer
+from api.keyword_index import BM25Index
+from api.upstream import UpstreamUnavailableError
+
+
+@pytest.mark.parametrize("text, intent, slots", [
+    ("What is 12 * (5 + 2)?", "calculate", {"expression": "12 * (5 + 2)"}),
+    ("hello there", "greeting", {}),
+    ("Where's the ZUS outlet in Petaling Jaya?", "find_outlet", {"location": "Petaling Jaya"}),
+    ("SS2 outlet opening hours?", "get_opening_hours", {"outlet": "SS2"}),
+    ("What's the weather like?", "unknown", {}),
+])
+def test_heuristic_intent_matches_llm_prompt_examples(text, intent, slots):
+    """The local parser covers the intents and slots the LLM prompt teaches."""
+    parsed = heuristic_intent(text)
+    assert parsed.intent == intent
+    assert parsed.slots == slots
+
+
+def test_templated_sql_builds_filters_and_aggregates():
+    """Keyword SQL handles place filters, opening times and counts."""
+    assert templated_sql("how many outlets open at 8") == (
+        "SELECT COUNT(*) AS count FROM outlets WHERE opening_time <= '08:00'"
+    )
+    sql = templated_sql("Which outlets in SS2 are open after 9pm?")
+    assert "LIKE '%ss2%'" in sql
+    assert "closing_time >= '21:00'" in sql
+    assert sql.endswith("LIMIT 50")
+
+
+def test_templated_sql_escapes_quotes():
+    """User text is embedded as an escaped literal, never as raw SQL."""
+    sql = templated_sql("outlets in O'Neil' OR name LIKE '")
+    assert "LIKE '%o''neil'' or name like ''%'" in sql
+
+
+def test_bm25_fallback_and_extractive_answer():
+    """Keyword fallback ranks with BM25 and answers with the rows."""
+    texts = ["ZUS All-Can Tumbler 600ml", "ZUS OG Cup 2.0 500ml", "Spectrum Shopping Mall outlet"]
+    assert [i for i, _ in BM25Index(texts).search("zus cup", k=2)] == [1, 0]
+    answer = extractive_answer([texts[1]])
+    assert answer.startswith(DEGRADED_PREFIX)
+    assert "OG Cup 2.0" in answer
+
+
+def test_products_fall_back_to_bm25_without_embeddings(monkeypatch):
+    """Product QA ranks by BM25 while embeddings are unavailable."""
+    meta = [
+        {"id": 1, "title": "ZUS All-Can Tumbler 600ml", "description": "Keeps drinks cold"},
+        {"id": 2, "title": "ZUS OG Cup 2.0 500ml", "description": "Leak-proof cup, screw-on lid"},
+        {"id": 3, "title": "Ceramic Mug", "description": "A mug for the desk"},
+    ]
+
+    def unavailable(text):
+        raise UpstreamUnavailableError("circuit open")
+
+    monkeypatch.setattr(products, "get_products_index", lambda: (None, meta))
+    monkeypatch.setattr(products, "_keyword_index", None)
+    monkeypatch.setattr(products, "embed_text", unavailable)
+    monkeypatch.setattr(products, "_embed_batch", unavailable)
+    assert [d["id"] for d in products.retrieve_docs("leak-proof cup", k=2)] == [2]
+    assert [[d["id"] for d in docs] for docs in products.retrieve_docs_many(["mug", "cold tumbler"])] == [[3], [1]]
@@ -0,0 +1,61 @@
+import os
+
+import numpy as np
+
+from api.documents import build_document, load_csv_documents, source_name
+from api.vector_index import PartitionedIndex
+
+
+def _outlet(i, location, dine_in):
+    row = {"id": str(i), "name": f"Outlet {i}", "location": location, "address": "",
+           "opening_time": "08:00", "closing_time": "22:00", "dine_in": dine_in, "delivery": "0", "pickup": "1"}
+    return build_document(row, "outlets", "data/zus_outlets.csv", i)
+
+
+def test_build_document_keeps_typed_fields_and_row_id():
+    doc = build_document({"id": "3", "title": "All-Can Tumbler", "content": "Keeps drinks cold"},
+                         source_name("data/zus_drinkware.csv"), "data/zus_drinkware.csv", 2)
+    assert doc.metadata["id"] == "drinkware:3"
+    assert doc.metadata["row_id"] == 3
+    assert doc.metadata["title"] == "All-Can Tumbler"
+    assert "content" not in doc.metadata
+    assert doc.page_content == "title: All-Can Tumbler\ncontent: Keeps drinks cold"
+
+    outlet = _outlet(7, "Penang", "1")
+    assert outlet.metadata["dine_in"] is True
+    assert outlet.metadata["pickup"] is True
+    assert "address" not in outlet.metadata
+
+
+def test_partitioned_index_filters_before_ranking():
+    """Filtered search returns the nearest rows among those that match, never others."""
+    docs = [build_document({"id": str(i), "title": f"Cup {i}"}, "drinkware", "d.csv", i) for i in range(6)]
+    docs += [_outlet(i, "Penang" if i % 2 else "Kuala Lumpur/Selangor", "1" if i % 3 == 0 else "0")
+             for i in range(6)]
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(len(docs), 8)).astype("float32")
+    index = PartitionedIndex(vectors, [d.metadata for d in docs])
+    assert set(index.partitions) == {"drinkware", "outlets"}
+
+    query = vectors[0]  # drinkware:0 is the nearest overall
+    assert index.search(query, 1) == [0]
+    in_outlets = index.search(query, 12, {"source": "outlets"})
+    assert sorted(in_outlets) == list(range(6, 12))
+    penang = index.search(query, 12, {"source": "outlets", "location": "penang"})
+    assert {docs[p].metadata["location"] for p in penang} == {"Penang"} and len(penang) == 3
+    dine_in = index.search(query, 12, {"dine_in": "yes"})
+    assert [docs[p].metadata["id"] for p in sorted(dine_in)] == ["outlets:0", "outlets:3"]
+    assert index.search(query, 4, {"source": "reviews"}) == []
+
+
+def test_load_csv_documents_is_memoized_per_mtime(tmp_path):
+    path = tmp_path / "zus_drinkware.csv"
+    path.write_text('id,title,content\n1,OG Cup,"Leak-proof, ceramic"\n\n2,Mug,Cozy\n', encoding="utf-8")
+    first = load_csv_documents(str(path))
+    assert [d.metadata["id"] for d in first] == ["drinkware:1", "drinkware:2"]
+    assert first[0].page_content == "title: OG Cup\ncontent: Leak-proof, ceramic"
+    assert load_csv_documents(str(path)) is first
+
+    path.write_text("id,title,content\n3,Tumbler,Cold\n", encoding="utf-8")
+    os.utime(path, ns=(1, 1))
+    assert [d.metadata["id"] for d in load_csv_documents(str(path))] == ["drinkware:3"]
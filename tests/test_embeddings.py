@@ -0,0 +1,72 @@
+import threading
+
+import numpy as np
+import pytest
+
+from api.microbatch import BatchedEmbeddings, MicroBatcher
+from api.onnx_embeddings import mean_pool
+
+
+def test_mean_pool_ignores_padding_and_normalises():
+    hidden = np.array([[[1.0, 0.0], [3.0, 0.0], [100.0, 100.0]]], dtype=np.float32)
+    pooled = mean_pool(hidden, np.array([[1, 1, 0]]), normalize=False)
+    assert pooled.tolist() == [[2.0, 0.0]]
+    assert np.allclose(np.linalg.norm(mean_pool(hidden, np.array([[1, 1, 1]])), axis=1), 1.0)
+
+
+def test_microbatcher_coalesces_concurrent_calls():
+    batches = []
+    release = threading.Event()
+
+    def double(items):
+        release.wait(1)
+        batches.append(len(items))
+        return [2 * item for item in items]
+
+    batcher = MicroBatcher(double, max_batch=8, max_wait_ms=50)
+    results = [None] * 16
+
+    def call(i):
+        results[i] = batcher.submit(i)
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(16)]
+    for thread in threads:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert results == [2 * i for i in range(16)]
+    assert sum(batches) == 16 and max(batches) <= 8 and len(batches) < 16
+
+
+def test_microbatcher_propagates_errors_to_every_caller():
+    def fail(items):
+        raise ValueError("model crashed")
+
+    batcher = MicroBatcher(fail, max_wait_ms=0)
+    with pytest.raises(ValueError, match="model crashed"):
+        batcher.submit("query")
+    # The worker survives a failed batch
+    batcher.fn = lambda items: [len(item) for item in items]
+    assert batcher.submit("abc") == 3
+
+
+def test_batched_embeddings_dedupes_and_guards_each_batch():
+    class CountingEmbeddings:
+        calls = []
+
+        def embed_documents(self, texts):
+            self.calls.append(list(texts))
+            return [[float(len(text))] for text in texts]
+
+    guarded = []
+
+    def guard(texts, call):
+        guarded.append(len(texts))
+        return call()
+
+    embeddings = BatchedEmbeddings(CountingEmbeddings(), guard=guard, max_wait_ms=50)
+    batch = embeddings.batcher.fn(["cup", "mug", "cup"])
+    assert batch == [[3.0], [3.0], [3.0]]
+    assert CountingEmbeddings.calls == [["cup", "mug"]] and guarded == [2]
+    assert embeddings.embed_query("tumbler") == [7.0]
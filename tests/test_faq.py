@@ -0,0 +1,110 @@
+import json
+import time
+import sqlite3
+
+import numpy as np
+import pytest
+
+from api import faq, logging_config, outlets
+from scripts.build_faq import build_entries, mine_queries, select_questions, vet
+
+
+@pytest.fixture
+def table(tmp_path, monkeypatch):
+    monkeypatch.setattr(faq, "current_version", lambda: "v1")
+    monkeypatch.setattr(outlets, "OUTLETS_DB_PATH", str(tmp_path / "outlets.db"))
+    path = str(tmp_path / "faq.json")
+    faq.write_table([
+        {"id": "faq:1", "question": "what is the og cup", "variants": ["tell me about the og cup"],
+         "count": 9, "answer": "The OG cup is a 500ml tumbler.", "sources": ["drinkware:1"]},
+        {"id": "faq:2", "question": "what are the opening hours for ss2", "variants": [],
+         "count": 4, "answer": "SS2 opens 8am to 10pm.", "sources": ["outlets:7"]},
+    ], "v1", path)
+    return path
+
+
+def test_signature_ignores_case_punctuation_filler_and_order():
+    assert faq.signature("What's the OG cup?") == faq.signature("the og cup, what is it")
+    assert faq.signature(faq.normalize_query("What's the OG cup?")) == faq.signature("What's the OG cup?")
+    assert faq.signature("Which outlets are open late?") != faq.signature("Which outlets are not open late?")
+
+
+def test_lookup_serves_every_phrasing_in_a_cluster(table):
+    assert faq.lookup("Tell me about the OG cup!", table)["id"] == "faq:1"
+    assert faq.lookup("What are the opening hours for SS2", table)["answer"] == "SS2 opens 8am to 10pm."
+    assert faq.lookup("Where is the SS2 outlet?", table) is None
+
+
+def test_lookup_is_fast(table):
+    faq.lookup("what is the og cup", table)
+    start = time.perf_counter()
+    for _ in range(100):
+        faq.lookup("What is the OG cup?", table)
+    assert (time.perf_counter() - start) / 100 < 0.005
+
+
+def test_snapshot_change_invalidates_the_table(table, monkeypatch):
+    monkeypatch.setattr(faq, "current_version", lambda: "v2")
+    assert faq.lookup("what is the og cup", table) is None
+
+
+def test_outlets_db_edit_invalidates_the_table(table, tmp_path):
+    assert faq.lookup("What are the opening hours for SS2?", table) is not None
+    with sqlite3.connect(tmp_path / "outlets.db") as conn:
+        conn.execute("CREATE TABLE outlets (id INTEGER PRIMARY KEY, name TEXT)")
+    assert faq.lookup("What are the opening hours for SS2?", table) is None
+
+    with open(table, encoding="utf-8") as f:
+        data = json.load(f)
+    faq.write_table(data["entries"], "v1", table, faq.outlets_version())
+    assert faq.lookup("What are the opening hours for SS2?", table)["id"] == "faq:2"
+
+
+def test_rewritten_table_is_reloaded(table):
+    assert faq.lookup("what is the og cup", table) is not None
+    with open(table, encoding="utf-8") as f:
+        data = json.load(f)
+    faq.write_table(data["entries"][1:], "v1", table)
+    assert faq.lookup("what is the og cup", table) is None
+
+
+def test_cluster_queries_groups_by_cosine_to_the_leader():
+    vectors = np.array([[1, 0], [0.99, 0.1], [0, 1], [0.1, 0.99], [0.7, 0.7]], dtype="float32")
+    assert faq.cluster_queries(vectors, 0.95) == [[0, 1], [2, 3], [4]]
+
+
+def test_mining_and_selection_keep_frequent_questions_and_seeds():
+    lines = [json.dumps({"msg": "RAG query answered", "query": q}) for q in
+             ["What is the OG cup?", "what is the og cup", "What is the OG cup", "rare question"]]
+    lines += ["not json", json.dumps({"msg": "unrelated"})]
+    counts = mine_queries(lines)
+    assert counts == {"what is the og cup": 3, "rare question": 1}
+    assert select_questions(counts, ["Opening hours?"], min_count=2, max_entries=10) == [
+        ("what is the og cup", 3), ("opening hours", 0),
+    ]
+
+
+def test_raw_queries_are_only_logged_when_opted_in(monkeypatch):
+    monkeypatch.setattr(logging_config, "LOG_QUERIES", False)
+    assert logging_config.query_fields("my address is 1 Jalan SS2") == {}
+    monkeypatch.setattr(logging_config, "LOG_QUERIES", True)
+    assert logging_config.query_fields("what is the og cup") == {"query": "what is the og cup"}
+
+
+def test_build_entries_answers_one_phrasing_per_cluster_and_vets():
+    questions = [("what is the og cup", 5), ("tell me about the og cup", 3), ("ss2 hours", 2), ("broken", 1)]
+    vectors = {"what is the og cup": [1, 0, 0], "tell me about the og cup": [0.98, 0.1, 0],
+               "ss2 hours": [0, 1, 0], "broken": [0, 0, 1]}
+    asked = []
+
+    def answer(leaders):
+        asked.extend(leaders)
+        return [{"answer": "A tumbler.", "sources": ["drinkware:1"]}, {"error": "UpstreamUnavailableError: down"},
+                {"answer": "", "sources": []}]
+
+    entries, rejected = build_entries(questions, lambda texts: np.array([vectors[t] for t in texts]), answer, 0.9)
+    assert asked == ["what is the og cup", "ss2 hours", "broken"]
+    assert entries == [{"id": "faq:1", "question": "what is the og cup", "variants": ["tell me about the og cup"],
+                        "count": 8, "answer": "A tumbler.", "sources": ["drinkware:1"]}]
+    assert [r["question"] for r in rejected] == ["ss2 hours", "broken"]
+    assert vet({"answer": faq.__name__, "sources": []}) == "no sources"
@@ -0,0 +1,112 @@
+import gzip
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from api.http_cache import CachedStaticFiles, asset_url, choose_encoding, etag_matches, install, render_index
+
+ROWS = [{"id": i, "name": f"Outlet {i}", "address": "Jalan SS 2/67, Petaling Jaya"} for i in range(100)]
+
+
+@pytest.fixture
+def client(tmp_path):
+    (tmp_path / "js").mkdir()
+    (tmp_path / "js" / "app.js").write_text("console.log('hello');\n" * 200)
+    (tmp_path / "index.html").write_text('<script src="/static/js/app.js"></script><img src="/static/missing.png">')
+
+    app = FastAPI()
+    app.mount("/static", CachedStaticFiles(directory=str(tmp_path)), name="static")
+    install(app, cache_control={"/outlets": "public, max-age=60"})
+
+    @app.get("/outlets")
+    def outlets():
+        return ROWS
+
+    @app.get("/small")
+    def small():
+        return {"ok": True}
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse((json.dumps(row) + "\n" for row in ROWS), media_type="application/x-ndjson")
+
+    return TestClient(app), tmp_path
+
+
+def test_choose_encoding_follows_q_values():
+    assert choose_encoding("gzip, deflate, br") == "br"
+    assert choose_encoding("gzip;q=1.0, br;q=0.5") == "gzip"
+    assert choose_encoding("identity") is None
+    assert choose_encoding("br;q=0, gzip;q=0") is None
+
+
+def test_large_json_is_compressed_and_small_json_is_not(client):
+    client, _ = client
+    resp = client.get("/outlets", headers={"Accept-Encoding": "gzip"})
+    assert resp.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in resp.headers["vary"]
+    assert resp.json() == ROWS
+    assert int(resp.headers["content-length"]) < len(json.dumps(ROWS)) / 4
+    assert "content-encoding" not in client.get("/small", headers={"Accept-Encoding": "gzip"}).headers
+
+
+def test_brotli_when_available(client):
+    pytest.importorskip("brotli")
+    client, _ = client
+    resp = client.get("/outlets", headers={"Accept-Encoding": "gzip, br"})
+    assert resp.headers["content-encoding"] == "br"
+    assert resp.json() == ROWS
+
+
+def test_streamed_ndjson_is_compressed_incrementally(client):
+    client, _ = client
+    with client.stream("GET", "/stream", headers={"Accept-Encoding": "gzip"}) as resp:
+        assert resp.headers["content-encoding"] == "gzip"
+        assert "content-length" not in resp.headers
+        raw = b"".join(resp.iter_raw())
+    assert [json.loads(line) for line in gzip.decompress(raw).splitlines()] == ROWS
+
+
+def test_etag_revalidation_returns_304(client):
+    client, _ = client
+    first = client.get("/outlets", headers={"Accept-Encoding": "identity"})
+    etag = first.headers["etag"]
+    assert first.headers["cache-control"] == "public, max-age=60"
+    again = client.get("/outlets", headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.content == b""
+    assert again.headers["etag"] == etag
+    # The compressed representation's ETag validates too
+    gzip_etag = client.get("/outlets", headers={"Accept-Encoding": "gzip"}).headers["etag"]
+    assert gzip_etag == etag[:-1] + '-gzip"'
+    assert client.get("/outlets", headers={"If-None-Match": gzip_etag}).status_code == 304
+    assert client.get("/outlets", headers={"If-None-Match": '"stale"'}).status_code == 200
+
+
+def test_static_assets_are_immutable_only_by_hashed_url(client):
+    client, root = client
+    url = asset_url("js/app.js", str(root))
+    hashed = client.get(url)
+    assert "immutable" in hashed.headers["cache-control"]
+    plain = client.get("/static/js/app.js")
+    assert plain.headers["cache-control"] == "no-cache"
+    assert client.get("/static/js/app.js", headers={"If-None-Match": plain.headers["etag"]}).status_code == 304
+
+    (root / "js" / "app.js").write_text("console.log('changed');\n")
+    assert asset_url("js/app.js", str(root)) != url
+    assert client.get(url).headers["cache-control"] == "no-cache"
+
+
+def test_render_index_versions_existing_assets(client):
+    _, root = client
+    html = render_index(str(root / "index.html"), str(root))
+    assert f'src="{asset_url("js/app.js", str(root))}"' in html
+    assert 'src="/static/missing.png"' in html
+
+
+def test_etag_matches_handles_weak_and_lists():
+    assert etag_matches('W/"abc", "def"', '"abc"')
+    assert etag_matches("*", '"abc"')
+    assert not etag_matches(None, '"abc"')
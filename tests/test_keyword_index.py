@@ -0,0 +1,31 @@
+from api.keyword_index import BM25Index, reciprocal_rank_fusion
+
+DOCS = [
+    "ZUS OG CUP 2.0 With Screw-On Lid 500ml (17oz) | leak-proof ceramic cup",
+    "ZUS All-Can Tumbler 600ml (20oz) | interchangeable lids",
+    "ZUS Frozee Cold Cup 650ml (22oz) | keeps drinks cold",
+    "ZUS Coffee - Spectrum Shopping Mall | Ampang",
+    "ZUS Coffee - M3 Shopping Mall | Gombak",
+]
+
+
+def test_bm25_ranks_exact_terms_first():
+    index = BM25Index(DOCS)
+    assert [i for i, _ in index.search("cold cup", k=2)] == [2, 0]
+    assert index.search("espresso machine") == []
+
+
+def test_decisive_matches_short_circuit_only_clear_hits():
+    """All query terms in a single, clearly best document is decisive; vague queries are not."""
+    index = BM25Index(DOCS)
+    assert index.decisive_matches("OG CUP 2.0 500ml") == [0]
+    assert index.decisive_matches("Spectrum Shopping Mall") == [3]
+    assert index.decisive_matches("cup") == []
+    assert index.decisive_matches("shopping mall") == [3, 4]  # both outlets, nothing else close
+    assert index.decisive_matches("cup gombak") == []
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([[1, 2, 3], [4, 2, 5]], k=3)
+    assert fused[0] == 2
+    assert set(fused) <= {1, 2, 3, 4, 5}
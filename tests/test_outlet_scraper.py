@@ -0,0 +1,132 @@
+import asyncio
+import csv
+import json
+import shutil
+import sqlite3
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+from ingest.outlets_ingest import apply_outlet_changes
+from scripts.scrape_zus_outlets import HttpFetcher, diff_outlets, load_state, outlet_record, parse_page, scrape
+
+FIXTURES = Path(__file__).parent / "fixtures" / "zus_outlets"
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def site(tmp_path):
+    """Saved listing pages served from a copy that tests can edit."""
+    root = tmp_path / "site"
+    shutil.copytree(FIXTURES, root)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(QuietHandler, directory=str(root)))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield root, f"http://127.0.0.1:{server.server_address[1]}/page/{{}}/"
+    server.shutdown()
+
+
+def run_scrape(base_url, tmp_path, **kwargs):
+    async def go():
+        async with HttpFetcher(concurrency=3) as fetcher:
+            return await scrape(fetcher, base_url, tmp_path / "state.json", tmp_path / "outlets.csv",
+                                tmp_path / "changes.jsonl", **kwargs)
+    return asyncio.run(go())
+
+
+def read_changes(tmp_path):
+    with open(tmp_path / "changes.jsonl", encoding="utf-8") as f:
+        return [(c["op"], c["outlet"]["id"], c["outlet"]["name"]) for c in map(json.loads, f)]
+
+
+def test_parse_page_reads_cards_and_pagination():
+    outlets, digest, last_page = parse_page((FIXTURES / "page" / "1" / "index.html").read_text(encoding="utf-8"))
+    assert outlets == [
+        {"name": "ZUS Coffee – SS2", "location": "Kuala Lumpur/Selangor"},
+        {"name": "ZUS Coffee – Spectrum Shopping Mall", "location": "Kuala Lumpur/Selangor"},
+    ]
+    assert last_page == 3 and len(digest) == 64
+
+
+def test_incremental_scrape_emits_only_changes(site, tmp_path):
+    root, base_url = site
+    first = run_scrape(base_url, tmp_path)
+    assert (first["pages"], first["outlets"], first["added"], first["complete"]) == (3, 5, 5, True)
+    with open(tmp_path / "outlets.csv", encoding="utf-8") as f:
+        assert [row["id"] for row in csv.DictReader(f)] == ["1", "2", "3", "4", "5"]
+
+    # Markup outside the outlet grid (here a nonce) doesn't count as a change
+    page1 = root / "page" / "1" / "index.html"
+    page1.write_text(page1.read_text(encoding="utf-8").replace('"1a7f3"', '"1b000"'), encoding="utf-8")
+    second = run_scrape(base_url, tmp_path)
+    assert (second["unchanged"], second["added"], second["changed"], second["removed"]) == (3, 0, 0, 0)
+    assert read_changes(tmp_path) == []
+
+    page2 = root / "page" / "2" / "index.html"
+    page2.write_text(page2.read_text(encoding="utf-8").replace("Bangsar", "Bangsar South"), encoding="utf-8")
+    page3 = root / "page" / "3" / "index.html"
+    page3.write_text(page3.read_text(encoding="utf-8").replace("Kuala Lumpur/Selangor</a>", "Selangor</a>"),
+                     encoding="utf-8")
+    third = run_scrape(base_url, tmp_path)
+    assert third["unchanged"] == 1
+    assert read_changes(tmp_path) == [
+        ("added", 6, "ZUS Coffee – Bangsar South"),
+        ("changed", 5, "ZUS Coffee – Damansara Uptown"),
+        ("removed", 4, "ZUS Coffee – Bangsar"),
+    ]
+
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE outlets (id INTEGER PRIMARY KEY, name TEXT, location TEXT, address TEXT, "
+                 "opening_time TEXT, closing_time TEXT, dine_in BOOLEAN, delivery BOOLEAN, pickup BOOLEAN)")
+    conn.execute("INSERT INTO outlets (id, name, location) VALUES (4, 'ZUS Coffee – Bangsar', 'x'), (5, 'y', 'z')")
+    assert apply_outlet_changes(conn, tmp_path / "changes.jsonl") == 3
+    assert conn.execute("SELECT id, location FROM outlets ORDER BY id").fetchall() == [
+        (5, "Selangor"), (6, "Kuala Lumpur/Selangor"),
+    ]
+
+
+def test_first_run_keeps_ids_from_the_existing_csv(site, tmp_path):
+    _, base_url = site
+    with open(tmp_path / "outlets.csv", "w", newline="", encoding="utf-8") as f:
+        f.write("id,name,location,address,opening_time,closing_time,dine_in,delivery,pickup\n"
+                "41,ZUS Coffee – SS2,Kuala Lumpur/Selangor,,08:00,22:00,0,0,0\n"
+                "42,ZUS Coffee – Closed Outlet,Kuala Lumpur/Selangor,,08:00,22:00,0,0,0\n")
+    run_scrape(base_url, tmp_path)
+    changes = read_changes(tmp_path)
+    assert ("removed", 42, "ZUS Coffee – Closed Outlet") in changes
+    assert [op for op, _, name in changes if name == "ZUS Coffee – SS2"] == []
+    assert sorted(i for op, i, _ in changes if op == "added") == [43, 44, 45, 46]
+
+
+def test_same_named_outlets_are_kept_apart(tmp_path):
+    with open(tmp_path / "outlets.csv", "w", newline="", encoding="utf-8") as f:
+        f.write("id,name,location,address,opening_time,closing_time,dine_in,delivery,pickup\n"
+                "255,BINJAI 8 PREMIUM SOHO,Kuala Lumpur/Selangor,,08:00,22:00,0,0,0\n"
+                "256,ZUS Coffee – SS2,Kuala Lumpur/Selangor,,08:00,22:00,0,0,0\n"
+                "258,BINJAI 8 PREMIUM SOHO,Kuala Lumpur/Selangor,,08:00,22:00,0,0,0\n")
+    previous = load_state(tmp_path / "missing.json", tmp_path / "outlets.csv")["outlets"]
+    assert sorted(record["id"] for record in previous.values()) == [255, 256, 258]
+
+    listing = [outlet_record({"name": name, "location": "Kuala Lumpur/Selangor"})
+               for name in ("BINJAI 8 PREMIUM SOHO", "ZUS Coffee – SS2", "BINJAI 8 PREMIUM SOHO")]
+    outlets, changes = diff_outlets(previous, listing, complete=True)
+    assert changes == [] and len(outlets) == 3
+    _, changes = diff_outlets(previous, listing[:2], complete=True)
+    assert [(c["op"], c["outlet"]["id"]) for c in changes] == [("removed", 258)]
+
+
+def test_failed_page_keeps_its_outlets(site, tmp_path):
+    root, base_url = site
+    run_scrape(base_url, tmp_path)
+    shutil.rmtree(root / "page" / "3")
+    (root / "page" / "3").mkdir()
+    (root / "page" / "3" / "index.html").write_text("<html><body>Service unavailable</body></html>")
+    summary = run_scrape(base_url, tmp_path)
+    assert (summary["failed"], summary["removed"], summary["outlets"]) == (1, 0, 5)
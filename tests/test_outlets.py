@@ -0,0 +1,80 @@
+import sqlite3
+
+import pytest
+from fastapi import HTTPException
+
+import api.main as main
+import api.outlets as outlets
+from api import sql_guard
+from api.query_router import BOTH, OUTLET, PRODUCT
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    path = str(tmp_path / "outlets.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE outlets (id INTEGER PRIMARY KEY, name TEXT, location TEXT, address TEXT, "
+                 "opening_time TEXT, closing_time TEXT, dine_in BOOLEAN, delivery BOOLEAN, pickup BOOLEAN)")
+    conn.executemany("INSERT INTO outlets (name, location, dine_in) VALUES (?, ?, ?)",
+                     [(f"ZUS {i}", "Penang" if i % 3 == 0 else "Kuala Lumpur/Selangor", i % 2) for i in range(30)])
+    conn.commit()
+    conn.close()
+    sql_guard.clear_cache()
+    monkeypatch.setattr(outlets, "OUTLETS_DB_PATH", path)
+    return path
+
+
+def test_location_filter_restricts_outlet_sql(db, monkeypatch):
+    monkeypatch.setattr(outlets, "generate_sql", lambda query: "SELECT COUNT(*) AS count FROM outlets")
+    assert outlets.query_outlets("how many outlets?")[1] == [{"count": 30}]
+
+    sql, rows = outlets.query_outlets("how many outlets?", {"location": "penang"})
+    assert sql.startswith("WITH outlets AS (SELECT * FROM main.outlets WHERE lower(location) = 'penang')")
+    assert rows == [{"count": 10}]
+    assert outlets.query_outlets("how many outlets?", {"location": "Penang", "dine_in": "true"})[1] == [{"count": 5}]
+
+
+def test_filters_merge_into_a_generated_with_clause(db, monkeypatch):
+    monkeypatch.setattr(outlets, "generate_sql",
+                        lambda query: "WITH kl AS (SELECT id FROM outlets) SELECT COUNT(*) AS count FROM kl")
+    assert outlets.query_outlets("how many?", {"location": "Kuala Lumpur/Selangor"})[1] == [{"count": 20}]
+    assert "lower(location) = 'o''neil'" in outlets.with_filters("SELECT 1", {"location": "O'Neil"})
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT COUNT(*) AS count FROM main.outlets",
+    'SELECT name FROM "MAIN" . "outlets" WHERE id IN (SELECT id FROM outlets)',
+    "SELECT name FROM [main].[outlets]",
+])
+def test_filtered_sql_may_not_read_the_real_table(db, monkeypatch, sql):
+    with pytest.raises(sql_guard.UnsafeSQLError):
+        outlets.with_filters(sql, {"location": "Penang"})
+    assert outlets.with_filters(sql, None) == sql
+    # The generated SQL is refused and the templated fallback keeps the filter
+    monkeypatch.setattr(outlets, "generate_sql", lambda query: sql)
+    monkeypatch.setattr(outlets, "templated_sql", lambda query: "SELECT COUNT(*) AS count FROM outlets")
+    assert outlets.query_outlets("how many outlets?", {"location": "Penang"})[1] == [{"count": 10}]
+
+
+def test_recursive_with_keeps_its_keyword():
+    sql = outlets.with_filters("WITH RECURSIVE n(i) AS (SELECT 1) SELECT name FROM outlets, n",
+                               {"pickup": "yes"})
+    assert sql == ("WITH RECURSIVE outlets AS (SELECT * FROM main.outlets WHERE pickup = 1), "
+                   "n(i) AS (SELECT 1) SELECT name FROM outlets, n")
+    assert outlets.with_filters("SELECT 'main.outlets' AS label", {"pickup": "no"}).startswith("WITH outlets AS")
+
+
+def test_split_filters_routes_outlet_fields_to_sql():
+    product, outlet = main.split_filters({"location": "Kuala Lumpur/Selangor", "dine_in": "yes"})
+    assert product is None and outlet == {"location": "Kuala Lumpur/Selangor", "dine_in": "yes"}
+    assert main.filtered_route(PRODUCT, product, outlet) == OUTLET
+    assert main.split_filters({"source": "drinkware"}) == ({"source": "drinkware"}, None)
+    assert main.filtered_route(OUTLET, {"source": "drinkware"}, None) == PRODUCT
+    assert main.filtered_route(PRODUCT, {"title": "OG Cup"}, {"pickup": "true"}) == BOTH
+
+
+@pytest.mark.parametrize("filters", [{"colour": "red"}, {"source": "menu"}, {"dine_in": "maybe"}])
+def test_split_filters_rejects_filters_that_cannot_match(filters):
+    with pytest.raises(HTTPException) as error:
+        main.split_filters(filters)
+    assert error.value.status_code == 400
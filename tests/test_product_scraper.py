@@ -0,0 +1,117 @@
+import asyncio
+import csv
+import json
+import threading
+
+import pytest
+from aiohttp import web
+
+from scripts.scrape_drinkware import html_to_text, scrape
+
+
+def product(pid, title, updated_at="2024-05-01T10:00:00+08:00", price="79.00"):
+    return {
+        "id": pid, "handle": title.lower().replace(" ", "-"), "title": title,
+        "body_html": f"<p>{title} &amp; lid.</p><ul><li>500ml</li></ul>", "vendor": "ZUS", "product_type": "Tumbler",
+        "tags": ["drinkware"], "updated_at": updated_at,
+        "variants": [{"id": pid * 10, "title": "Blue", "sku": f"SKU{pid}", "price": price, "available": True},
+                     {"id": pid * 10 + 1, "title": "Black", "sku": None, "price": "89.00", "available": False}],
+    }
+
+
+class StubShop:
+    """Shopify-like storefront on a background loop: paged collections with ETag / If-None-Match."""
+
+    def __init__(self, collections):
+        self.collections = collections
+        self.requests = []
+        app = web.Application()
+        app.router.add_get("/collections.json", self.list_collections)
+        app.router.add_get("/collections/{handle}/products.json", self.list_products)
+        self.loop = asyncio.new_event_loop()
+        self.runner = web.AppRunner(app)
+        self.loop.run_until_complete(self.runner.setup())
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        self.loop.run_until_complete(site.start())
+        self.base_url = f"http://127.0.0.1:{self.runner.addresses[0][1]}"
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+
+    def respond(self, request, body):
+        etag = f'"{hash(json.dumps(body, sort_keys=True)) & 0xffffffff:x}"'
+        self.requests.append((request.path_qs, request.headers.get("If-None-Match") == etag))
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+        return web.json_response(body, headers={"ETag": etag})
+
+    async def list_collections(self, request):
+        limit, page = int(request.query["limit"]), int(request.query["page"])
+        handles = list(self.collections)[(page - 1) * limit:page * limit]
+        return self.respond(request, {"collections": [{"handle": h} for h in handles]})
+
+    async def list_products(self, request):
+        limit, page = int(request.query["limit"]), int(request.query["page"])
+        products = self.collections[request.match_info["handle"]][(page - 1) * limit:page * limit]
+        return self.respond(request, {"products": products})
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+@pytest.fixture
+def shop(monkeypatch):
+    monkeypatch.setattr("scripts.scrape_drinkware.PAGE_LIMIT", 2)
+    tumblers = [product(1, "OG Cup"), product(2, "All Can Tumbler"), product(3, "Frozee Cup")]
+    shop = StubShop({"tumbler": tumblers, "new": [tumblers[0], product(4, "Ceramic Mug")]})
+    yield shop
+    shop.close()
+
+
+def run(shop, tmp_path):
+    return asyncio.run(scrape(shop.base_url, csv_path=tmp_path / "drinkware.csv",
+                              catalog_path=tmp_path / "products.jsonl", state_path=tmp_path / "state.json"))
+
+
+def test_html_to_text_keeps_blocks_and_entities():
+    assert html_to_text("<p>Leak&#8209;proof &amp; <b>cold</b></p><ul><li>500ml</li><li>600ml</li></ul>") == (
+        "Leak‑proof & cold\n500ml\n600ml"
+    )
+
+
+def test_pages_collections_and_dedupes_products(shop, tmp_path):
+    (tmp_path / "drinkware.csv").write_text("id,title,content\n7,Frozee Cup,old\n", encoding="utf-8")
+    summary = run(shop, tmp_path)
+    assert (summary["products"], summary["collections"], summary["not_modified"]) == (4, 2, 0)
+    with open(tmp_path / "products.jsonl", encoding="utf-8") as f:
+        records = {r["shopify_id"]: r for r in map(json.loads, f)}
+    assert len(records) == 4
+    assert records[1]["price_min"] == 79.0 and records[1]["price_max"] == 89.0
+    assert [v["sku"] for v in records[1]["variants"]] == ["SKU1", None]
+    assert records[1]["updated_at"] == "2024-05-01T10:00:00+08:00"
+    with open(tmp_path / "drinkware.csv", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    # The existing id of "Frozee Cup" is kept; new products get ids after it
+    assert {row["title"]: int(row["id"]) for row in rows}["Frozee Cup"] == 7
+    assert sorted(int(row["id"]) for row in rows) == [7, 8, 9, 10]
+    assert rows[0] == {"id": "7", "title": "Frozee Cup", "content": "Frozee Cup & lid.\n500ml"}
+
+
+def test_refresh_downloads_only_changed_pages(shop, tmp_path):
+    run(shop, tmp_path)
+    with open(tmp_path / "drinkware.csv", encoding="utf-8") as f:
+        before = {row["title"]: row["id"] for row in csv.DictReader(f)}
+    shop.requests.clear()
+    second = run(shop, tmp_path)
+    assert second["downloaded"] == 0 and second["not_modified"] == second["requests"]
+    assert second["products"] == 4 and second["new_or_updated"] == 0
+
+    shop.collections["tumbler"][2] = product(3, "Frozee Cup", updated_at="2024-06-01T09:00:00+08:00", price="69.00")
+    shop.requests.clear()
+    third = run(shop, tmp_path)
+    assert third["new_or_updated"] == 1
+    # Only the page holding the edited product is downloaded again
+    assert [path for path, cached in shop.requests if not cached] == [
+        "/collections/tumbler/products.json?limit=2&page=2",
+    ]
+    with open(tmp_path / "drinkware.csv", encoding="utf-8") as f:
+        assert {row["title"]: row["id"] for row in csv.DictReader(f)} == before
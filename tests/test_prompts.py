@@ -0,0 +1,79 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.language_models import FakeListChatModel
+
+import agent.planner as planner
+from api import tracing
+from api.prompts import PromptTemplate, UsageCallback, UsageLedger, usage
+
+
+@pytest.fixture(autouse=True)
+def fresh_usage():
+    usage.reset()
+    yield
+    usage.reset()
+
+
+def test_prefix_is_byte_identical_across_calls():
+    first = planner.INTENT_PROMPT.messages("Where is the SS2 outlet?")
+    second = planner.INTENT_PROMPT.messages("What is 2 + 2?")
+    assert json.dumps(first[:-1]) == json.dumps(second[:-1])
+    assert [m["role"] for m in first] == ["system", "user"]
+    assert first[-1] == {"role": "user", "content": "Where is the SS2 outlet?"}
+
+
+def test_estimate_counts_prefix_once_per_call():
+    prompt = PromptTemplate("t", system="Answer briefly.")
+    assert prompt.estimate_tokens("hello there") > prompt.prefix_tokens
+    assert prompt.estimate_tokens("hello there " * 50) > prompt.estimate_tokens("hello there")
+
+
+def test_chat_prompt_keeps_literal_braces():
+    chat = planner.INTENT_PROMPT.chat_prompt("{question}")
+    messages = chat.format_messages(question="Is PJ open?")
+    assert messages[0].content == planner.INTENT_PROMPT.prefix[0]["content"]
+    assert '{"intent"' in messages[0].content
+    assert messages[-1].content == "Is PJ open?"
+
+
+def test_ledger_uses_reported_usage_and_falls_back_to_estimates():
+    ledger = UsageLedger()
+    reported = SimpleNamespace(prompt_tokens=120, completion_tokens=8,
+                               prompt_tokens_details=SimpleNamespace(cached_tokens=96))
+    with tracing.span("llm_generation") as current:
+        ledger.record("intent", reported, estimated_prompt_tokens=110)
+    ledger.record("intent", {"prompt_tokens": 80, "completion_tokens": 4}, estimated_prompt_tokens=75)
+    ledger.record("intent", None, estimated_prompt_tokens=100, completion_text="SELECT 1")
+
+    assert current.attributes["llm.cached_prompt_tokens"] == 96
+    stats = ledger.snapshot()["intent"]
+    assert stats["calls"] == 3 and stats["unreported_calls"] == 1
+    assert stats["prompt_tokens"] == 300 and stats["estimated_prompt_tokens"] == 285
+    assert stats["cached_prompt_tokens"] == 96 and stats["cached_ratio"] == 0.32
+    assert stats["completion_tokens"] > 12
+
+
+def test_intent_parser_sends_split_roles_and_records_usage(monkeypatch):
+    sent = []
+
+    def create(**kwargs):
+        sent.append(kwargs["messages"])
+        message = SimpleNamespace(content='{"intent": "greeting", "slots": {}}')
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)],
+                               usage=SimpleNamespace(prompt_tokens=150, completion_tokens=9))
+
+    monkeypatch.setattr(planner, "client", SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create))))
+    assert planner.call_llama_intent_parser("hello there").intent == "greeting"
+    assert sent[0] == planner.INTENT_PROMPT.messages("hello there")
+    assert usage.snapshot()["intent"]["prompt_tokens"] == 150
+
+
+def test_usage_callback_records_langchain_calls():
+    prompt = PromptTemplate("rag", system="Use only the context.")
+    chain = prompt.chat_prompt("Context:\n{context}\n\nQuestion: {question}") | FakeListChatModel(responses=["Yes."])
+    chain.invoke({"context": "OG Cup, 500ml", "question": "How big?"}, config={"callbacks": [UsageCallback("rag")]})
+    stats = usage.snapshot()["rag"]
+    assert stats["calls"] == 1 and stats["unreported_calls"] == 1
+    assert stats["prompt_tokens"] == stats["estimated_prompt_tokens"] > prompt.prefix_tokens
@@ -0,0 +1,39 @@
+import sqlite3
+
+import pytest
+
+from agent.tools import templated_sql
+from api.outlets import OUTLETS_DB_PATH, outlet_sources, run_sql, summarize_outlets
+from api.query_router import BOTH, OUTLET, PRODUCT, route_query
+
+
+@pytest.mark.parametrize("query, route", [
+    ("how many outlets open at 8", OUTLET),
+    ("What are the opening hours for SS2?", OUTLET),
+    ("Which tumbler keeps drinks cold?", PRODUCT),
+    ("Tell me about the OG CUP 2.0 500ml", PRODUCT),
+    ("Which outlets sell the All-Can tumbler?", BOTH),
+    ("hello", PRODUCT),
+])
+def test_route_query(query, route):
+    assert route_query(query) == route
+
+
+def test_outlet_counts_come_from_sql():
+    """Aggregate questions are answered with the exact DB count."""
+    rows = run_sql(templated_sql("how many outlets open at 8"))
+    with sqlite3.connect(OUTLETS_DB_PATH) as conn:
+        expected = conn.execute("SELECT COUNT(*) FROM outlets WHERE opening_time <= '08:00'").fetchone()[0]
+    assert rows == [{"count": expected}]
+    assert str(expected) in summarize_outlets(rows)
+
+
+def test_outlet_rows_have_row_level_sources():
+    rows = run_sql(templated_sql("outlets in Spectrum Shopping Mall"))
+    assert rows and all("Spectrum" in row["name"] for row in rows)
+    assert outlet_sources(rows) == [f"outlets:{row['id']}" for row in rows]
+
+
+def test_outlet_connection_is_read_only():
+    with pytest.raises(sqlite3.OperationalError):
+        run_sql("DELETE FROM outlets")
@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+import api.rerank
+from api.retrieval import DATA_SOURCES
+from bench.retrieval_eval import BASELINE_PATH, QUERIES_PATH, answerable, compare, evaluate, score
+
+
+@pytest.fixture(scope="module")
+def report():
+    # The baseline is recorded with the lexical reranker; the cross-encoder would need a download
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(api.rerank, "_model", False)
+        with open(QUERIES_PATH, encoding="utf-8") as f:
+            labelled = json.load(f)
+        return {"sources": DATA_SOURCES, "queries": len(answerable(labelled, DATA_SOURCES)),
+                "configs": evaluate(labelled, repeat=1)}
+
+
+def test_recall_does_not_regress_from_baseline(report):
+    with open(BASELINE_PATH, encoding="utf-8") as f:
+        baseline = json.load(f)
+    assert report["queries"] == baseline["queries"]
+    assert compare(report, baseline, max_recall_drop=0.0, max_latency_regression=None) == []
+
+
+def test_hybrid_and_rerank_beat_dense_retrieval(report):
+    configs = report["configs"]
+    assert configs["flat+hybrid"]["mrr"] > configs["flat+dense"]["mrr"]
+    assert configs["flat+dense+rerank"]["recall@1"] > configs["flat+dense"]["recall@1"]
+
+
+def test_score_recall_and_mrr():
+    rankings = [["a", "b", "c"], ["x", "y", "z"]]
+    labels = [["b", "c"], ["q"]]
+    assert score(rankings, labels, [1, 3]) == {"recall@1": 0.0, "recall@3": 0.5, "mrr": 0.25}
+
+
+def test_compare_flags_recall_and_latency_regressions():
+    baseline = {"configs": {"flat+dense": {"recall@5": 0.9, "mrr": 0.8, "latency_ms_p95": 1.0}}}
+    slower = {"configs": {"flat+dense": {"recall@5": 0.9, "mrr": 0.8, "latency_ms_p95": 1.2}}}
+    worse = {"configs": {"flat+dense": {"recall@5": 0.85, "mrr": 0.8, "latency_ms_p95": 3.0}}}
+    assert compare(slower, baseline, 0.02, 0.5) == []
+    problems = compare(worse, baseline, 0.02, 0.5)
+    assert len(problems) == 2 and "recall@5" in problems[0] and "p95" in problems[1]
+    assert compare(worse, baseline, 0.02, 0.5, latency_slack_ms=5.0) == problems[:1]
+    assert compare({"configs": {}}, baseline, 0.02, None) == ["flat+dense: missing from this run"]
+
+
+def test_outlet_questions_are_only_scored_against_an_outlet_index():
+    labelled = [{"query": "OG cup", "relevant": ["drinkware:1"]}, {"query": "SS2 hours", "relevant": ["outlets:7"]}]
+    assert answerable(labelled, DATA_SOURCES) == labelled[:1]
+    assert answerable(labelled, ["drinkware", "outlets"]) == labelled
+    unserved = {"sources": ["drinkware", "outlets"], "configs": {}}
+    assert compare(unserved, {"sources": DATA_SOURCES, "configs": {}}, 0.02, None) == [
+        "sources ['drinkware', 'outlets'] differ from the baseline's ['drinkware']"
+    ]
@@ -0,0 +1,63 @@
+import sqlite3
+
+import pyarrow as pa
+
+from api.snapshot import TableRows, current_version, open_table, seed_sqlite, write_snapshot
+
+
+def _write_sources(tmp_path):
+    drinkware = tmp_path / "zus_drinkware.csv"
+    drinkware.write_text('id,title,content\n1,OG Cup,"Leak-proof\nceramic"\n2,Mug,Cozy\n', encoding="utf-8")
+    outlets = tmp_path / "zus_outlets.csv"
+    outlets.write_text(
+        "id,name,location,address,opening_time,closing_time,dine_in,delivery,pickup\n"
+        "1,ZUS SS2,Selangor,,08:00,22:00,1,0,1\n", encoding="utf-8")
+    return {"drinkware": str(drinkware), "outlets": str(outlets)}
+
+
+def test_snapshot_is_typed_versioned_and_idempotent(tmp_path):
+    sources = _write_sources(tmp_path)
+    root = str(tmp_path / "snapshot")
+    manifest = write_snapshot(sources, root=root)
+    assert current_version(root) == manifest["version"]
+    assert manifest["tables"]["outlets"]["rows"] == 1
+    assert write_snapshot(sources, root=root)["version"] == manifest["version"]
+
+    outlets = open_table("outlets", root)
+    assert outlets.schema.field("id").type == pa.int32()
+    assert outlets.schema.field("dine_in").type == pa.bool_()
+    assert outlets.to_pylist()[0]["address"] == ""
+    assert open_table("outlets", root) is outlets  # memoized until the file changes
+    rows = TableRows(open_table("drinkware", root), rename={"content": "description"})
+    assert rows[-1] == {"id": 2, "title": "Mug", "description": "Cozy"}
+    assert rows[0]["description"] == "Leak-proof\nceramic"
+
+
+def test_new_csv_content_gets_a_new_version(tmp_path):
+    sources = _write_sources(tmp_path)
+    root = str(tmp_path / "snapshot")
+    first = write_snapshot(sources, root=root)["version"]
+    with open(sources["drinkware"], "a", encoding="utf-8") as f:
+        f.write("3,Tumbler,Cold\n")
+    second = write_snapshot(sources, root=root)["version"]
+    assert second != first
+    assert current_version(root) == second
+    assert open_table("drinkware", root).num_rows == 3
+
+
+def test_interrupted_version_directory_is_rebuilt(tmp_path):
+    sources = _write_sources(tmp_path)
+    root = tmp_path / "snapshot"
+    version = write_snapshot(sources, root=str(root))["version"]
+    (root / version / "manifest.json").unlink()
+    (root / version / "partial.arrow").write_bytes(b"x")
+    assert write_snapshot(sources, root=str(root))["version"] == version
+    assert sorted(p.name for p in (root / version).iterdir()) == ["drinkware.arrow", "manifest.json", "outlets.arrow"]
+
+
+def test_seed_sqlite_uses_snapshot_schema(tmp_path):
+    root = str(tmp_path / "snapshot")
+    write_snapshot(_write_sources(tmp_path), root=root)
+    conn = sqlite3.connect(":memory:")
+    seed_sqlite(conn, "outlets", open_table("outlets", root))
+    assert conn.execute("SELECT id, name, dine_in, delivery FROM outlets").fetchall() == [(1, "ZUS SS2", 1, 0)]
@@ -0,0 +1,68 @@
+import sqlite3
+
+import pytest
+
+from api import sql_guard
+from api.sql_guard import SQLBudgetError, UnsafeSQLError, estimate_plan_rows, execute_select, normalize_sql
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / "outlets.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE outlets (id INTEGER PRIMARY KEY, name TEXT, location TEXT)")
+    conn.executemany("INSERT INTO outlets (name, location) VALUES (?, ?)",
+                     [(f"ZUS {i}", "SS2" if i % 2 else "Penang") for i in range(200)])
+    conn.commit()
+    conn.close()
+    sql_guard.clear_cache()
+    return path
+
+
+def test_normalize_keeps_literals():
+    assert normalize_sql("SELECT  Name\nFROM Outlets WHERE name = 'SS2 ;';") == (
+        "select name from outlets where name = 'SS2 ;'"
+    )
+
+
+@pytest.mark.parametrize("sql", ["SELECT name FROM outlets WHERE name = 'abc", 'SELECT "name FROM outlets'])
+def test_unterminated_quotes_are_rejected_not_rewritten(db, sql):
+    with pytest.raises(UnsafeSQLError, match="Unterminated"):
+        normalize_sql(sql)
+    with pytest.raises(UnsafeSQLError):
+        execute_select(db, sql, 10)
+
+
+@pytest.mark.parametrize("sql", [
+    "DELETE FROM outlets", "SELECT 1; DROP TABLE outlets", "PRAGMA table_info(outlets)",
+    "SELECT * FROM sqlite_master", "SELECT randomblob(1000000000)",
+    "WITH RECURSIVE r(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM r) SELECT n FROM r",
+])
+def test_rejects_anything_but_a_read_only_select(db, sql):
+    with pytest.raises(UnsafeSQLError):
+        execute_select(db, sql, 10)
+
+
+def test_rejects_expensive_plans_and_slow_queries(db):
+    with pytest.raises(SQLBudgetError, match="plan"):
+        execute_select(db, "SELECT COUNT(*) FROM outlets a, outlets b, outlets c", 10)
+    with pytest.raises(SQLBudgetError, match="exceeded"):
+        execute_select(db, "SELECT COUNT(*) FROM outlets a, outlets b WHERE a.name LIKE b.name", 10,
+                       time_limit_ms=0)
+    plan = [(2, 0, 0, "SCAN a"), (5, 0, 0, "CORRELATED SCALAR SUBQUERY 1"), (9, 5, 0, "SEARCH b USING INDEX i (x=?)")]
+    assert estimate_plan_rows(plan, 100) == 100 + 100 * sql_guard.SQL_SEARCH_ROWS
+
+
+def test_results_are_limited_and_cached_per_db_version(db):
+    rows = execute_select(db, "SELECT name FROM outlets WHERE location = 'SS2'", 5)
+    assert len(rows) == 5
+    rows[0]["name"] = "mutated"
+    assert execute_select(db, "select name from OUTLETS where location = 'SS2';", 5)[0]["name"] == "ZUS 1"
+    assert len(sql_guard._cache) == 1
+
+    conn = sqlite3.connect(db)
+    conn.execute("UPDATE outlets SET name = 'renamed' WHERE id = 2")
+    conn.execute("INSERT INTO outlets (name, location) VALUES ('ZUS new', 'SS2')")
+    conn.commit()
+    conn.close()
+    assert execute_select(db, "SELECT name FROM outlets WHERE location = 'SS2'", 5)[0]["name"] == "renamed"
@@ -0,0 +1,92 @@
+import json
+from typing import List
+
+import pytest
+from httpx import AsyncClient
+from pydantic import BaseModel
+
+from api import tracing
+from app import app, controller
+
+
+@pytest.fixture(autouse=True)
+def fresh_collector():
+    """Start every test with an empty span collector."""
+    tracing.collector.reset()
+    yield
+    tracing.collector.reset()
+
+
+def test_nested_spans_share_trace_and_link_parent():
+    """A span opened inside another is recorded as its child in the same trace."""
+    with tracing.span("outer") as outer:
+        with tracing.span("inner") as inner:
+            pass
+    assert inner.trace_id == outer.trace_id
+    assert inner.parent_id == outer.span_id
+    otlp = inner.to_otlp()["resourceSpans"][0]["scopeSpans"][0]["spans"][0]
+    assert otlp["parentSpanId"] == outer.span_id
+
+
+def test_collector_reports_percentiles_and_errors():
+    """Stage stats include counts, errors and ordered percentiles."""
+    for _ in range(20):
+        with tracing.span("embedding"):
+            pass
+    with pytest.raises(ValueError):
+        with tracing.span("embedding"):
+            raise ValueError("boom")
+    stats = tracing.collector.snapshot()["embedding"]
+    assert stats["count"] == 21
+    assert stats["errors"] == 1
+    assert stats["p50_ms"] <= stats["p95_ms"] <= stats["p99_ms"]
+    assert stats["histogram_ms"]["+Inf"] == 21
+
+
+def test_serialization_span_covers_the_json_rendering():
+    """The response body is already rendered when the span closes."""
+    class Answer(BaseModel):
+        answer: str
+        sources: List[str]
+
+    response = tracing.serialized(Answer(answer="caf\u00e9", sources=["drinkware:1"]))
+    assert json.loads(response.body) == {"answer": "caf\u00e9", "sources": ["drinkware:1"]}
+    assert tracing.collector.snapshot()["response_serialization"]["count"] == 1
+
+
+@pytest.mark.anyio
+async def test_metrics_endpoint_exposes_request_stages(monkeypatch):
+    """/chat requests show up in /metrics under their route and inner stages."""
+    async def dummy_run(user, memory):
+        with tracing.span("intent_parse"):
+            return "ok"
+    monkeypatch.setattr(controller, "run", dummy_run)
+    async with AsyncClient(app=app, base_url="http://test") as client:  # type: ignore
+        await client.post("/chat", json={"user": "alice", "content": "hi"})
+        resp = await client.get("/metrics")
+    stages = resp.json()["stages"]
+    assert stages["POST /chat"]["count"] == 1
+    assert stages["intent_parse"]["count"] == 1
+    assert "response_serialization" in stages
+
+
+@pytest.mark.anyio
+async def test_request_id_is_echoed_back():
+    """Responses carry the caller's X-Request-ID, or a generated one."""
+    async with AsyncClient(app=app, base_url="http://test") as client:  # type: ignore
+        given = await client.get("/metrics", headers={"X-Request-ID": "abc123"})
+        generated = await client.get("/metrics")
+    assert given.headers["X-Request-ID"] == "abc123"
+    assert len(generated.headers["X-Request-ID"]) == 32
+
+
+@pytest.mark.anyio
+async def test_unmatched_paths_share_one_stage():
+    """Probing random URLs adds a single stage, not one per path."""
+    async with AsyncClient(app=app, base_url="http://test") as client:  # type: ignore
+        for i in range(5):
+            assert (await client.get(f"/wp-admin/{i}.php")).status_code == 404
+        resp = await client.get("/metrics")
+    stages = resp.json()["stages"]
+    assert stages["GET <unmatched>"]["count"] == 5
+    assert not any("wp-admin" in name for name in stages)
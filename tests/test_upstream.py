@@ -0,0 +1,176 @@
+import threading
+import time
+
+import httpx
+import openai
+import pytest
+import requests
+
+from api import upstream
+from api.upstream import (
+    CircuitBreaker, CircuitOpenError, SingleFlight, UpstreamBusyError, UpstreamLimiter,
+)
+
+
+def test_single_flight_shares_one_call_between_concurrent_callers():
+    """Identical concurrent keys run the function once and all get its result."""
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "answer"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do("q", slow)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(flight.do("q", slow))) for _ in range(5)]
+    for t in followers:
+        t.start()
+    time.sleep(0.05)
+    release.set()
+    for t in [leader, *followers]:
+        t.join(5)
+
+    assert len(calls) == 1
+    assert results == ["answer"] * 6
+    assert flight.shared == 5
+
+
+def test_single_flight_propagates_errors_and_forgets_key():
+    """A failed call raises for its waiters and is retried on the next request."""
+    flight = SingleFlight()
+
+    def boom():
+        raise ValueError("upstream down")
+
+    with pytest.raises(ValueError):
+        flight.do("q", boom)
+    assert flight.do("q", lambda: "ok") == "ok"
+
+
+def test_limiter_caps_concurrency():
+    """No more than max_concurrency callers hold a slot at once."""
+    limiter = UpstreamLimiter(max_concurrency=2)
+    peak = []
+    lock = threading.Lock()
+    active = [0]
+
+    def work():
+        with limiter.slot():
+            with lock:
+                active[0] += 1
+                peak.append(active[0])
+            time.sleep(0.02)
+            with lock:
+                active[0] -= 1
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    assert max(peak) == 2
+
+
+def test_limiter_serves_waiters_in_arrival_order():
+    """With one slot, queued callers are admitted first-come-first-served."""
+    limiter = UpstreamLimiter(max_concurrency=1)
+    order = []
+    hold = limiter.slot()
+    hold.__enter__()
+
+    def work(i):
+        with limiter.slot():
+            order.append(i)
+
+    threads = []
+    for i in range(5):
+        t = threading.Thread(target=work, args=(i,))
+        t.start()
+        threads.append(t)
+        time.sleep(0.01)  # make arrival order deterministic
+    hold.__exit__(None, None, None)
+    for t in threads:
+        t.join(5)
+    assert order == [0, 1, 2, 3, 4]
+
+
+def test_limiter_times_out_when_saturated():
+    """A caller that cannot get a slot in time gets UpstreamBusyError."""
+    limiter = UpstreamLimiter(max_concurrency=1, queue_timeout=0.05)
+    with limiter.slot():
+        with pytest.raises(UpstreamBusyError):
+            with limiter.slot():
+                pass
+    assert limiter.queued == 0
+
+
+def test_limiter_token_bucket_spaces_out_calls():
+    """With a rate limit and burst of 1, the second call waits for a token."""
+    limiter = UpstreamLimiter(max_concurrency=4, rate_per_sec=20, burst=1)
+    start = time.monotonic()
+    for _ in range(3):
+        with limiter.slot():
+            pass
+    assert time.monotonic() - start >= 0.09
+
+
+def test_breaker_opens_after_consecutive_failures_and_probes_after_timeout():
+    """closed -> open after N failures -> half-open probe -> closed on success."""
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    time.sleep(0.06)
+    breaker.before_call()  # the single half-open probe
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()  # a second concurrent probe is rejected
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_breaker_reopens_when_probe_fails():
+    """A failed half-open probe re-opens the circuit immediately."""
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+
+def test_only_outage_errors_count_against_the_breaker(monkeypatch):
+    """Timeouts, connection errors, 429 and 5xx open the breaker; other errors are re-raised only."""
+    request = httpx.Request("POST", "https://openrouter.ai/api/v1/chat/completions")
+    status = lambda code: openai.APIStatusError("upstream", response=httpx.Response(code, request=request), body=None)
+    assert upstream.is_upstream_failure(requests.Timeout())
+    assert upstream.is_upstream_failure(httpx.ConnectError("refused"))
+    assert upstream.is_upstream_failure(openai.APITimeoutError(request=request))
+    assert upstream.is_upstream_failure(status(429)) and upstream.is_upstream_failure(status(503))
+    assert not upstream.is_upstream_failure(status(400))
+    assert not upstream.is_upstream_failure(KeyError("choices"))
+
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    monkeypatch.setattr(upstream, "breaker", breaker)
+
+    def fail(exc):
+        raise exc
+
+    for exc in (status(400), KeyError("choices")):
+        with pytest.raises(type(exc)):
+            upstream.call_openrouter(None, lambda: fail(exc))
+    assert breaker.state == "closed"
+    with pytest.raises(requests.ConnectionError):
+        upstream.call_openrouter(None, lambda: fail(requests.ConnectionError()))
+    assert breaker.state == "open"
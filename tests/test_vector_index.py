@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from api.vector_index import build_index, configure_search, index_kind
+
+
+@pytest.fixture(scope="module")
+def clustered():
+    rng = np.random.default_rng(0)
+    centres = rng.normal(size=(32, 32))
+    x = centres[rng.integers(0, 32, size=4000)] + rng.normal(scale=0.1, size=(4000, 32))
+    return x.astype("float32")
+
+
+@pytest.mark.parametrize("index_type, knobs", [
+    ("hnsw", {"ef_search": 64}),
+    ("ivfpq", {"nprobe": 16}),
+])
+def test_ann_recall_against_flat(clustered, index_type, knobs):
+    """Approximate indexes find most of the exact top-5 neighbours."""
+    queries = clustered[:50]
+    _, truth = build_index(clustered, "flat").search(queries, 5)
+    index = configure_search(build_index(clustered, index_type, pq_m=8), **knobs)
+    assert index_kind(index) == index_type
+    _, found = index.search(queries, 5)
+    recall = np.mean([len(set(f) & set(t)) / 5 for f, t in zip(found, truth)])
+    assert recall >= 0.6
+
+
+def test_ivfpq_falls_back_to_flat_for_small_corpus():
+    """Too few vectors to train IVF-PQ gives an exact index instead of an error."""
+    index = build_index(np.random.rand(20, 16).astype("float32"), "ivfpq")
+    assert index_kind(index) == "flat"
+    assert index.ntotal == 20
+
+
+def test_unknown_index_type_is_rejected():
+    with pytest.raises(ValueError):
+        build_index(np.zeros((4, 8), dtype="float32"), "annoy")
+
+
+def test_partitioned_search_many_matches_single_searches(clustered):
+    """One multi-query search returns what per-query searches would, filters included."""
+    from api.vector_index import PartitionedIndex
+
+    metadatas = [{"source": "a" if i % 3 else "b", "colour": "red" if i % 2 else "blue"} for i in range(len(clustered))]
+    index = PartitionedIndex(clustered, metadatas, index_type="flat")
+    queries = clustered[:20]
+    for filters in (None, {"source": "b"}, {"colour": "red"}):
+        assert index.search_many(queries, 5, filters) == [index.search(q, 5, filters) for q in queries]
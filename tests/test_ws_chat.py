@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI, WebSocket
+from fastapi.testclient import TestClient
+
+from api import ws_chat
+from agent.memory import MemoryStore
+import app as app_module
+from app import app, controller, memories
+
+
+@pytest.fixture
+def echo_controller(monkeypatch):
+    async def run(user, memory):
+        return f"{user} said {memory.get_latest_message()}"
+    monkeypatch.setattr(controller, "run", run)
+
+
+def _turn(ws):
+    """Frames of one turn, up to its done or error frame."""
+    frames = []
+    while not frames or frames[-1]["type"] not in ("done", "error"):
+        frames.append(ws.receive_json())
+    return frames
+
+
+def test_chat_turns_over_one_socket(echo_controller):
+    with TestClient(app).websocket_connect("/ws/chat?user=alice") as ws:
+        ws.send_json({"type": "message", "content": "hi"})
+        assert _turn(ws) == [
+            {"type": "start", "id": 1},
+            {"type": "delta", "id": 1, "text": "alice said hi"},
+            {"type": "done", "id": 1, "response": "alice said hi"},
+        ]
+        ws.send_json({"type": "ping"})
+        assert ws.receive_json() == {"type": "pong"}
+        ws.send_json({"type": "message", "content": "again"})
+        assert _turn(ws)[-1] == {"type": "done", "id": 2, "response": "alice said again"}
+    assert [m.content for m in memories.get("alice").get_history()][-4:] == [
+        "hi", "alice said hi", "again", "alice said again",
+    ]
+
+
+def test_http_chat_replies_are_kept_in_memory(echo_controller):
+    client = TestClient(app)
+    assert client.post("/chat", json={"user": "carol", "content": "hi"}).json() == {"response": "carol said hi"}
+    assert [m.content for m in memories.get("carol").get_history()][-2:] == ["hi", "carol said hi"]
+
+
+def test_faq_turns_are_kept_in_memory(echo_controller, monkeypatch):
+    hit = {"answer": "SS2 opens 8am to 10pm.", "sources": ["outlets:7"]}
+    monkeypatch.setattr(app_module, "faq_lookup", lambda content: hit if "hours" in content else None)
+    client = TestClient(app)
+    assert client.post("/chat", json={"user": "faq-bob", "content": "SS2 hours?"}).json() == {"response": hit["answer"]}
+    with client.websocket_connect("/ws/chat?user=faq-bob") as ws:
+        ws.send_json({"type": "message", "content": "PJ hours?"})
+        assert _turn(ws)[-1]["response"] == hit["answer"]
+        ws.send_json({"type": "message", "content": "and Penang?"})
+        assert _turn(ws)[-1]["response"] == "faq-bob said and Penang?"
+    assert [m.content for m in memories.get("faq-bob").get_history()] == [
+        "SS2 hours?", hit["answer"], "PJ hours?", hit["answer"], "and Penang?", "faq-bob said and Penang?",
+    ]
+
+
+def _slow_app():
+    app = FastAPI()
+    release = asyncio.Event()
+
+    @app.websocket("/ws")
+    async def endpoint(websocket: WebSocket):
+        async def respond(content):
+            if content == "slow":
+                await release.wait()
+            if content == "fail":
+                raise ValueError("bad turn")
+            yield content.upper()
+
+        await ws_chat.serve_chat(websocket, respond)
+
+    @app.post("/release")
+    async def release_turns():
+        release.set()
+
+    return app
+
+
+def test_busy_socket_refuses_turns_beyond_the_pending_limit(monkeypatch):
+    monkeypatch.setattr(ws_chat, "WS_MAX_PENDING", 1)
+    with TestClient(_slow_app()) as client, client.websocket_connect("/ws") as ws:
+        ws.send_json({"type": "message", "content": "slow"})
+        assert ws.receive_json() == {"type": "start", "id": 1}
+        ws.send_json({"type": "message", "content": "queued"})
+        ws.send_json({"type": "message", "content": "overflow"})
+        assert ws.receive_json() == {"type": "error", "id": 3, "detail": "busy"}
+        client.post("/release")
+        frames = _turn(ws) + _turn(ws)
+        assert [f for f in frames if f["type"] == "done"] == [
+            {"type": "done", "id": 1, "response": "SLOW"}, {"type": "done", "id": 2, "response": "QUEUED"},
+        ]
+        ws.send_json({"type": "message", "content": "fail"})
+        assert _turn(ws)[-1] == {"type": "error", "id": 4, "detail": "ValueError: bad turn"}
+
+
+def test_idle_sockets_are_pinged_then_closed(monkeypatch):
+    monkeypatch.setattr(ws_chat, "WS_HEARTBEAT_SECONDS", 0.05)
+    monkeypatch.setattr(ws_chat, "WS_IDLE_TIMEOUT", 0.3)
+    with TestClient(_slow_app()).websocket_connect("/ws") as ws:
+        assert ws.receive_json() == {"type": "ping"}
+        message = ws.receive()
+        while message["type"] == "websocket.send":
+            message = ws.receive()
+        assert message == {"type": "websocket.close", "code": 1001, "reason": "idle timeout"}
+
+
+def test_memory_store_keeps_one_memory_per_user_and_evicts_the_oldest():
+    store = MemoryStore(max_users=2)
+    alice = store.get("alice")
+    assert store.get("alice") is alice
+    store.get("bob")
+    store.get("alice")
+    store.get("carol")
+    assert len(store) == 2
+    assert store.get("alice") is alice